@@ -0,0 +1,372 @@
+"""
+Name:    bench_def
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   $> python bench_def.py pipeline [--sizes 100 1000 ...] [--output new.json] [--compare old.json]
+         $> python bench_def.py sweep
+         $> python bench_def.py memory [--hosts 10000]
+         $> python bench_def.py profile [--hosts 10000] [--sweeps 5] [--cprofile [out.prof]]
+         $> python bench_def.py startup [--hosts 110 10000] [--repeat 7] [--budget 100 450]
+Return:  Timings, throughput and peak memory of the collect -> parse -> aggregate pipeline
+Purpose: To measure how the tool scales with the cluster size, per stage, and to 
+         compare the results between versions
+Remarks: + No live Torque server is needed: a fake "pbsnodes" shell script
+           which prints synthetic records is put in place of the real command, 
+           so the numbers reflect the cost of the subprocess forks and the 
+           parsing, but not the pbs_server round trip
+         + The stages of "pipeline" are: collect (one bulk pbsnodes call), 
+           split (split_pbsnodes), parse (the single-scan table parser of
+           the node, its cpu status and its gpu status), and nodes (the full
+           nodes construction from an in-memory source)
+         + Peak memory is measured with tracemalloc in a separate pass, so that
+           the tracing overhead does not pollute the timings
+         + "sweep" compares the per-host and the bulk collection paths on the
+           genius hostnames
+         + "memory" reports the bytes which a nodes instance retains per node,
+           with and without keeping the raw pbsnodes texts
+         + "profile" runs a few sweeps with the instruments of def_profile
+           (the --profile report), and optionally one sweep under cProfile
+         + "startup" times whole "cluster_watch.py snapshot --from-cache"
+           processes (the median over a few runs), next to a bare interpreter,
+           and lists the heavy modules which such a process has loaded; it
+           exits with 1 if a size misses its budget (see startup_budgets)
+"""
+import sys, os
+import argparse
+import json
+import logging
+import platform
+import stat
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from def_source import *
+from def_node import node
+from def_nodes import nodes
+
+#--------------------------------------
+logger = logging.getLogger(__name__)
+
+#--------------------------------------
+def install_fake_pbsnodes(workdir, hostnames):
+  """
+  Write one (synthetic) record file per host and a "pbsnodes" shell script 
+  which prints the records of the requested hosts, and return a live_source
+  which calls that script
+  """
+  records = split_pbsnodes( synthetic_source(hostnames=hostnames).fetch(hostnames) )
+  for host in hostnames:
+    with open(os.path.join(workdir, host), 'w') as w: w.write(records[host] + '\n')
+  script = os.path.join(workdir, 'pbsnodes')
+  with open(script, 'w') as w:
+    w.write('#!/bin/sh\n'
+            f'cd {workdir}\n'
+            'exec cat "$@"\n')
+  os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+  return live_source(script)
+
+#--------------------------------------
+def time_sweep(repeat, **kwargs):
+  """
+  Return the best wall-clock time (in seconds) of "repeat" full sweeps
+  """
+  best = float('inf')
+  for i in range(repeat):
+    t0 = time.perf_counter()
+    nodes('genius', **kwargs)
+    best = min(best, time.perf_counter() - t0)
+  return best
+
+#--------------------------------------
+def bench_sweep(repeat=5):
+  """
+  Compare the per-host and the bulk collection paths on the genius hostnames
+  """
+  hostnames = nodes('genius', collect=False).hostnames
+  n_hosts   = len(hostnames)
+  with tempfile.TemporaryDirectory() as workdir:
+    source = install_fake_pbsnodes(workdir, hostnames)
+
+    t_host = time_sweep(repeat, source=source, bulk=False)
+    t_bulk = time_sweep(repeat, source=source, bulk=True)
+    t_batch= time_sweep(repeat, source=source, bulk=True, batch_size=32)
+
+  print(f'{"mode":<24s} {"calls":>6s} {"sweep [ms]":>11s}')
+  print(f'{"per-host":<24s} {n_hosts:>6d} {1e3*t_host:>11.1f}')
+  print(f'{"bulk (batch_size=32)":<24s} {-(-n_hosts//32):>6d} {1e3*t_batch:>11.1f}')
+  print(f'{"bulk (one call)":<24s} {1:>6d} {1e3*t_bulk:>11.1f}')
+
+#--------------------------------------
+def install_fake_pbsnodes_all(workdir, pbsnodes):
+  """
+  Write the combined "pbsnodes" text to a file, and a "pbsnodes" shell script
+  which prints it as a whole (i.e. like "pbsnodes -a"); return a live_source
+  which calls that script
+  """
+  path   = os.path.join(workdir, 'pbsnodes.txt')
+  with open(path, 'w') as w: w.write(pbsnodes)
+  script = os.path.join(workdir, 'pbsnodes')
+  with open(script, 'w') as w:
+    w.write('#!/bin/sh\n'
+            f'exec cat {path}\n')
+  os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+  return live_source(script)
+
+#--------------------------------------
+def peak_memory(func):
+  """
+  Return the peak memory (in bytes) which is allocated while func() runs
+  """
+  tracemalloc.start()
+  func()
+  current, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return peak
+
+#--------------------------------------
+def get_stages(source, live, pbsnodes):
+  """
+  Return an ordered dictionary of the pipeline stages; each value is a tuple
+  of a setup() function, whose result is not timed, and a run(state) function
+  """
+  records = split_pbsnodes(pbsnodes)
+  hosts   = list(records.keys())
+
+  def unparsed(): return [node(host, pbsnodes=records[host], parse=False) for host in hosts]
+
+  def run_parse(method):
+    def run(objs):
+      for obj in objs: getattr(obj, method)()
+    return run
+
+  return {'collect':          (lambda: None, lambda state: live.fetch(None)),
+          'split':            (lambda: None, lambda state: split_pbsnodes(pbsnodes)),
+          'parse':            (unparsed,     run_parse('parse')),
+          'nodes':            (lambda: None, lambda state: nodes('genius', source=source, hostnames=hosts))}
+
+#--------------------------------------
+def bench_pipeline(n_hosts, repeat=3, memory=True):
+  """
+  Time every stage of the pipeline on a synthetic cluster of "n_hosts" nodes
+  (one in 25 being a 4-GPU node); return a dictionary of the results per stage
+  """
+  n_gpu  = max(1, n_hosts // 25)
+  source = synthetic_source(n_cpu=n_hosts - n_gpu, n_gpu=n_gpu)
+  pbsnodes = source.fetch(None)
+  result = dict()
+  with tempfile.TemporaryDirectory() as workdir:
+    live = install_fake_pbsnodes_all(workdir, pbsnodes)
+    for stage, (setup, run) in get_stages(source, live, pbsnodes).items():
+      best = float('inf')
+      for i in range(repeat):
+        state = setup()
+        t0 = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - t0)
+      peak = None
+      if memory:
+        state = setup()
+        peak  = peak_memory(lambda: run(state))
+      result[stage] = {'seconds': best, 'nodes_per_sec': n_hosts / best, 'peak_bytes': peak}
+  return result
+
+#--------------------------------------
+def bench_memory(n_hosts=10000, **kwargs):
+  """
+  Return the number of bytes which a nodes instance of a synthetic cluster 
+  of "n_hosts" nodes retains per node; kwargs are passed on to nodes()
+  """
+  n_gpu  = max(1, n_hosts // 25)
+  source = synthetic_source(n_cpu=n_hosts - n_gpu, n_gpu=n_gpu)
+  source.fetch(None)  # the records are rendered (and cached) outside the trace
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  pool   = nodes('genius', source=source, hostnames=source.list_hostnames(), **kwargs)
+  after  = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return (after - before) / len(pool.list_hosts)
+
+#--------------------------------------
+def print_memory(n_hosts):
+  """
+  Print the bytes per node, with and without the raw texts
+  """
+  print(f'{"nodes":>7s} {"keep_raw":<9s} {"bytes/node":>11s}')
+  for keep_raw in (True, False):
+    print(f'{n_hosts:>7d} {str(keep_raw):<9s} {bench_memory(n_hosts, keep_raw=keep_raw):>11.0f}')
+
+#--------------------------------------
+def get_meta():
+  """
+  Describe the environment of the benchmark run
+  """
+  try:
+    revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+  except OSError:
+    revision = ''
+  return {'revision': revision or 'unknown', 'python': platform.python_version(),
+          'machine': platform.machine(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+#--------------------------------------
+def print_pipeline(results, baseline=None):
+  """
+  Print the pipeline results as a table; with a baseline (the results of an 
+  earlier run), the ratio of the new over the old timings is also printed
+  """
+  old = {(run['n_hosts'], stage): val['seconds'] for run in (baseline or {}).get('runs', [])
+                                                 for stage, val in run['stages'].items()}
+  print(f'{"nodes":>7s} {"stage":<18s} {"time [ms]":>10s} {"nodes/s":>11s} {"peak [MiB]":>11s}' +
+        (f' {"new/old":>8s}' if baseline else ''))
+  for run in results['runs']:
+    for stage, val in run['stages'].items():
+      peak = f'{val["peak_bytes"] / 2**20:>11.1f}' if val['peak_bytes'] is not None else f'{"-":>11s}'
+      line = (f'{run["n_hosts"]:>7d} {stage:<18s} {1e3 * val["seconds"]:>10.2f} '
+              f'{val["nodes_per_sec"]:>11.0f} {peak}')
+      if baseline:
+        ref   = old.get((run['n_hosts'], stage))
+        line += f' {val["seconds"] / ref:>8.2f}' if ref else f' {"-":>8s}'
+      print(line)
+
+#--------------------------------------
+def print_profile(n_hosts, n_sweeps=5, cprofile=None):
+  """
+  Print the instruments of a nodes instance over a gather and "n_sweeps"
+  refreshes of synthetic hosts, behind a fake "pbsnodes -a" script; with
+  "cprofile", one more refresh runs under cProfile (saved if it is a path)
+  """
+  from def_profile import profile_sweep
+  generator = synthetic_source(n_cpu=n_hosts - n_hosts // 25, n_gpu=n_hosts // 25)
+  with tempfile.TemporaryDirectory() as workdir:
+    source = install_fake_pbsnodes_all(workdir, generator.fetch(None))
+    pool   = nodes('genius', source=source, hostnames=generator.list_hostnames(), profile=True)
+    for k in range(n_sweeps):
+      generator.advance()
+      with open(os.path.join(workdir, 'pbsnodes.txt'), 'w') as w: w.write(generator.fetch(None))
+      pool.refresh()
+    print(pool.profile.format())
+    if cprofile is not None:
+      diff, text = profile_sweep(pool, path=cprofile or None)
+      print(text)
+
+#--------------------------------------
+# the modules which "snapshot --from-cache" must not load
+heavy_modules = ('numpy', 'tkinter', 'concurrent.futures', 'http.server', 'def_snapshot',
+                 'def_gui', 'def_collector', 'def_history')
+
+# the start-up budget [ms] per cache size: the 100 ms target holds for a cache
+# of the size of genius; a larger cache adds the decoding and the formatting
+# of every row (about 35 us per host), so 10000 hosts get 450 ms
+startup_budgets = {110: 100.0, 10000: 450.0}
+
+#--------------------------------------
+def time_process(command, repeat):
+  """
+  Return the median wall-clock time (in seconds) of running "command" as a process
+  """
+  times = list()
+  for k in range(repeat):
+    start = time.perf_counter()
+    subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+    times.append(time.perf_counter() - start)
+  return sorted(times)[len(times) // 2]
+
+#--------------------------------------
+def print_startup(sizes, repeat=7, budgets=None):
+  """
+  Print the start-up time of "snapshot --from-cache" for caches of "sizes"
+  synthetic hosts, and of a bare interpreter. "budgets" [ms] holds the target
+  of every size (by default from startup_budgets, else 100 ms); return the
+  number of runs which missed their budget
+  """
+  if budgets is None: budgets = [startup_budgets.get(n_hosts, 100.0) for n_hosts in sizes]
+  if len(budgets) != len(sizes):
+    logger.error('Error: print_startup: give one budget per size')
+    sys.exit(1)
+  n_over = 0
+  script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cluster_watch.py')
+  probe  = (f'import sys, io; sys.path.insert(0, {os.path.dirname(script)!r}); import cluster_watch; '
+            'cluster_watch.main(sys.argv[1:], out=io.StringIO()); '
+            f'print(" ".join(m for m in {heavy_modules!r} if m in sys.modules))')
+  print(f'{"command":<34s} {"hosts":>7s} {"time [ms]":>10s}  heavy modules')
+  bare = time_process([sys.executable, '-c', 'pass'], repeat)
+  print(f'{"python -c pass":<34s} {"-":>7s} {1e3 * bare:>10.1f}')
+  with tempfile.TemporaryDirectory() as workdir:
+    for n_hosts, budget in zip(sizes, budgets):
+      source = synthetic_source(n_cpu=n_hosts - n_hosts // 25, n_gpu=n_hosts // 25)
+      cache  = os.path.join(workdir, f'genius-{n_hosts}.snap')
+      nodes('genius', source=source, hostnames=source.list_hostnames(), cache=cache)
+      for fmt in ('text', 'json'):
+        args    = ['snapshot', '--from-cache', cache, '--format', fmt]
+        elapsed = time_process([sys.executable, script] + args, repeat)
+        loaded  = subprocess.run([sys.executable, '-c', probe] + args, stdout=subprocess.PIPE,
+                                 universal_newlines=True, check=True).stdout.strip()
+        flag    = '' if 1e3 * elapsed <= budget else f'  (over {budget:.0f} ms)'
+        n_over += bool(flag)
+        print(f'{"snapshot --from-cache --format " + fmt:<34s} {n_hosts:>7d} {1e3 * elapsed:>10.1f}  '
+              f'{loaded or "-"}{flag}')
+  return n_over
+
+#--------------------------------------
+def main():
+
+  parser = argparse.ArgumentParser(description='Benchmarks of cluster_watch')
+  tasks  = parser.add_subparsers(dest='task')
+  pipe   = tasks.add_parser('pipeline', help='time the collect -> parse -> aggregate stages')
+  pipe.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+  pipe.add_argument('--repeat', type=int, default=3)
+  pipe.add_argument('--no-memory', action='store_true', help='skip the peak memory pass')
+  pipe.add_argument('--output', help='save the results to this JSON file')
+  pipe.add_argument('--compare', help='compare against the results in this JSON file')
+  tasks.add_parser('sweep', help='compare the per-host and the bulk collection paths')
+  memo   = tasks.add_parser('memory', help='measure the bytes retained per node')
+  memo.add_argument('--hosts', type=int, default=10000)
+  prof   = tasks.add_parser('profile', help='report the stage timers, latencies and counters')
+  prof.add_argument('--hosts', type=int, default=10000)
+  prof.add_argument('--sweeps', type=int, default=5)
+  prof.add_argument('--cprofile', nargs='?', const='', default=None,
+                    help='run one more sweep under cProfile (and save it to this file)')
+  boot   = tasks.add_parser('startup', help='time "cluster_watch.py snapshot --from-cache"')
+  boot.add_argument('--hosts', type=int, nargs='+', default=[110, 10000])
+  boot.add_argument('--repeat', type=int, default=7)
+  boot.add_argument('--budget', type=float, nargs='+', default=None,
+                    help='[ms] the target start-up time of every --hosts size')
+  args = parser.parse_args()
+
+  if args.task == 'startup':
+    return 1 if print_startup(args.hosts, args.repeat, args.budget) else 0
+
+  if args.task == 'profile':
+    print_profile(args.hosts, args.sweeps, args.cprofile)
+    return 0
+
+  if args.task == 'sweep':
+    bench_sweep()
+    return 0
+
+  if args.task == 'memory':
+    print_memory(args.hosts)
+    return 0
+
+  if args.task is None: args = parser.parse_args(['pipeline'])
+  results = {'meta': get_meta(), 'runs': list()}
+  for n_hosts in args.sizes:
+    stages = bench_pipeline(n_hosts, repeat=args.repeat, memory=not args.no_memory)
+    results['runs'].append({'n_hosts': n_hosts, 'stages': stages})
+
+  baseline = None
+  if args.compare:
+    with open(args.compare, 'r') as r: baseline = json.load(r)
+  print_pipeline(results, baseline)
+
+  if args.output:
+    with open(args.output, 'w') as w: json.dump(results, w, indent=1)
+  return 0
+
+#--------------------------------------
+if __name__ == '__main__':
+  sys.exit(main())
+#--------------------------------------
@@ -0,0 +1,277 @@
+"""
+Name:    cluster_watch
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   $> python cluster_watch.py snapshot genius [--format text|json|metrics] [--cache genius.snap]
+         $> python cluster_watch.py snapshot genius --from-cache genius.snap
+         $> python cluster_watch.py watch genius [--interval 5] [--stream]
+         $> python cluster_watch.py gui genius [--interval 60] [--cache genius.snap]
+         $> python cluster_watch.py serve genius [--address 127.0.0.1:8642] [--metrics]
+         $> python cluster_watch.py inventory genius --discover [--inventory-cache genius.inventory]
+Return:  The snapshot of a cluster as a table, JSON lines or Prometheus text;
+         a live table or change stream; a Tk dashboard; a resident collector;
+         or the hostnames of the cluster as compact range expressions
+Purpose: The command-line entry point of the tool, with one subcommand per
+         way of looking at a cluster
+Remarks: + Only argparse and logging are imported at start; every subcommand
+           imports the modules which it needs when it runs, so that e.g.
+           "snapshot" never loads Tkinter or NumPy, and "snapshot --from-cache"
+           never calls "pbsnodes" (see "startup" in bench_def)
+         + The common options choose the data source (the live "pbsnodes"
+           command, --replay of captured files, or --synthetic hosts), the
+           cache file of the last complete snapshot, the hostnames (an
+           --inventory file, or --discover them; see def_inventory), and the
+           collection
+         + --profile writes the report of the instruments of def_profile to
+           stderr when the subcommand ends, and --cprofile runs the first
+           sweep under cProfile (--cprofile-out PATH also saves it); a flag
+           without a value, so it never takes the cluster name
+         + def.py (formerly the "gpu_info" script) calls main()
+"""
+import sys
+import logging
+import argparse
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+
+#--------------------------------------
+def get_parser():
+  """
+  Return the argparse parser of all subcommands
+  """
+  common = argparse.ArgumentParser(add_help=False)
+  common.add_argument('cluster', nargs='?', default='genius', help='thinking, genius or breniac')
+  where  = common.add_mutually_exclusive_group()
+  where.add_argument('--replay', metavar='PATH',
+                     help='replay captured "pbsnodes" output (a file, or a directory of frames)')
+  where.add_argument('--synthetic', metavar='N', type=int,
+                     help='make up N synthetic hosts instead of calling "pbsnodes"')
+  common.add_argument('--cache', metavar='PATH', help='save every complete snapshot to this file')
+  hosts  = common.add_mutually_exclusive_group()
+  hosts.add_argument('--inventory', metavar='PATH',
+                     help='read the hostnames from this file, e.g. with lines like r22i13n[01-24]')
+  hosts.add_argument('--discover', action='store_true',
+                     help='ask pbs_server for the hostnames, with one "pbsnodes -l all" call')
+  common.add_argument('--inventory-cache', metavar='PATH',
+                      help='keep the hostnames of --inventory or --discover in this file')
+  common.add_argument('--max-age', type=float, default=3600,
+                      help='[s] how long discovered hostnames are taken from the cache')
+  common.add_argument('--batch-size', type=int, default=32,
+                      help='hostnames per "pbsnodes" call (0: all in one call)')
+  common.add_argument('--workers', type=int, default=8, help='concurrent "pbsnodes" calls')
+  common.add_argument('--timeout', type=float, default=30, help='[s] per "pbsnodes" call')
+  common.add_argument('--profile', action='store_true',
+                      help='write the stage timers, latencies and counters to stderr at the end')
+  common.add_argument('--cprofile', action='store_true', help='run the first sweep under cProfile')
+  common.add_argument('--cprofile-out', metavar='PATH',
+                      help='save the cProfile statistics of --cprofile to PATH (implies --cprofile)')
+  common.add_argument('--verbose', '-v', action='count', default=0)
+
+  parser = argparse.ArgumentParser(prog='cluster_watch',
+                                   description='Live monitoring of the nodes of a Torque cluster')
+  tasks  = parser.add_subparsers(dest='command', metavar='command')
+  tasks.required = True
+
+  snap = tasks.add_parser('snapshot', parents=[common], help='print one snapshot and exit')
+  snap.add_argument('--from-cache', metavar='PATH',
+                    help='print the snapshot saved in PATH, without calling "pbsnodes"')
+  snap.add_argument('--format', choices=('text', 'json', 'metrics'), default='text',
+                    help='a table, JSON lines (one per node and GPU), or Prometheus text')
+
+  look = tasks.add_parser('watch', parents=[common], help='a live table in the terminal')
+  look.add_argument('--interval', type=float, default=5.0, help='[s] between two refreshes')
+  look.add_argument('--ticks', type=int, default=None, help='stop after this many refreshes')
+  look.add_argument('--stream', action='store_true', help='write the changes as JSON lines instead')
+
+  show = tasks.add_parser('gui', parents=[common], help='a Tk dashboard of the cluster')
+  show.add_argument('--interval', type=float, default=60.0, help='[s] between two refreshes')
+  show.add_argument('--columns', type=int, default=48, help='tiles per row')
+
+  serve = tasks.add_parser('serve', parents=[common], help='a resident collector over HTTP')
+  serve.add_argument('--address', default='127.0.0.1:8642', help='host:port, or a UNIX socket path')
+  serve.add_argument('--interval', type=float, default=60.0, help='[s] between two refreshes')
+  serve.add_argument('--metrics', action='store_true', help='also serve /metrics for Prometheus')
+
+  names = tasks.add_parser('inventory', parents=[common], help='print the hostnames as range expressions')
+  names.add_argument('--groups', action='store_true', help='also count the hosts per rack, IRU and pool')
+  return parser
+
+#--------------------------------------
+def make_source(args):
+  """
+  Return the data source of the options, or None for the live "pbsnodes"
+  """
+  if args.replay:
+    from def_source import replay_source
+    return replay_source(args.replay)
+  if args.synthetic:
+    from def_source import synthetic_source
+    n_hosts = args.synthetic
+    return synthetic_source(n_cpu=n_hosts - n_hosts // 25, n_gpu=n_hosts // 25)
+  return None
+
+#--------------------------------------
+def make_pool(args, collect=True):
+  """
+  Return the nodes instance of the options; with collect=True, the first
+  sweep is done (under cProfile, with --cprofile or --cprofile-out)
+  """
+  from def_nodes import nodes
+  source    = make_source(args)
+  hostnames = (source.list_hostnames() or None) if source is not None else None
+  cprofile  = args.cprofile or args.cprofile_out is not None
+  inventory = None
+  if args.inventory or args.discover:
+    from def_inventory import load_inventory
+    inventory = load_inventory(args.cluster, path=args.inventory, source=source,
+                               cache=args.inventory_cache, max_age=args.max_age, timeout=args.timeout)
+  pool = nodes(args.cluster, source=source, hostnames=hostnames, batch_size=args.batch_size,
+               max_workers=args.workers, timeout=args.timeout, cache=args.cache, collect=False,
+               profile=args.profile or cprofile, inventory=inventory)
+  if not collect: return pool
+  if cprofile:
+    from def_profile import profile_sweep
+    diff, text = profile_sweep(pool, path=args.cprofile_out)
+    sys.stderr.write(text)
+  else:
+    pool.gather_nodes()
+  return pool
+
+#--------------------------------------
+def format_table(pool):
+  """
+  Return the text table of a snapshot: a status line, and one row per host
+  with the node columns and one cell per GPU device (see def_watch)
+  """
+  from def_watch import text_table
+  from def_gpu import count_slots
+  table = text_table(pool)
+  width = max((count_slots(obj.gpu_list) for obj in pool.list_hosts), default=0)
+  age   = pool.get_age()
+  lines = [f'{pool.cluster}: {len(pool.list_hosts)} hosts, {len(pool.failed_hosts)} failed'
+           + (f', age {age:.0f} s' if age is not None else '') + (' (cached)' if pool.stale else ''),
+           ' '.join(table.header(width)).rstrip()]
+  for obj in pool.list_hosts: lines.append(' '.join(table.format_row(obj, width)).rstrip())
+  for host, why in pool.failed_hosts.items(): lines.append(f'{host:<11s} ({why})')
+  return '\n'.join(lines) + '\n'
+
+#--------------------------------------
+def run_snapshot(args, out):
+  """
+  The "snapshot" subcommand: collect (or load) one snapshot, and print it
+  """
+  if args.from_cache:
+    from def_nodes import nodes
+    pool = nodes(args.cluster, cache=args.from_cache, collect=False)
+    if not pool.load_cache(adopt=True):
+      logger.error(f'Error: snapshot: {args.from_cache} is not a usable snapshot of {pool.cluster}')
+      sys.exit(1)
+  else:
+    pool = make_pool(args)
+
+  if args.format == 'json':
+    import json
+    from def_watch import full_records
+    for record in full_records(pool): out.write(json.dumps(record, separators=(',', ':')) + '\n')
+  elif args.format == 'metrics':
+    from def_exporter import exporter
+    out.write(exporter().render(pool).decode('utf-8'))
+  else:
+    out.write(format_table(pool))
+  return pool
+
+#--------------------------------------
+def run_watch(args, out):
+  """
+  The "watch" subcommand: a live table, or a JSON-lines change stream
+  """
+  from def_watch import watch, stream
+  pool = make_pool(args)
+  if args.stream:
+    stream(pool, interval=args.interval, out=out, ticks=args.ticks)
+  else:
+    watch(pool, interval=args.interval, out=out, ticks=args.ticks)
+  return pool
+
+#--------------------------------------
+def run_gui(args, out):
+  """
+  The "gui" subcommand: the Tk dashboard; the cached snapshot (if any) is
+  shown while the first sweep runs in the background
+  """
+  from def_gui import dashboard
+  pool = make_pool(args, collect=False)
+  pool.load_cache()
+  window = dashboard(pool, interval=args.interval, columns=args.columns)
+  try:
+    window.mainloop()
+  except KeyboardInterrupt:
+    window.close()
+  return pool
+
+#--------------------------------------
+def run_serve(args, out):
+  """
+  The "serve" subcommand: a resident collector, until interrupted
+  """
+  from def_collector import collector
+  exporter = None
+  if args.metrics:
+    from def_exporter import exporter as make_exporter
+    exporter = make_exporter()
+  pool   = make_pool(args)
+  daemon = collector(pool, interval=args.interval, exporter=exporter)
+  daemon.start()
+  logger.info(f'serve: {pool.cluster} on {args.address}')
+  try:
+    daemon.serve(args.address, block=True)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    daemon.shutdown()
+  return pool
+
+#--------------------------------------
+def run_inventory(args, out):
+  """
+  The "inventory" subcommand: print the hostnames of the cluster as range
+  expressions (which can be saved as an inventory file), without collecting
+  """
+  pool  = make_pool(args, collect=False)
+  pool.discover_hostnames()
+  found = pool.inventory
+  out.write(f'# {pool.cluster}: {len(found)} hosts ({found.origin})\n')
+  for expression in found.ranges(): out.write(expression + '\n')
+  if args.groups:
+    for by, groups in found.groups.items():
+      out.write(f'# {by}: ' + ', '.join(f'{group or "-"} {len(hosts)}' for group, hosts in groups.items()) + '\n')
+  return pool
+
+# the function of every subcommand
+commands = {'snapshot': run_snapshot, 'watch': run_watch, 'gui': run_gui, 'serve': run_serve,
+            'inventory': run_inventory}
+
+#--------------------------------------
+def main(argv=None, out=None):
+  """
+  Run the subcommand of the command line "argv" (default: sys.argv), and
+  return the exit status
+  """
+  args = get_parser().parse_args(argv)
+  out  = out or sys.stdout
+  logging.basicConfig(format='%(levelname)s %(name)s: %(message)s',
+                      level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)])
+  try:
+    pool = commands[args.command](args, out)
+  except BrokenPipeError:   # e.g. piped into "head"
+    return 0
+  if args.profile: sys.stderr.write(pool.profile.format() + '\n')
+  return 0
+
+#--------------------------------------
+if __name__ == '__main__':
+  sys.exit(main())
+#--------------------------------------
@@ -0,0 +1,341 @@
+"""
+Name:    def_alerts
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   engine = alert_engine(default_rules, sinks=[file_sink('alerts.jsonl')])
+         engine.evaluate(pool)              # full pass, e.g. after gather_nodes()
+         engine.update(pool, pool.refresh()) # only the hosts and fields which changed
+Return:
+Purpose: To raise threshold, state and trend alerts on the nodes of a cluster,
+         e.g. a hot GPU, rising double-bit ECC errors, a node going down, or a
+         load far above the number of cores, without checking every rule on
+         every node at every tick
+Remarks: + A rule is a dictionary: name, field, op, value, and optionally per
+           (divide the field by another field, e.g. loadave per np), clear
+           (the value at which an active alert resolves), severity and
+           cooldown (seconds); see default_rules
+         + op is one of >, >=, <, <=, ==, != (threshold), 'has' (an item of
+           the comma-separated state), or 'rise' (the field grew since the
+           previous snapshot; e.g. error counters)
+         + The rules are indexed by the fields they read; update() only
+           evaluates the rules of the fields which a snapshot_diff reports
+           as changed, on the hosts which changed; evaluate() is the full
+           pass over all hosts, e.g. for the first snapshot
+         + A host whose state or set of GPU devices changed (e.g. a node
+           going down reports no gpu_status) gets all rules again, and the
+           alerts of its devices which are gone resolve
+         + An alert fires once when it becomes active and is then kept, until
+           it resolves; a rise alert fires at most once per cooldown. Every
+           rule has a token bucket (def_scheduler.rate_limiter) which limits
+           the events it can emit per minute; the dropped events are counted
+         + The events (dictionaries) go to all sinks: file_sink (JSON lines),
+           socket_sink (JSON lines over a UNIX or TCP socket), log_sink, or
+           any object with an emit(event) method
+"""
+import sys, os
+import logging
+import json
+import operator
+import socket
+import time
+
+from def_diff import node_deltas, cpu_deltas, gpu_deltas, node_texts, gpu_texts
+from def_scheduler import rate_limiter
+from def_gpu import find_device
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the comparison operators of the threshold rules
+comparisons = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+               '==': operator.eq, '!=': operator.ne}
+
+# the fields which a rule can read, i.e. the fields which a snapshot_diff tracks
+watched_fields = set(node_deltas + node_texts) | set(cpu_deltas) | set(gpu_deltas + gpu_texts) | {'state'}
+
+# a sensible set of rules for the genius cluster
+default_rules = [
+  {'name': 'gpu_hot', 'field': 'gpu_temperature', 'op': '>', 'value': 85, 'clear': 80,
+   'severity': 'warning'},
+  {'name': 'gpu_double_bit_ecc', 'field': 'gpu_double_bit_ecc_errors', 'op': 'rise',
+   'severity': 'critical', 'cooldown': 3600},
+  {'name': 'node_down', 'field': 'state', 'op': 'has', 'value': 'down', 'severity': 'critical'},
+  {'name': 'overload', 'field': 'loadave', 'op': '>', 'value': 1.5, 'per': 'np', 'clear': 1.2,
+   'severity': 'warning'},
+]
+
+#--------------------------------------
+def get_field(obj, field, device=None):
+  """
+  Return the value of "field" of a node object; a GPU field needs the device index
+  """
+  if field in gpu_deltas or field in gpu_texts:
+    dev = find_device(obj.gpu_list, device)
+    return None if dev is None else getattr(dev, field)
+  if field in cpu_deltas: return getattr(obj.cpu, field)
+  return getattr(obj, field)
+
+# C L A S S ###########################
+class rule:
+  """
+  One compiled alert rule
+  """
+  __slots__ = ('name', 'field', 'op', 'value', 'per', 'clear', 'severity', 'cooldown',
+               'test', 'test_clear', 'is_gpu', 'limiter')
+
+  #------------------------------------
+  def __init__(self, spec, rate=10, clock=time.monotonic):
+    self.name     = spec['name']
+    self.field    = spec['field']
+    self.op       = spec['op']
+    self.value    = spec.get('value')
+    self.per      = spec.get('per')
+    self.clear    = spec.get('clear', self.value)
+    self.severity = spec.get('severity', 'warning')
+    self.cooldown = spec.get('cooldown', 600)
+    self.is_gpu   = self.field in gpu_deltas or self.field in gpu_texts
+    # at most "rate" events per minute, with a burst of "rate"
+    self.limiter  = rate_limiter(rate / 60.0, burst=rate, clock=clock)
+
+    for field in (self.field, self.per):
+      if field is not None and field not in watched_fields:
+        logger.error(f'rule: {self.name}: the field {field} is not tracked by the snapshot diff')
+        sys.exit(1)
+    if self.op in comparisons:
+      compare = comparisons[self.op]
+      self.test       = lambda val, lim=self.value: compare(val, lim)
+      self.test_clear = lambda val, lim=self.clear: compare(val, lim)
+    elif self.op == 'has':
+      self.test       = lambda val, item=self.value: item in (val or '').split(',')
+      self.test_clear = self.test
+    elif self.op == 'rise':
+      self.test = self.test_clear = None
+    else:
+      logger.error(f'rule: {self.name}: unknown operator {self.op}')
+      sys.exit(1)
+
+  #------------------------------------
+  def measure(self, obj, device=None):
+    """
+    Return the value which this rule checks on one node object (None if missing)
+    """
+    value = get_field(obj, self.field, device)
+    if self.per is None or value is None: return value
+    base = get_field(obj, self.per)
+    return value / base if base else None
+
+  #------------------------------------
+  def fields(self):
+    """
+    Return the fields which this rule reads
+    """
+    return [self.field] + ([self.per] if self.per else [])
+
+# C L A S S ###########################
+class alert_engine:
+  """
+  Evaluate the alert rules on the snapshots of a nodes instance
+  """
+  #------------------------------------
+  def __init__(self, rules=None, sinks=None, rate=10, clock=time.time):
+    self.rules  = [rule(spec, rate) for spec in (default_rules if rules is None else rules)]
+    self.sinks  = list(sinks or [log_sink()])
+    self.clock  = clock
+
+    # field -> rules which read it
+    self.by_field = dict()
+    for item in self.rules:
+      for field in item.fields(): self.by_field.setdefault(field, []).append(item)
+
+    # the active alerts: (rule name, hostname, device) -> the event which fired it;
+    # the time of the last rise event per key; the number of dropped events per rule
+    self.active     = dict()
+    self.last_rise  = dict()
+    self.suppressed = {item.name: 0 for item in self.rules}
+    # the GPU device indices per host, when its rules were last evaluated
+    self.devices    = dict()
+
+  #------------------------------------
+  def emit(self, item, status, host, device, value):
+    """
+    Build one event, and hand it to all sinks unless the rule is over its rate
+    """
+    if not item.limiter.take():
+      self.suppressed[item.name] += 1
+      return None
+    subject = host if device is None else f'{host} gpu[{device}]'
+    event = {'time': self.clock(), 'rule': item.name, 'status': status, 'severity': item.severity,
+             'host': host, 'device': device, 'field': item.field, 'value': value,
+             'limit': item.value,
+             'message': f'{item.name} {status} on {subject}: {item.field}'
+                        + (f'/{item.per}' if item.per else '') + f' = {value}'}
+    for sink in self.sinks:
+      try:
+        sink.emit(event)
+      except OSError as err:
+        logger.warning(f'emit: the sink {sink} failed: {err}')
+    return event
+
+  #------------------------------------
+  def check(self, item, obj, device=None, old=None):
+    """
+    Evaluate one rule on one node object (and GPU device)
+    """
+    host  = obj.hostname
+    key   = (item.name, host, device)
+    value = item.measure(obj, device)
+    if value is None: return
+    if item.op == 'rise':
+      now = self.clock()
+      if old is not None and value > old and now - self.last_rise.get(key, -float('inf')) >= item.cooldown:
+        self.last_rise[key] = now
+        self.emit(item, 'firing', host, device, value)
+      return
+    if key in self.active:
+      if not item.test_clear(value):
+        del self.active[key]
+        self.emit(item, 'resolved', host, device, value)
+    elif item.test(value):
+      self.active[key] = self.emit(item, 'firing', host, device, value)
+
+  #------------------------------------
+  def check_host(self, obj, rules=None):
+    """
+    Evaluate the (given) rules on all devices of one node object
+    """
+    self.devices[obj.hostname] = tuple(dev.index for dev in obj.gpu_list)
+    for item in (self.rules if rules is None else rules):
+      if item.is_gpu:
+        for dev in obj.gpu_list: self.check(item, obj, dev.index)
+      else:
+        self.check(item, obj)
+
+  #------------------------------------
+  def update(self, pool, diff):
+    """
+    Evaluate the rules which read the fields that changed in "diff" (a
+    snapshot_diff of pool.refresh()), on the hosts which changed; the new hosts,
+    and the hosts whose state or GPU devices changed, get all rules, and
+    the alerts of the removed hosts (and devices) resolve
+    """
+    for host in diff.added:
+      obj = pool.get_node(host)
+      if obj is not None: self.check_host(obj)
+    for host, changes in diff.changed.items():
+      obj = pool.get_node(host)
+      if obj is None: continue
+      devices = tuple(dev.index for dev in obj.gpu_list)
+      if changes.state or self.devices.get(host) != devices:
+        self.resolve_devices(host, devices)
+        self.check_host(obj)
+      for key, (old, new) in changes.deltas.items():
+        field, bracket, device = key.partition('[')
+        device = int(device[:-1]) if bracket else None
+        for item in self.by_field.get(field, ()):
+          if item.is_gpu and device is None:
+            for dev in obj.gpu_list: self.check(item, obj, dev.index)
+          elif item.field == field and item.op == 'rise':
+            self.check(item, obj, device, old)
+          else:
+            self.check(item, obj, device)
+    self.resolve_hosts(diff.removed)
+
+  #------------------------------------
+  def resolve_hosts(self, hostnames):
+    """
+    Resolve all active alerts of "hostnames", e.g. when they leave the cluster
+    """
+    gone = set(hostnames)
+    if not gone: return
+    items = {item.name: item for item in self.rules}
+    for host in gone: self.devices.pop(host, None)
+    for key in [key for key in self.active if key[1] in gone]:
+      del self.active[key]
+      self.emit(items[key[0]], 'resolved', key[1], key[2], None)
+
+  #------------------------------------
+  def resolve_devices(self, host, devices):
+    """
+    Resolve the active alerts of the GPU devices of "host" whose index is not
+    in "devices", e.g. when a node which went down reports no devices
+    """
+    items = {item.name: item for item in self.rules}
+    for key in [key for key in self.active if key[1] == host and key[2] is not None and key[2] not in devices]:
+      del self.active[key]
+      self.emit(items[key[0]], 'resolved', host, key[2], None)
+
+  #------------------------------------
+  def evaluate(self, pool):
+    """
+    Evaluate all rules on all hosts of the nodes instance "pool" (a full pass);
+    the alerts which became active fire, those which are no longer violated
+    resolve, and so do the alerts of the hosts which left
+    """
+    for obj in pool.list_hosts: self.check_host(obj)
+    self.resolve_hosts({key[1] for key in self.active if pool.get_node(key[1]) is None})
+
+  #------------------------------------
+
+# C L A S S ###########################
+class log_sink:
+  """
+  Write the events into the log
+  """
+  def emit(self, event):
+    level = logging.ERROR if event['severity'] == 'critical' and event['status'] == 'firing' else logging.WARNING
+    logger.log(level, event['message'])
+
+# C L A S S ###########################
+class list_sink:
+  """
+  Keep the events in a list, e.g. for a GUI or for tests
+  """
+  def __init__(self):
+    self.events = list()
+
+  def emit(self, event):
+    self.events.append(event)
+
+# C L A S S ###########################
+class file_sink:
+  """
+  Append the events, one JSON object per line, to a file
+  """
+  def __init__(self, path):
+    self.path = path
+
+  def emit(self, event):
+    with open(self.path, 'a') as f: f.write(json.dumps(event) + '\n')
+
+# C L A S S ###########################
+class socket_sink:
+  """
+  Send the events, one JSON object per line, to a UNIX socket (a path) or a
+  TCP socket ('host:port'); the connection is opened again after a failure
+  """
+  def __init__(self, address, timeout=2):
+    self.address = address
+    self.timeout = timeout
+    self.sock    = None
+
+  def connect(self):
+    if ':' in self.address:
+      host, port = self.address.rsplit(':', 1)
+      self.sock = socket.create_connection((host, int(port)), timeout=self.timeout)
+    else:
+      self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      self.sock.settimeout(self.timeout)
+      self.sock.connect(self.address)
+
+  def emit(self, event):
+    line = (json.dumps(event) + '\n').encode('utf-8')
+    try:
+      if self.sock is None: self.connect()
+      self.sock.sendall(line)
+    except OSError:
+      if self.sock is not None: self.sock.close()
+      self.sock = None
+      raise
+
+#--------------------------------------
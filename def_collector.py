@@ -0,0 +1,286 @@
+"""
+Name:    def_collector
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   daemon = collector(pool, interval=60)   # pool is an instance of nodes
+         daemon.start(); daemon.serve('127.0.0.1:8642')   # or a UNIX socket path
+         fetch('127.0.0.1:8642', '/snapshot')             # from any client
+Return:
+Purpose: To own the polling loop of a cluster in one long-running process,
+         and to serve the latest snapshot (and its diffs) to any number of
+         viewers, so that viewers never trigger their own pbsnodes calls
+Remarks: + The collector thread refreshes the nodes instance (either with a
+           fixed interval, or through a poll_scheduler), and after every
+           refresh renders the responses once: the compact JSON (and its
+           gzip) of the snapshot and of the diff
+         + The snapshot response is assembled from per-host JSON fragments,
+           and only the fragments of the changed hosts are encoded again
+         + The HTTP handlers only hand out the pre-rendered bytes, so a fetch
+           costs microseconds and never calls pbsnodes
+         + Endpoints: /version, /snapshot, /diff?since=<version>, and
+           /metrics with an exporter (see def_exporter); a diff request
+           which is older than the kept history gets status 410, and the
+           client should fetch /snapshot instead
+"""
+import sys, os
+import logging
+import collections
+import gzip
+import http.client
+import http.server
+import json
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+
+from def_serial import dump_node, layout
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+
+# C L A S S ###########################
+class rendered:
+  """
+  A pre-rendered response body, plain and gzip-compressed
+  """
+  __slots__ = ('body', 'gzip_body', 'content_type')
+
+  def __init__(self, body, content_type='application/json'):
+    self.body         = body
+    self.gzip_body    = gzip.compress(body, compresslevel=5)
+    self.content_type = content_type
+
+# C L A S S ###########################
+class collector:
+  """
+  A resident collector which serves the snapshots of one nodes instance
+  """
+  #------------------------------------
+  def __init__(self, pool, interval=60.0, scheduler=None, history=64, exporter=None):
+    self.pool      = pool
+    self.interval  = interval
+    self.scheduler = scheduler
+    self.stop      = threading.Event()
+    self.thread    = None
+    self.servers   = list()
+    self.lock      = threading.Lock()
+
+    # hostname -> (node object, JSON fragment), and the pre-rendered responses
+    self.fragments = dict()
+    self.version   = None
+    self.snapshot  = None
+    self.about     = None
+
+    # the Prometheus exporter (see def_exporter), and its rendered /metrics body
+    self.exporter  = exporter
+    self.metrics   = None
+
+    # the pre-rendered diffs of the last "history" versions: version -> bytes;
+    # the diffs cover every change after version self.base
+    self.diffs     = collections.OrderedDict()
+    self.history   = history
+    self.base      = pool.version
+
+    self.publish(None)
+
+  #------------------------------------
+  def publish(self, diff):
+    """
+    Render the responses of the current version of the nodes instance; only the
+    hosts whose node object was replaced by the refresh are encoded again, and
+    with a diff, these hosts also make up the rendered diff
+    """
+    pool  = self.pool
+    stamp = time.time()
+
+    # encode again the hosts whose node object was replaced since the last call
+    fresh = list()
+    cache = dict()
+    for obj in pool.list_hosts:
+      entry = self.fragments.get(obj.hostname)
+      if entry is None or entry[0] is not obj:
+        entry = (obj, dump_node(obj))
+        fresh.append(entry[1])
+      cache[obj.hostname] = entry
+    self.fragments = cache
+
+    head = json.dumps({'cluster': pool.cluster, 'version': pool.version, 'time': stamp,
+                       'layout': layout, 'failed': pool.failed_hosts}, separators=(',', ':'))
+    body = head[:-1] + ',"hosts":[' + ','.join(text for obj, text in cache.values()) + ']}'
+    snapshot = rendered(body.encode('utf-8'))
+
+    if diff is not None:
+      text = json.dumps({'version': diff.version, 'time': stamp, 'removed': diff.removed,
+                         'failed': diff.failed}, separators=(',', ':'))
+      text = text[:-1] + ',"hosts":[' + ','.join(fresh) + ']}'
+      with self.lock:
+        self.diffs[diff.version] = text.encode('utf-8')
+        while len(self.diffs) > self.history: self.base = self.diffs.popitem(last=False)[0]
+
+    about = rendered(json.dumps({'cluster': pool.cluster, 'version': pool.version,
+                                 'time': stamp, 'hosts': len(pool.list_hosts),
+                                 'collected': pool.stamp, 'stale': pool.stale},
+                                separators=(',', ':')).encode('utf-8'))
+    metrics = None
+    if self.exporter is not None:
+      metrics = rendered(self.exporter.render(pool), 'text/plain; version=0.0.4; charset=utf-8')
+    with self.lock:
+      self.version, self.snapshot, self.about, self.metrics = pool.version, snapshot, about, metrics
+
+  #------------------------------------
+  def get_diff(self, since):
+    """
+    Return the pre-rendered diffs after version "since" up to the current one, as
+    one JSON list, or None if the history does not reach back that far
+    """
+    with self.lock:
+      version = self.version
+      if since >= version: return rendered(b'[]')
+      if since < self.base: return None
+      pieces = [text for v, text in self.diffs.items() if v > since]
+    return rendered(b'[' + b','.join(pieces) + b']')
+
+  #------------------------------------
+  def loop(self):
+    """
+    The polling loop of the collector thread
+    """
+    if self.scheduler is not None:
+      self.scheduler.run(self.stop, on_diff=self.publish)
+      return
+    while not self.stop.wait(self.interval):
+      try:
+        self.publish(self.pool.next_sweep())
+      except Exception:
+        logger.exception('loop: the refresh failed; the last snapshot is kept')
+
+  #------------------------------------
+  def start(self):
+    """
+    Start the polling loop in a background thread
+    """
+    self.thread = threading.Thread(target=self.loop, name='collector', daemon=True)
+    self.thread.start()
+
+  #------------------------------------
+  def serve(self, address, block=False):
+    """
+    Serve the responses on "address": 'host:port' for localhost HTTP, or a path
+    for a UNIX socket. With block=False, the server runs in a background thread
+    """
+    handler = make_handler(self)
+    if ':' in address:
+      host, port = address.rsplit(':', 1)
+      server = http.server.ThreadingHTTPServer((host, int(port)), handler)
+    else:
+      if os.path.exists(address): os.unlink(address)
+      server = unix_http_server(address, handler)
+    self.servers.append(server)
+    if block:
+      server.serve_forever()
+    else:
+      threading.Thread(target=server.serve_forever, name='collector-http', daemon=True).start()
+    return server
+
+  #------------------------------------
+  def shutdown(self):
+    """
+    Stop the polling loop and all servers
+    """
+    self.stop.set()
+    for server in self.servers:
+      server.shutdown()
+      server.server_close()
+    if self.thread is not None: self.thread.join()
+
+# C L A S S ###########################
+class unix_http_server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  """
+  An HTTP server on a UNIX socket
+  """
+  daemon_threads = True
+
+#--------------------------------------
+def make_handler(daemon):
+  """
+  Return a request handler class which serves the responses of "daemon"
+  """
+  class handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+      return str(self.client_address[0]) if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, fmt, *args):
+      logger.debug(f'{self.address_string()} ' + fmt % args)
+
+    def do_GET(self):
+      url   = urllib.parse.urlsplit(self.path)
+      query = urllib.parse.parse_qs(url.query)
+      if url.path == '/snapshot':
+        reply = daemon.snapshot
+      elif url.path == '/version':
+        reply = daemon.about
+      elif url.path == '/metrics' and daemon.metrics is not None:
+        reply = daemon.metrics
+      elif url.path == '/diff':
+        try:
+          reply = daemon.get_diff(int(query.get('since', ['-1'])[0]))
+        except ValueError:
+          return self.send_error(400, 'since must be an integer')
+        if reply is None: return self.send_error(410, 'the diff history does not reach back that far')
+      else:
+        return self.send_error(404)
+      zipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+      body   = reply.gzip_body if zipped else reply.body
+      self.send_response(200)
+      self.send_header('Content-Type', reply.content_type)
+      self.send_header('Content-Length', str(len(body)))
+      if zipped: self.send_header('Content-Encoding', 'gzip')
+      self.end_headers()
+      self.wfile.write(body)
+
+  return handler
+
+# C L A S S ###########################
+class unix_connection(http.client.HTTPConnection):
+  """
+  An HTTP client connection over a UNIX socket
+  """
+  def __init__(self, path, timeout=10):
+    super().__init__('localhost', timeout=timeout)
+    self.path = path
+
+  def connect(self):
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.sock.settimeout(self.timeout)
+    self.sock.connect(self.path)
+
+#--------------------------------------
+def fetch(address, path='/snapshot', timeout=10):
+  """
+  Fetch one response from a collector at "address" ('host:port' or a UNIX socket
+  path), and return the decoded JSON (or the text of /metrics); raise OSError if
+  it can not be fetched
+  """
+  if ':' in address:
+    host, port = address.rsplit(':', 1)
+    conn = http.client.HTTPConnection(host, int(port), timeout=timeout)
+  else:
+    conn = unix_connection(address, timeout=timeout)
+  try:
+    conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+    reply = conn.getresponse()
+    body  = reply.read()
+    if reply.status != 200: raise OSError(f'fetch: {path} returned {reply.status} {reply.reason}')
+    if reply.getheader('Content-Encoding') == 'gzip': body = gzip.decompress(body)
+    if not reply.getheader('Content-Type', '').startswith('application/json'): return body.decode('utf-8')
+    return json.loads(body)
+  finally:
+    conn.close()
+
+#--------------------------------------
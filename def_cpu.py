@@ -15,6 +15,7 @@ Remarks: + All default string attributes are set to None
 """
 import sys
 import logging
+import time
 
 #--------------------------------------
 # logger to capture exceptions
@@ -29,7 +30,13 @@ class cpu:
   "status" entry of the "pbsnodes" command. For brevity, 
   only the critical attributes are captured for now; the rest
   can be easily elaborated later. The attribute list is complete.
+  The attributes are slotted, to keep the memory footprint small when
+  thousands of instances are kept around.
   """
+  __slots__ = ('opsys', 'uname', 'sessions', '_nsessions', '_loadave', 'netload', 
+               'state', 'varattr', 'puppethpccode', 'sudo', 'kernel', 'cpuclock', 
+               'macaddr', 'version', 'rectime', 'jobs', '_netload_rate')
+
   #------------------------------------
   def __init__(self):
     self.opsys = None
@@ -50,17 +57,32 @@ class cpu:
     self.rectime = None
     self.jobs = None
 
+    # Derived attributes, from two consecutive MOM reports (see def_rates)
+    self._netload_rate = None
+
   #------------------------------------
   @property
   def nsessions(self): return self._nsessions
   @nsessions.setter
-  def nsessions(self, val): self._nsessions = int(val)
+  def nsessions(self, val): self._nsessions = int(val.split()[-1]) # idle nodes report '? 0'
 
   @property
   def loadave(self): return self._loadave
   @loadave.setter
   def loadave(self, val): self._loadave = float(val)
 
+  @property
+  def netload_rate(self): return self._netload_rate     # [bytes/s], None if unknown
+  @netload_rate.setter
+  def netload_rate(self, val): self._netload_rate = None if val is None else float(val)
+
+  @property
+  def report_age(self):                                  # [s] since the MOM report
+    try:
+      return time.time() - int(self.rectime)
+    except (TypeError, ValueError):                      # missing, or not a number
+      return None
+
   #------------------------------------
   def set(self, attr, val):
     """
@@ -69,8 +91,8 @@ class cpu:
     try: 
       setattr(self, attr, val)
     except AttributeError:
-      logging.error(f"Error: set: cpu class does not have this attribute: {attr}")
-      sys.exit(1)
+      logger.debug(f"set: cpu class does not have this attribute: {attr}")
+      return None
 
   #------------------------------------
   def get(self, attr):
@@ -0,0 +1,149 @@
+"""
+Name:    def_diff
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   diff = pool.refresh()          # pool is an instance of the nodes class
+         diff.state_changes(), diff.jobs_added(), diff.changed['r22i13n01'].deltas
+Return:
+Purpose: To describe what changed between two consecutive snapshots of the
+         cluster, so that the consumers (GUI, alerts, history) only process
+         the changes instead of the full cluster on every tick
+Remarks: + node_diff compares two node objects of the same host: the state
+           transition, the jobs which started or ended, the GPU devices
+           which came or went, and the numeric and text fields which
+           changed, as (old, new) tuples
+         + The GPU fields are keyed by the device index, e.g.
+           'gpu_temperature[2]' or 'gpu_state[0]'; a device which came or
+           went only shows in the number of devices
+         + snapshot_diff collects the node_diff objects of one refresh,
+           together with the hosts which appeared, disappeared or failed
+"""
+import sys
+import logging
+
+from def_parser import parse_jobs
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the numeric fields which are compared: node, cpu and gpu attributes
+node_deltas = ('np', 'gpus', 'total_cores', 'dedicated_cores', 'total_threads',
+               'dedicated_threads')
+cpu_deltas  = ('loadave', 'nsessions', 'netload_rate')
+gpu_deltas  = ('gpu_utilization', 'gpu_memory_utilization', 'gpu_memory_used', 'gpu_memory_total',
+               'gpu_temperature', 'gpu_single_bit_ecc_errors', 'gpu_double_bit_ecc_errors',
+               'gpu_single_bit_ecc_rate', 'gpu_double_bit_ecc_rate')
+
+# the text fields which are compared (the node state and jobs have their own entries)
+node_texts  = ('power_state', 'properties', 'ntype')
+gpu_texts   = ('gpu_state', 'gpu_mode', 'gpu_ecc_mode', 'gpu_product_name')
+
+# C L A S S ###########################
+class node_diff:
+  """
+  The changes of one host between two snapshots
+  """
+  __slots__ = ('hostname', 'state', 'jobs_added', 'jobs_removed', 'devices', 'deltas')
+
+  #------------------------------------
+  def __init__(self, old, new):
+    self.hostname = new.hostname
+    self.state    = (old.state, new.state) if old.state != new.state else None
+
+    old_jobs = parse_jobs(old.jobs).keys() if old.jobs != new.jobs else set()
+    new_jobs = parse_jobs(new.jobs).keys() if old.jobs != new.jobs else set()
+    self.jobs_added   = set(new_jobs - old_jobs)
+    self.jobs_removed = set(old_jobs - new_jobs)
+    old_gpus = {dev.index: dev for dev in old.gpu_list}
+    new_gpus = {dev.index: dev for dev in new.gpu_list}
+    self.devices = (tuple(old_gpus), tuple(new_gpus)) if old_gpus.keys() != new_gpus.keys() else None
+
+    self.deltas = dict()
+    for attr in node_deltas + node_texts:
+      a, b = getattr(old, attr), getattr(new, attr)
+      if a != b: self.deltas[attr] = (a, b)
+    for attr in cpu_deltas:
+      a, b = getattr(old.cpu, attr), getattr(new.cpu, attr)
+      if a != b: self.deltas[attr] = (a, b)
+    for k, dev_b in new_gpus.items():
+      dev_a = old_gpus.get(k)
+      if dev_a is None: continue
+      for attr in gpu_deltas + gpu_texts:
+        a, b = getattr(dev_a, attr), getattr(dev_b, attr)
+        if a != b: self.deltas[f'{attr}[{k}]'] = (a, b)
+
+  #------------------------------------
+  def __bool__(self):
+    return bool(self.state or self.jobs_added or self.jobs_removed or self.devices or self.deltas)
+
+  #------------------------------------
+  def __repr__(self):
+    return (f'node_diff({self.hostname}: state={self.state}, +jobs={sorted(self.jobs_added)}, '
+            f'-jobs={sorted(self.jobs_removed)}, devices={self.devices}, deltas={self.deltas})')
+
+# C L A S S ###########################
+class snapshot_diff:
+  """
+  The changes of the cluster between two consecutive snapshots, i.e. the
+  result of one call to nodes.refresh()
+  """
+  #------------------------------------
+  def __init__(self, version):
+    self.version     = version   # the snapshot version which this diff leads to
+    self.added       = list()    # hosts which appear for the first time
+    self.removed     = list()    # hosts which are no longer part of the cluster
+    self.failed      = list()    # hosts which could not be refreshed (kept stale)
+    self.changed     = dict()    # hostname -> node_diff, for the hosts which changed
+    self.reparsed    = list()    # hosts whose node object was replaced (added or parsed again)
+    self.n_reparsed  = 0         # records whose text changed, and were parsed again
+    self.n_unchanged = 0         # records whose text is identical, and were skipped
+
+  #------------------------------------
+  def __bool__(self):
+    return bool(self.added or self.removed or self.changed)
+
+  #------------------------------------
+  def hosts(self):
+    """
+    Return the hostnames which consumers have to revisit: added or changed
+    """
+    return self.added + list(self.changed.keys())
+
+  #------------------------------------
+  def state_changes(self):
+    """
+    Return a dictionary of hostname -> (old state, new state)
+    """
+    return {host: d.state for host, d in self.changed.items() if d.state}
+
+  #------------------------------------
+  def jobs_added(self):
+    """
+    Return a dictionary of hostname -> set of the job ids which started there
+    """
+    return {host: d.jobs_added for host, d in self.changed.items() if d.jobs_added}
+
+  #------------------------------------
+  def jobs_removed(self):
+    """
+    Return a dictionary of hostname -> set of the job ids which left there
+    """
+    return {host: d.jobs_removed for host, d in self.changed.items() if d.jobs_removed}
+
+  #------------------------------------
+  def deltas(self, field):
+    """
+    Return a dictionary of hostname -> (old, new) of one field, e.g.
+    'loadave' or 'gpu_temperature[0]'
+    """
+    return {host: d.deltas[field] for host, d in self.changed.items() if field in d.deltas}
+
+  #------------------------------------
+  def __repr__(self):
+    return (f'snapshot_diff(version={self.version}, added={len(self.added)}, '
+            f'removed={len(self.removed)}, changed={len(self.changed)}, '
+            f'failed={len(self.failed)}, reparsed={self.n_reparsed}, '
+            f'unchanged={self.n_unchanged})')
+
+  #------------------------------------
@@ -0,0 +1,153 @@
+"""
+Name:    def_exporter
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   daemon = collector(pool, exporter=exporter())   # see def_collector
+         daemon.start(); daemon.serve('0.0.0.0:9842')     # scrape http://<host>:9842/metrics
+Return:
+Purpose: To publish the node, cpu and gpu metrics of a cluster in the
+         Prometheus text exposition format, labeled by cluster, host, rack,
+         pool and GPU device, so that the cluster can be scraped by a metrics
+         stack
+Remarks: + The metric families are derived from the field tables of
+           def_parser: every field which is converted to an int or a float
+           (except the MOM ports and the PCI device id, which are not
+           measurements), the derived rates of def_rates (left out while
+           unknown), plus the node state as a 0/1 family
+         + render() is called once per snapshot version (by the collector);
+           the scrapes are served from the rendered bytes, so their cost
+           does not depend on the scrape frequency or the number of scrapers
+         + The samples of every host are kept as per-family text fragments,
+           and only the hosts whose node object was replaced are rendered
+           again; the body is then the concatenation of the fragments
+         + Every series (also the snapshot ones) has the label cluster, so that
+           the collectors of several clusters can share one metrics stack
+"""
+import sys
+import logging
+
+from def_parser import node_fields, cpu_fields, gpu_fields
+from def_parser import numeric_converters
+from def_source import parse_hostname
+from def_inventory import get_parts
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the numeric fields which are not measurements
+skipped_attrs      = {'_mom_service_port', '_mom_manager_port', '_gpu_pci_device_id'}
+
+# the help texts (units) of the families which need more than their name
+units = {'gpu_memory_total': 'MB', 'gpu_memory_used': 'MB', 'gpu_utilization': '%',
+         'gpu_memory_utilization': '%', 'gpu_temperature': 'degrees C'}
+
+# the derived rate metrics (see def_rates): (kind, attribute, help)
+derived_families = (('cpu', '_netload_rate', 'cpu network throughput [bytes/s] from netload'),
+                    ('gpu', '_gpu_single_bit_ecc_rate', 'gpu single-bit ECC errors [1/s]'),
+                    ('gpu', '_gpu_double_bit_ecc_rate', 'gpu double-bit ECC errors [1/s]'))
+
+#--------------------------------------
+def get_families(prefix):
+  """
+  Return the list of metric families: (family name, kind, attribute, help);
+  the kind is node, cpu or gpu
+  """
+  families = list()
+  for kind, fields in (('node', node_fields), ('cpu', cpu_fields), ('gpu', gpu_fields)):
+    for attr, conv in fields.values():
+      if conv not in numeric_converters or attr in skipped_attrs: continue
+      field = attr.lstrip('_')
+      name  = field[len('gpu_'):] if kind == 'gpu' else field
+      unit  = f' [{units[field]}]' if field in units else ''
+      families.append((f'{prefix}_{kind}_{name}', kind, attr, f'{kind} {field}{unit} from pbsnodes'))
+  for kind, attr, text in derived_families:
+    field = attr.lstrip('_')
+    name  = field[len('gpu_'):] if kind == 'gpu' else field
+    families.append((f'{prefix}_{kind}_{name}', kind, attr, text))
+  families.append((f'{prefix}_node_state', 'state', None, 'node state (1 for every item of the state)'))
+  return families
+
+#--------------------------------------
+def escape(value):
+  """
+  Escape a label value of the exposition format
+  """
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# C L A S S ###########################
+class exporter:
+  """
+  Render the Prometheus exposition text of a nodes instance, incrementally
+  """
+  #------------------------------------
+  def __init__(self, prefix='cluster_watch'):
+    self.prefix    = prefix
+    self.families  = get_families(prefix)
+    self.headers   = [f'# HELP {name} {text}\n# TYPE {name} gauge\n'
+                      for name, kind, attr, text in self.families]
+    # hostname -> (node object, tuple of the text fragments, one per family), of
+    # the cluster whose label they carry
+    self.fragments = dict()
+    self.cluster   = None
+    self.n_rendered = 0
+
+  #------------------------------------
+  def render_host(self, obj, parts=None, cluster=''):
+    """
+    Return the tuple of the text fragments of one node object, one per family;
+    "parts" is the function hostname -> (rack, iru, pool), see def_inventory
+    """
+    rack, iru, pool = (parts or parse_hostname)(obj.hostname)
+    labels = f'cluster="{escape(cluster)}",host="{escape(obj.hostname)}",rack="{rack}",pool="{pool}"'
+    texts  = list()
+    for name, kind, attr, text in self.families:
+      if kind == 'node':
+        texts.append(f'{name}{{{labels}}} {getattr(obj, attr)}\n')
+      elif kind == 'cpu':
+        value = getattr(obj.cpu, attr)
+        texts.append('' if value is None else f'{name}{{{labels}}} {value}\n')
+      elif kind == 'gpu':
+        texts.append(''.join(f'{name}{{{labels},device="{dev.index}"}} {getattr(dev, attr)}\n'
+                             for dev in obj.gpu_list if getattr(dev, attr) is not None))
+      else:
+        texts.append(''.join(f'{name}{{{labels},state="{escape(item)}"}} 1\n'
+                             for item in (obj.state or 'unknown').split(',')))
+    return tuple(texts)
+
+  #------------------------------------
+  def render(self, pool):
+    """
+    Return the exposition text (bytes) of the current snapshot of "pool";
+    only the hosts whose node object was replaced are rendered again
+    """
+    entries = dict()
+    parts   = get_parts(pool)
+    cluster = escape(pool.cluster)
+    if cluster != self.cluster: self.fragments, self.cluster = dict(), cluster
+    for obj in pool.list_hosts:
+      entry = self.fragments.get(obj.hostname)
+      if entry is None or entry[0] is not obj:
+        entry = (obj, self.render_host(obj, parts, pool.cluster))
+        self.n_rendered += 1
+      entries[obj.hostname] = entry
+    self.fragments = entries
+
+    parts = list()
+    for k, header in enumerate(self.headers):
+      parts.append(header)
+      parts.extend(texts[k] for obj, texts in entries.values())
+    name  = f'{self.prefix}_snapshot'
+    label = f'{{cluster="{cluster}"}}'
+    parts.append(f'# HELP {name}_version snapshot version of the collector\n'
+                 f'# TYPE {name}_version gauge\n{name}_version{label} {pool.version}\n'
+                 f'# HELP {name}_hosts hosts in the snapshot\n'
+                 f'# TYPE {name}_hosts gauge\n{name}_hosts{label} {len(entries)}\n'
+                 f'# HELP {name}_failed_hosts hosts which failed to refresh\n'
+                 f'# TYPE {name}_failed_hosts gauge\n{name}_failed_hosts{label} {len(pool.failed_hosts)}\n')
+    if pool.stamp is not None:
+      parts.append(f'# HELP {name}_timestamp_seconds collection time of the snapshot\n'
+                   f'# TYPE {name}_timestamp_seconds gauge\n{name}_timestamp_seconds{label} {pool.stamp}\n')
+    return ''.join(parts).encode('utf-8')
+
+  #------------------------------------
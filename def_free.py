@@ -0,0 +1,166 @@
+"""
+Name:    def_free
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   index = pool.get_free_index()              # pool is an instance of nodes
+         index.fit(cores=18, gpus=2, prop='p100')   # -> hostnames, best fit first
+         index.count(cores=36)
+Return:
+Purpose: To answer "which nodes can take N cores and M idle GPUs right now,
+         with property X" from buckets of free capacity, instead of a linear
+         scan over all node objects, so that scripts can ask it at a high rate
+Remarks: + The usable hosts are grouped in buckets keyed by (properties, free
+           cores, idle GPUs); a query only visits the bucket keys (a few
+           hundred at most), and then hands out the hosts of the matching ones
+         + The free cores are total_cores - dedicated_cores (np if the node
+           does not report total_cores); a GPU is idle if it is not allocated,
+           and its utilization and memory use are below the given thresholds
+         + The hosts which are down, offline, busy or job-exclusive are not
+           indexed
+         + update() only re-indexes the hosts whose node object was replaced,
+           and the answers are memoized until the next update which changes
+           anything
+"""
+import sys
+import logging
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the node states (items of the comma-separated state) which exclude a host
+unusable_states = {'down', 'offline', 'busy', 'reserve', 'job-exclusive', 'state-unknown',
+                   'unknown'}
+
+# C L A S S ###########################
+class free_index:
+  """
+  Buckets of the hosts by their free cores and idle GPUs
+  """
+  #------------------------------------
+  def __init__(self, idle_utilization=5, idle_memory=100):
+    self.idle_utilization = idle_utilization   # [%], at most
+    self.idle_memory      = idle_memory        # [MB], at most
+
+    # (properties, free cores, idle GPUs) -> set of hostnames
+    self.buckets = dict()
+    # hostname -> its bucket key (only for the usable hosts)
+    self.key_of  = dict()
+    # hostname -> the node object which was indexed
+    self.indexed = dict()
+    # the snapshot version and the pool lookup of the last update
+    self.version = None
+    self.seen    = None
+    # properties string -> set of its items; memoized answers of fit()
+    self.tokens  = dict()
+    self.memo    = dict()
+
+  #------------------------------------
+  def get_key(self, obj):
+    """
+    Return the bucket key of one node object, or None if it can not take jobs
+    """
+    if obj.state is None or not unusable_states.isdisjoint(obj.state.split(',')): return None
+    total = obj.total_cores or obj.np
+    free  = total - obj.dedicated_cores
+    idle  = sum(1 for dev in obj.gpu_list
+                if dev.gpu_state in (None, 'Unallocated')
+                and dev.gpu_utilization <= self.idle_utilization
+                and dev.gpu_memory_used <= self.idle_memory)
+    if free <= 0 and idle == 0: return None
+    return (obj.properties or '', max(free, 0), idle)
+
+  #------------------------------------
+  def update(self, pool):
+    """
+    Re-index the hosts of the nodes instance "pool" whose node object changed
+    since the last update, and drop the hosts which left; return the number of
+    hosts which were indexed again. Only the hosts of pool.last_diff are visited
+    when the pool moved on by one version (see nodes.get_replaced)
+    """
+    current = pool.by_host
+    hosts   = pool.get_replaced(self.version, self.seen)
+    if hosts is None:
+      hosts = [host for host in self.indexed if host not in current]
+      hosts.extend(host for host, obj in current.items() if self.indexed.get(host) is not obj)
+    self.version, self.seen = pool.version, current
+    n_indexed = 0
+    for host in hosts:
+      self.drop_host(host)
+      obj = current.get(host)
+      if obj is None: continue
+      self.indexed[host] = obj
+      key = self.get_key(obj)
+      if key is not None:
+        self.key_of[host] = key
+        self.buckets.setdefault(key, set()).add(host)
+      n_indexed += 1
+    if hosts: self.memo = dict()
+    return n_indexed
+
+  #------------------------------------
+  def drop_host(self, host):
+    """
+    Remove one host from the index
+    """
+    self.indexed.pop(host, None)
+    key = self.key_of.pop(host, None)
+    if key is None: return
+    hosts = self.buckets[key]
+    hosts.discard(host)
+    if not hosts: del self.buckets[key]
+
+  #------------------------------------
+  def get_tokens(self, properties):
+    """
+    Return the set of items of a comma-separated properties string
+    """
+    found = self.tokens.get(properties)
+    if found is None:
+      found = self.tokens[properties] = frozenset(properties.split(','))
+    return found
+
+  #------------------------------------
+  def match(self, cores=1, gpus=0, prop=None):
+    """
+    Return the bucket keys which can take "cores" cores and "gpus" idle GPUs,
+    and carry all properties in "prop" (a string, or a list of strings)
+    """
+    props = {prop} if isinstance(prop, str) else set(prop or ())
+    return [key for key in self.buckets
+            if key[1] >= cores and key[2] >= gpus and props <= self.get_tokens(key[0])]
+
+  #------------------------------------
+  def fit(self, cores=1, gpus=0, prop=None, order='best', limit=None):
+    """
+    Return the tuple of hostnames which can take "cores" cores and "gpus" idle
+    GPUs now, with the properties "prop". With order='best', the tightest fits
+    come first (to keep whole nodes free); with order='most', the emptiest nodes
+    come first. The tuple is the memoized answer, so a caller can not alter it
+    """
+    props = (prop,) if isinstance(prop, str) else tuple(sorted(prop or ()))
+    memo  = (cores, gpus, props, order)
+    hosts = self.memo.get(memo)
+    if hosts is None:
+      keys = sorted(self.match(cores, gpus, props), key=lambda key: (key[2], key[1]),
+                    reverse=(order == 'most'))
+      hosts = self.memo[memo] = tuple(host for key in keys for host in sorted(self.buckets[key]))
+    return hosts if limit is None else hosts[:limit]
+
+  #------------------------------------
+  def count(self, cores=1, gpus=0, prop=None):
+    """
+    Return the number of hosts which can take "cores" cores and "gpus" idle GPUs
+    """
+    return sum(len(self.buckets[key]) for key in self.match(cores, gpus, prop))
+
+  #------------------------------------
+  def capacity(self, prop=None):
+    """
+    Return the total free cores and idle GPUs of the usable hosts (with "prop")
+    """
+    keys = self.match(0, 0, prop)
+    return (sum(key[1] * len(self.buckets[key]) for key in keys),
+            sum(key[2] * len(self.buckets[key]) for key in keys))
+
+  #------------------------------------
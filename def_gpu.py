@@ -12,6 +12,9 @@ Remarks: + All default string attributes are set to None
            the "pbsnodes" Torque command
          + The int and float attribute names begin with "_" and they
            have dedicated getter methods to carry out the type conversion
+         + "index" is the device id of "gpu[<index>]" in gpu_status; a host
+           may skip an id (e.g. a failed device), so the position of a gpu in
+           node.gpu_list is not its id, and a device is placed by its index
 """
 import sys
 import logging
@@ -29,9 +32,18 @@ class gpu:
   entry of the "pbsnodes" command. For brevity, only the critical
   attributes are captured for now; the rest can be easily elaborated
   later. The attribute list is complete.
+  The attributes are slotted, to keep the memory footprint small when
+  thousands of instances are kept around.
   """
+  __slots__ = ('index', 'gpu_id', '_gpu_pci_device_id', 'gpu_pci_location_id', 'gpu_product_name', 
+               '_gpu_memory_total', '_gpu_memory_used', 'gpu_mode', 'gpu_state', 
+               '_gpu_utilization', '_gpu_memory_utilization', 'gpu_ecc_mode', 
+               '_gpu_single_bit_ecc_errors', '_gpu_double_bit_ecc_errors', '_gpu_temperature',
+               '_gpu_single_bit_ecc_rate', '_gpu_double_bit_ecc_rate')
+
   #------------------------------------
   def __init__(self):
+    self.index = 0
     self.gpu_id = None
     self._gpu_pci_device_id = 0
     self.gpu_pci_location_id = None
@@ -47,6 +59,10 @@ class gpu:
     self._gpu_double_bit_ecc_errors = 0
     self._gpu_temperature = 0
 
+    # Derived attributes, from two consecutive MOM reports (see def_rates)
+    self._gpu_single_bit_ecc_rate = None
+    self._gpu_double_bit_ecc_rate = None
+
   #------------------------------------
   @property
   def gpu_pci_device_id(self): return self._gpu_pci_device_id
@@ -88,6 +104,16 @@ class gpu:
   @gpu_temperature.setter
   def gpu_temperature(self, val): self._gpu_temperature = int(val.split()[0])
 
+  @property
+  def gpu_single_bit_ecc_rate(self): return self._gpu_single_bit_ecc_rate   # [errors/s]
+  @gpu_single_bit_ecc_rate.setter
+  def gpu_single_bit_ecc_rate(self, val): self._gpu_single_bit_ecc_rate = None if val is None else float(val)
+
+  @property
+  def gpu_double_bit_ecc_rate(self): return self._gpu_double_bit_ecc_rate   # [errors/s]
+  @gpu_double_bit_ecc_rate.setter
+  def gpu_double_bit_ecc_rate(self, val): self._gpu_double_bit_ecc_rate = None if val is None else float(val)
+
   #------------------------------------
   def set(self, attr, val):
     """
@@ -96,8 +122,8 @@ class gpu:
     try: 
       setattr(self, attr, val)
     except AttributeError:
-      logging.error(f"Error: set: gpu class does not have this attribute: {attr}")
-      sys.exit(1)
+      logger.debug(f"set: gpu class does not have this attribute: {attr}")
+      return None
 
   #------------------------------------
   def get(self, attr):
@@ -111,3 +137,22 @@ class gpu:
       sys.exit(1)
 
   #------------------------------------
+
+#--------------------------------------
+def count_slots(gpu_list):
+  """
+  Return the number of device slots of a list of gpus, i.e. the highest device
+  index plus one (zero without devices); a skipped id leaves an empty slot
+  """
+  return max((dev.index for dev in gpu_list), default=-1) + 1
+
+#--------------------------------------
+def find_device(gpu_list, index):
+  """
+  Return the gpu of a list of gpus whose device index is "index", or None
+  """
+  for dev in gpu_list:
+    if dev.index == index: return dev
+  return None
+
+#--------------------------------------
@@ -0,0 +1,257 @@
+"""
+Name:    def_gpu_table
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   table = pool.get_gpu_table()                 # pool is an instance of nodes
+         table = read_records(split_pbsnodes(source.fetch(None)))
+         table.hot(85), table.idle_allocated(), table.reduce('gpu_utilization', by='device')
+Return:
+Purpose: To keep the numeric GPU telemetry of a whole cluster in one
+         preallocated host x device NumPy structured array, so that
+         fleet-wide per-device questions (hot GPUs, allocated but idle GPUs,
+         the mean utilization per device slot) are vectorized, and do not
+         need thousands of gpu objects
+Remarks: + The fields of the array are the numeric fields of the gpu table of
+           def_parser (e.g. gpu_utilization, gpu_temperature), plus "present"
+           (the host reports this device) and "allocated" (its gpu_state is
+           not 'Unallocated'); the devices which a host does not report are
+           not present, and their fields stay zero
+         + The devices are placed by their index in "gpu[<index>]" (gpu.index
+           of the gpu objects), so any number of devices, skipped ids, and
+           device indices of 10 and more, are handled; the number of columns
+           is that of the highest device index of all hosts, plus one
+         + read_records() fills the array straight from the "gpu_status"
+           strings of the "pbsnodes" records, in one pass and without node or
+           gpu objects; update() fills it from the gpu objects of a nodes
+           instance, and only the rows of the hosts whose node object was
+           replaced are filled again
+"""
+import sys
+import logging
+
+import numpy as np
+
+from def_parser import gpu_fields, gpu_pairs, numeric_converters, skip
+from def_gpu import count_slots
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the numeric gpu fields: (pbsnodes key, attribute, converter); the counters
+# and the PCI device id need 64 bits, the other fields fit in 32 bits
+gpu_numeric = [(key, attr, conv) for key, (attr, conv) in gpu_fields.items()
+               if conv in numeric_converters]
+wide_fields = {'gpu_pci_device_id', 'gpu_single_bit_ecc_errors', 'gpu_double_bit_ecc_errors'}
+gpu_dtype   = np.dtype([('present', np.bool_), ('allocated', np.bool_)] +
+                       [(key, np.int64 if key in wide_fields else np.int32)
+                        for key, attr, conv in gpu_numeric])
+
+#--------------------------------------
+def get_devices(gpu_status):
+  """
+  Return a list of (device index, info) of the "gpu[<index>]=<info>" items of
+  a "gpu_status" string, in the order of the string
+  """
+  devices = list()
+  for item in gpu_status.split(','):
+    if not item.startswith('gpu['): continue  # e.g. driver_ver, timestamp
+    close = item.find(']=')
+    if close < 0: continue
+    try:
+      devices.append((int(item[4:close]), item[close + 2:]))
+    except ValueError:
+      skip('get_devices', item[:close + 1])
+  return devices
+
+#--------------------------------------
+def convert(key, conv, val):
+  """
+  Return the converted value of one gpu field, or zero (the default of the gpu
+  class) if it is missing or can not be converted
+  """
+  if val is None: return 0
+  try:
+    return conv(val)
+  except ValueError:
+    skip('gpu_table', key, val)
+    return 0
+
+# C L A S S ###########################
+class gpu_table:
+  """
+  The host x device structured array of the GPU telemetry of a cluster
+  """
+  #------------------------------------
+  def __init__(self, hostnames=(), n_devices=0):
+    self.hostnames = np.array(list(hostnames), dtype=object)
+    self.rows      = {host: row for row, host in enumerate(self.hostnames)}
+    self.data      = np.zeros((len(self.hostnames), n_devices), dtype=gpu_dtype)
+    # hostname -> the node object which was filled in (see update)
+    self.indexed   = dict()
+
+  #------------------------------------
+  def resize(self, n_devices):
+    """
+    Widen the array to "n_devices" device columns
+    """
+    if n_devices <= self.data.shape[1]: return
+    wider = np.zeros((self.data.shape[0], n_devices), dtype=gpu_dtype)
+    wider[:, :self.data.shape[1]] = self.data
+    self.data = wider
+
+  #------------------------------------
+  def fill_row(self, row, devices):
+    """
+    Fill one host row from the (device index, info) pairs of its "gpu_status"
+    """
+    self.data[row] = 0
+    if not devices: return
+    self.resize(max(index for index, info in devices) + 1)
+    cells = self.data[row]
+    for index, info in devices:
+      pairs = dict(gpu_pairs.findall(info))
+      get   = pairs.get
+      try:
+        cells[index] = ((True, get('gpu_state', 'Unallocated') != 'Unallocated') +
+                        tuple(0 if get(key) is None else conv(get(key)) for key, attr, conv in gpu_numeric))
+      except ValueError:
+        cells[index] = (True, get('gpu_state', 'Unallocated') != 'Unallocated') + tuple(
+                        convert(key, conv, get(key)) for key, attr, conv in gpu_numeric)
+
+  #------------------------------------
+  def fill_objects(self, row, gpu_list):
+    """
+    Fill one host row from the list of gpu objects of a node, by their index
+    """
+    self.data[row] = 0
+    self.resize(count_slots(gpu_list))
+    cells = self.data[row]
+    for dev in gpu_list:
+      cells[dev.index] = ((True, dev.gpu_state not in (None, 'Unallocated')) +
+                      tuple(getattr(dev, attr) for key, attr, conv in gpu_numeric))
+
+  #------------------------------------
+  def update(self, pool):
+    """
+    Fill the rows of the GPU hosts of the nodes instance "pool" whose node
+    object changed since the last update; if the GPU hosts themselves changed,
+    the array is laid out again. Return the number of rows which were filled
+    """
+    hosts = [obj for obj in pool.list_hosts if obj.gpus or obj.gpu_list]
+    if [obj.hostname for obj in hosts] != list(self.hostnames):
+      width = max((count_slots(obj.gpu_list) for obj in hosts), default=0)
+      self.__init__([obj.hostname for obj in hosts], width)
+    n_filled = 0
+    for row, obj in enumerate(hosts):
+      if self.indexed.get(obj.hostname) is obj: continue
+      self.fill_objects(row, obj.gpu_list)
+      self.indexed[obj.hostname] = obj
+      n_filled += 1
+    return n_filled
+
+  #------------------------------------
+  def get(self, name):
+    """
+    Return the host x device array of the field "name"
+    """
+    if name not in gpu_dtype.names:
+      logger.warning(f'get: the GPU table does not have this field: {name}')
+      return None
+    return self.data[name]
+
+  #------------------------------------
+  def mask(self, name, above=None, below=None):
+    """
+    Return a boolean host x device mask of the present GPUs whose field "name"
+    is above (or below) the given value
+    """
+    found = self.data['present'].copy()
+    if above is not None: found &= self.data[name] > above
+    if below is not None: found &= self.data[name] < below
+    return found
+
+  #------------------------------------
+  def devices(self, found):
+    """
+    Return the list of (hostname, device index) of a host x device mask
+    """
+    rows, cols = np.nonzero(found)
+    return list(zip(self.hostnames[rows], cols.tolist()))
+
+  #------------------------------------
+  def hot(self, temperature=85):
+    """
+    Return the (hostname, device) of the GPUs which are hotter than "temperature"
+    """
+    return self.devices(self.mask('gpu_temperature', above=temperature))
+
+  #------------------------------------
+  def idle_allocated(self, utilization=5, memory=100):
+    """
+    Return the (hostname, device) of the GPUs which are allocated to a job, but
+    whose utilization [%] and memory use [MB] are at most the given values
+    """
+    data  = self.data
+    found = (data['present'] & data['allocated'] & (data['gpu_utilization'] <= utilization)
+             & (data['gpu_memory_used'] <= memory))
+    return self.devices(found)
+
+  #------------------------------------
+  def reduce(self, name, how='mean', by='device'):
+    """
+    Reduce the field "name" over the present GPUs: by='device' gives one value
+    per device index (across the hosts), by='host' one value per host, and
+    by=None one value for the whole cluster; "how" is mean, min, max or sum.
+    Slots without a present GPU are NaN
+    """
+    if how not in ('mean', 'min', 'max', 'sum'):
+      logger.warning(f'reduce: unknown reduction: {how}')
+      return None
+    axis = {'device': 0, 'host': 1, None: None}.get(by, -1)
+    if axis == -1:
+      logger.warning(f'reduce: unknown grouping: {by}')
+      return None
+    present = self.data['present']
+    values  = self.data[name].astype(np.float64)
+    found   = present.sum(axis=axis)
+    if how in ('mean', 'sum'):
+      total = np.where(present, values, 0).sum(axis=axis)
+      result = total / np.maximum(found, 1) if how == 'mean' else total
+    else:
+      filled = np.where(present, values, np.inf if how == 'min' else -np.inf)
+      result = filled.min(axis=axis) if how == 'min' else filled.max(axis=axis)
+    return np.where(found > 0, result, np.nan)
+
+  #------------------------------------
+  def count(self):
+    """
+    Return the number of present GPUs
+    """
+    return int(np.count_nonzero(self.data['present']))
+
+  #------------------------------------
+
+#--------------------------------------
+def read_records(records, n_devices=None):
+  """
+  Return a gpu_table of the hosts which report "gpus" or "gpu_status" in "records"
+  (hostname -> "pbsnodes" text, see def_source.split_pbsnodes), filled from
+  the raw strings in one pass, without building node or gpu objects
+  """
+  status = dict()
+  for host, record in records.items():
+    # a plain substring search is much cheaper than a multi-line regular expression
+    start = record.find(' gpu_status = ')
+    if start >= 0:
+      start += len(' gpu_status = ')
+      end    = record.find('\n', start)
+      status[host] = get_devices(record[start:] if end < 0 else record[start:end])
+    elif ' gpus = ' in record:
+      status[host] = []   # e.g. a GPU node which is down
+  widest = max((index + 1 for devices in status.values() for index, info in devices), default=0)
+  table  = gpu_table(status, widest if n_devices is None else n_devices)
+  for row, devices in enumerate(status.values()): table.fill_row(row, devices)
+  return table
+
+#--------------------------------------
@@ -0,0 +1,300 @@
+"""
+Name:    def_gui
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   pool = nodes('genius', collect=False)     # the first sweep runs in the background
+         dashboard(pool, interval=1.0).mainloop()
+Return:
+Purpose: To show a cluster live in a Tkinter window: one tile per node, laid
+         out per rack from the hostnames, colored by the node state and load,
+         with one bar per GPU device, while the window stays responsive
+Remarks: + The collection runs in a background thread (a poll_scheduler of
+           def_scheduler, or a full refresh every "interval" seconds), which
+           only puts the snapshot diffs into a queue; the Tk thread drains
+           the queue every "redraw" milliseconds
+         + Every tile has a "look" (its color and the height and color of
+           its GPU bars), which is quantized into a few levels; after a diff,
+           only the changed hosts are looked at again, and only the canvas
+           items whose look changed are configured
+         + All tiles are items of one canvas (no widget per node), so
+           thousands of nodes cost a few thousand canvas items
+         + The layout and the looks (class board) do not need Tk, so they can
+           be used and tested without a display
+"""
+import sys
+import logging
+import math
+import queue
+import threading
+import time
+
+from def_source import parse_hostname
+from def_inventory import get_parts
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the tile colors: by state, and by the load per core (from idle to overloaded)
+state_colors = {'down': '#505050', 'offline': '#b36b00', 'unknown': '#303030'}
+load_colors  = ('#1a7f37', '#4c9a2a', '#8fb339', '#d4b106', '#e07b00', '#c62828')
+load_steps   = (0.05, 0.35, 0.65, 0.9, 1.2)   # the upper bounds of the load levels
+
+# the GPU bar colors by temperature [C]: (upper bound, color)
+temperature_colors = ((60, '#1e88e5'), (75, '#fdd835'), (85, '#fb8c00'), (math.inf, '#e53935'))
+
+#--------------------------------------
+def get_level(value, steps):
+  """
+  Return the index of the first step which "value" does not exceed
+  """
+  for k, step in enumerate(steps):
+    if value <= step: return k
+  return len(steps)
+
+#--------------------------------------
+def get_color(obj):
+  """
+  Return the fill color of the tile of one node object
+  """
+  if obj is None: return state_colors['unknown']
+  items = (obj.state or 'unknown').split(',')
+  for item in ('down', 'offline', 'unknown'):
+    if item in items: return state_colors[item]
+  cores = obj.total_cores or obj.np
+  load  = obj.cpu.loadave / cores if cores else 0.0
+  return load_colors[get_level(load, load_steps)]
+
+#--------------------------------------
+def get_bars(obj, height):
+  """
+  Return a tuple of (bar height in pixels, bar color) per GPU device of one
+  node object; the height follows the utilization, the color the temperature
+  """
+  if obj is None: return ()
+  bars = list()
+  for dev in obj.gpu_list:
+    size  = round(height * min(max(dev.gpu_utilization, 0), 100) / 100)
+    color = next(color for limit, color in temperature_colors if dev.gpu_temperature < limit)
+    bars.append((size, color))
+  return tuple(bars)
+
+#--------------------------------------
+def grid_layout(hostnames, columns=48, parts=parse_hostname):
+  """
+  Return a dictionary of hostname -> (row, column), and a list of (row, rack):
+  every rack starts on a new row, and wraps after "columns" tiles; the hosts
+  of a rack are sorted by name. "parts" gives the (rack, iru, pool) of a host
+  """
+  racks = dict()
+  for host in hostnames: racks.setdefault(parts(host)[0], []).append(host)
+  places = dict()
+  labels = list()
+  row    = 0
+  for rack in sorted(racks):
+    hosts = sorted(racks[rack])
+    labels.append((row, rack))
+    for k, host in enumerate(hosts): places[host] = (row + k // columns, k % columns)
+    row += -(-len(hosts) // columns)
+  return places, labels
+
+# C L A S S ###########################
+class board:
+  """
+  The layout and the current looks of the tiles of a cluster, without Tk
+  """
+  #------------------------------------
+  def __init__(self, hostnames, columns=48, tile=12, parts=parse_hostname):
+    self.tile    = tile
+    self.columns = columns
+    self.places, self.labels = grid_layout(hostnames, columns, parts)
+    # hostname -> (color, bars) which is currently drawn
+    self.looks   = dict()
+
+  #------------------------------------
+  def get_look(self, obj):
+    """
+    Return the look of the tile of one node object
+    """
+    return (get_color(obj), get_bars(obj, self.tile - 4))
+
+  #------------------------------------
+  def apply(self, pool, hostnames=None):
+    """
+    Compute the looks of "hostnames" (default: all tiles) from the nodes
+    instance "pool", and return the list of (hostname, look) whose look changed
+    """
+    changed = list()
+    for host in (self.places if hostnames is None else hostnames):
+      if host not in self.places: continue
+      look = self.get_look(pool.get_node(host))
+      if self.looks.get(host) != look:
+        self.looks[host] = look
+        changed.append((host, look))
+    return changed
+
+  #------------------------------------
+  def get_box(self, host):
+    """
+    Return the canvas coordinates (x0, y0, x1, y1) of the tile of "host"
+    """
+    row, col = self.places[host]
+    x0, y0 = 60 + col * self.tile, 4 + row * self.tile
+    return x0, y0, x0 + self.tile - 1, y0 + self.tile - 1
+
+#--------------------------------------
+def drain(inbox):
+  """
+  Take all diffs from the queue "inbox", and return the set of hostnames which
+  changed, and whether the whole board has to be laid out again (hosts came or
+  left, or a full sweep is announced by None)
+  """
+  hosts  = set()
+  layout = False
+  while True:
+    try:
+      diff = inbox.get_nowait()
+    except queue.Empty:
+      return hosts, layout
+    if diff is None or diff.added or diff.removed:
+      layout = True
+    else:
+      hosts.update(diff.changed)
+
+# C L A S S ###########################
+class dashboard:
+  """
+  The Tk window of one cluster; the collection runs in a background thread
+  """
+  #------------------------------------
+  def __init__(self, pool, interval=1.0, scheduler=None, columns=48, tile=12, redraw=100):
+    import tkinter as tk
+    self.pool      = pool
+    self.interval  = interval
+    self.scheduler = scheduler
+    self.redraw    = redraw          # [ms] between two looks into the queue
+    self.inbox     = queue.Queue()
+    self.stop      = threading.Event()
+    self.n_drawn   = 0
+
+    self.root   = tk.Tk()
+    self.root.title(f'cluster_watch: {pool.cluster}')
+    self.status = tk.StringVar(value='collecting ...')
+    tk.Label(self.root, textvariable=self.status, anchor='w').pack(side='bottom', fill='x')
+    frame  = tk.Frame(self.root)
+    frame.pack(side='top', fill='both', expand=True)
+    scroll = tk.Scrollbar(frame, orient='vertical')
+    self.canvas = tk.Canvas(frame, background='#111111', yscrollcommand=scroll.set,
+                            width=60 + columns * tile + 8, height=min(800, 40 * tile))
+    scroll.configure(command=self.canvas.yview)
+    scroll.pack(side='right', fill='y')
+    self.canvas.pack(side='left', fill='both', expand=True)
+    self.columns, self.tile = columns, tile
+
+    self.board = None
+    self.items = dict()   # hostname -> (rectangle item, list of the bar items)
+    self.root.protocol('WM_DELETE_WINDOW', self.close)
+    self.thread = threading.Thread(target=self.collect, name=f'{pool.cluster}-gui', daemon=True)
+    self.thread.start()
+    if pool.list_hosts: self.layout()
+    self.root.after(self.redraw, self.update)
+
+  #------------------------------------
+  def collect(self):
+    """
+    The background thread: the first sweep (if the pool is empty), and then the
+    periodic refreshes; only the diffs go to the Tk thread, through the queue
+    """
+    pool = self.pool
+    if not pool.list_hosts:
+      pool.gather_nodes()
+      self.inbox.put(None)
+    if self.scheduler is not None:
+      self.scheduler.run(self.stop, on_diff=self.inbox.put)
+      return
+    while not self.stop.is_set():
+      start = time.monotonic()
+      diff  = pool.next_sweep()
+      if diff: self.inbox.put(diff)
+      self.stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+  #------------------------------------
+  def layout(self):
+    """
+    Draw all tiles again, e.g. for the first snapshot or when hosts came or left
+    """
+    canvas = self.canvas
+    canvas.delete('all')
+    self.board = board([obj.hostname for obj in self.pool.list_hosts], self.columns, self.tile,
+                       get_parts(self.pool))
+    self.items = dict()
+    for row, rack in self.board.labels:
+      canvas.create_text(4, 4 + row * self.tile, text=rack, anchor='nw', fill='#cccccc',
+                         font=('TkFixedFont', 8))
+    for host in self.board.places:
+      x0, y0, x1, y1 = self.board.get_box(host)
+      rect = canvas.create_rectangle(x0, y0, x1, y1, outline='', fill='')
+      self.items[host] = (rect, [])
+    rows = max((row for row, col in self.board.places.values()), default=0) + 1
+    canvas.configure(scrollregion=(0, 0, 60 + self.columns * self.tile, 8 + rows * self.tile))
+    self.paint(self.board.apply(self.pool))
+
+  #------------------------------------
+  def paint(self, changed):
+    """
+    Configure the canvas items of the tiles whose look changed
+    """
+    canvas = self.canvas
+    for host, (color, bars) in changed:
+      rect, bar_items = self.items[host]
+      canvas.itemconfigure(rect, fill=color)
+      x0, y0, x1, y1 = self.board.get_box(host)
+      while len(bar_items) < len(bars):
+        bar_items.append(canvas.create_rectangle(0, 0, 0, 0, outline=''))
+      width = max(1, (self.tile - 4) // max(len(bars), 1))
+      for k, item in enumerate(bar_items):
+        if k >= len(bars):
+          canvas.coords(item, 0, 0, 0, 0)
+          continue
+        size, bar_color = bars[k]
+        left = x0 + 2 + k * width
+        canvas.coords(item, left, y1 - 2 - size, left + width - 1, y1 - 2)
+        canvas.itemconfigure(item, fill=bar_color)
+    self.n_drawn += len(changed)
+
+  #------------------------------------
+  def update(self):
+    """
+    Take the pending diffs, redraw the tiles which changed, and look again later
+    """
+    hosts, layout = drain(self.inbox)
+    if layout or (self.board is None and self.pool.list_hosts):
+      self.layout()
+    elif hosts and self.board is not None:
+      self.paint(self.board.apply(self.pool, hosts))
+    if self.board is not None:
+      age = self.pool.get_age()
+      self.status.set(f'{self.pool.cluster}: {len(self.pool.list_hosts)} hosts, '
+                      f'{len(self.pool.failed_hosts)} failed, version {self.pool.version}, '
+                      f'age {age:.0f} s, {self.n_drawn} tiles drawn' if age is not None else
+                      f'{self.pool.cluster}: {len(self.pool.list_hosts)} hosts')
+    if not self.stop.is_set(): self.root.after(self.redraw, self.update)
+
+  #------------------------------------
+  def mainloop(self):
+    """
+    Run the Tk event loop until the window is closed
+    """
+    self.root.mainloop()
+
+  #------------------------------------
+  def close(self):
+    """
+    Stop the background thread, and close the window
+    """
+    self.stop.set()
+    self.root.destroy()
+
+  #------------------------------------
+
+#--------------------------------------
@@ -0,0 +1,272 @@
+"""
+Name:    def_history
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   store = history('/scratch/genius_history', hostnames=pool.hostnames,
+                         gpu_hostnames=pool.gpu_hostnames)
+         store.record(pool)                     # once per snapshot (e.g. every minute)
+         store.record(pool, diff)               # cheaper, after pool.refresh()
+         times, load = store.series('r22i13n01', 'loadave')
+         times, temp = store.series('r23g35', 'gpu_temperature', device=2)
+Return:
+Purpose: To keep the recent history of the per-host metrics of a cluster, in
+         preallocated ring buffers which are backed by memory-mapped files,
+         so that the history survives restarts without reading it back in
+Remarks: + Every metric is one .npy file of shape (capacity, n_hosts) for host
+           metrics, or (capacity, n_gpu_hosts, n_devices) for GPU metrics;
+           one sample (i.e. one snapshot) is one contiguous row
+         + The ring position and the number of samples are kept in a small
+           memory-mapped cursor, and the sample times in a separate column
+         + The integer metrics use the narrowest dtype which fits, and their
+           largest value marks a missing sample; the float metrics use NaN.
+           The GPU memory [MB] needs 32 bits, for GPUs of 64 GB and more
+         + The default capacity (20160) holds two weeks of 1-minute samples,
+           i.e. about 8 bytes per host and 24 bytes per 4-GPU host per sample
+           (1.6 GB for 10000 hosts, 0.5 GB for 3000 hosts)
+         + The devices are stored by their index (gpu.index), so a skipped id
+           is a missing sample; a GPU host with device indices of "n_devices"
+           and more only keeps the lower ones, with a warning; size n_devices
+           after the widest host (e.g. max(count_slots(n.gpu_list) for n in
+           pool.list_hosts), see def_gpu)
+         + The host list is fixed when the store is created; the hosts of a
+           snapshot which are not part of the store are not recorded
+"""
+import sys, os
+import logging
+import json
+import time
+
+import numpy as np
+
+from def_gpu import count_slots
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the host metrics: name -> (dtype, getter of the value from a node)
+host_metrics = {
+  'loadave':         (np.float32, lambda n: n.cpu._loadave),
+  'nsessions':       (np.uint16,  lambda n: n.cpu._nsessions),
+  'dedicated_cores': (np.uint16,  lambda n: n._dedicated_cores),
+}
+
+# the GPU metrics: name -> (dtype, getter of the value from a gpu object)
+gpu_metrics = {
+  'gpu_utilization': (np.uint8,   lambda g: g._gpu_utilization),
+  'gpu_memory_used': (np.uint32,  lambda g: g._gpu_memory_used),    # MB
+  'gpu_temperature': (np.uint8,   lambda g: g._gpu_temperature),
+}
+
+#--------------------------------------
+def missing_value(dtype):
+  """
+  Return the value which marks a missing sample of "dtype"
+  """
+  dtype = np.dtype(dtype)
+  return np.nan if dtype.kind == 'f' else np.iinfo(dtype).max
+
+#--------------------------------------
+def as_float(values):
+  """
+  Return "values" as a float array, with the missing samples as NaN
+  """
+  if values.dtype.kind == 'f': return values.astype(np.float64)
+  result = values.astype(np.float64)
+  result[values == missing_value(values.dtype)] = np.nan
+  return result
+
+#--------------------------------------
+def open_column(path, dtype, shape, mode):
+  """
+  Memory-map the .npy file "path"; with mode 'w+' it is created, and with 'r+'
+  its dtype and shape must match the given ones
+  """
+  if mode == 'w+':
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+  values = np.lib.format.open_memmap(path, mode='r+')
+  if values.shape != tuple(shape) or values.dtype != np.dtype(dtype):
+    logger.error(f'open_column: {path} does not match the expected layout')
+    sys.exit(1)
+  return values
+
+# C L A S S ###########################
+class history:
+  """
+  Ring buffers of the per-host metrics, memory-mapped from a directory
+  """
+  #------------------------------------
+  def __init__(self, directory, hostnames=None, gpu_hostnames=None, capacity=20160,
+               n_devices=4):
+    self.directory = directory
+    meta_file      = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta_file):
+      with open(meta_file) as f: meta = json.load(f)
+      mode = 'r+'
+    else:
+      if hostnames is None:
+        logger.error(f'history: {directory} has no history, and no hostnames are given')
+        sys.exit(1)
+      gpu_hostnames = [h for h in (gpu_hostnames or []) if h in set(hostnames)]
+      meta = {'hostnames': list(hostnames), 'gpu_hostnames': gpu_hostnames,
+              'capacity': int(capacity), 'n_devices': int(n_devices)}
+      os.makedirs(directory, exist_ok=True)
+      mode = 'w+'
+
+    self.hostnames     = meta['hostnames']
+    self.gpu_hostnames = meta['gpu_hostnames']
+    self.capacity      = meta['capacity']
+    self.n_devices     = meta['n_devices']
+    self.column        = {host: k for k, host in enumerate(self.hostnames)}
+    self.gpu_column    = {host: k for k, host in enumerate(self.gpu_hostnames)}
+    # the GPU hosts whose extra devices were dropped (warned once per host)
+    self.truncated     = set()
+
+    n_hosts, n_gpu = len(self.hostnames), len(self.gpu_hostnames)
+    self.cursor = self.open('cursor', np.int64, (2,), mode)      # ring position, n samples
+    self.times  = self.open('time', np.float64, (self.capacity,), mode)
+    self.data   = dict()
+    for name, (dtype, getter) in host_metrics.items():
+      self.data[name] = self.open(name, dtype, (self.capacity, n_hosts), mode)
+    for name, (dtype, getter) in gpu_metrics.items():
+      self.data[name] = self.open(name, dtype, (self.capacity, n_gpu, self.n_devices), mode)
+
+    if mode == 'w+':
+      self.cursor[:] = 0
+      self.times[:]  = np.nan
+      for name, values in self.data.items(): values[:] = missing_value(values.dtype)
+      with open(meta_file, 'w') as f: json.dump(meta, f)
+      self.flush()
+
+  #------------------------------------
+  def open(self, name, dtype, shape, mode):
+    """
+    Memory-map the .npy file of one column
+    """
+    return open_column(os.path.join(self.directory, f'{name}.npy'), dtype, shape, mode)
+
+  #------------------------------------
+  def get_count(self):
+    """
+    Return the number of samples in the store (at most the capacity)
+    """
+    return int(self.cursor[1])
+
+  #------------------------------------
+  def record(self, pool, diff=None, stamp=None):
+    """
+    Record one sample of all hosts of the nodes instance "pool". With the
+    snapshot_diff of the last refresh, the previous sample is copied, and only
+    the hosts which were added or changed are read from their node objects.
+    The hosts which failed to refresh (or left) get a missing sample, instead
+    of the values of their stale node objects
+    """
+    stamp = time.time() if stamp is None else stamp
+    row   = int(self.cursor[0])
+    prev  = (row - 1) % self.capacity
+    if diff is not None and self.get_count() > 0:
+      for values in self.data.values(): values[row] = values[prev]
+      hosts = [pool.get_node(host) for host in diff.hosts()]
+      gone  = diff.removed + diff.failed
+    else:
+      for values in self.data.values(): values[row] = missing_value(values.dtype)
+      hosts = pool.list_hosts
+      gone  = list(diff.failed if diff is not None else getattr(pool, 'failed_hosts', ()))
+    self.write(row, hosts)
+    if gone: self.clear(row, gone)
+
+    self.times[row] = stamp
+    self.cursor[0]  = (row + 1) % self.capacity
+    self.cursor[1]  = min(self.capacity, self.get_count() + 1)
+    return row
+
+  #------------------------------------
+  def write(self, row, hosts):
+    """
+    Write the metrics of the node objects "hosts" into the sample "row"
+    """
+    hosts = [obj for obj in hosts if obj is not None and obj.hostname in self.column]
+    cols  = np.fromiter((self.column[obj.hostname] for obj in hosts), dtype=np.intp,
+                        count=len(hosts))
+    for name, (dtype, getter) in host_metrics.items():
+      self.data[name][row, cols] = np.fromiter(map(getter, hosts), dtype=dtype, count=len(hosts))
+
+    gpu_hosts = [obj for obj in hosts if obj.hostname in self.gpu_column]
+    for name, (dtype, getter) in gpu_metrics.items():
+      values = self.data[name][row]
+      for obj in gpu_hosts:
+        if count_slots(obj.gpu_list) > self.n_devices and obj.hostname not in self.truncated:
+          logger.warning(f'write: {obj.hostname} has {count_slots(obj.gpu_list)} GPU slots, but the '
+                         f'history only keeps {self.n_devices} devices per host')
+          self.truncated.add(obj.hostname)
+        col = self.gpu_column[obj.hostname]
+        values[col, :] = missing_value(dtype)
+        for dev in obj.gpu_list:
+          if dev.index < self.n_devices: values[col, dev.index] = getter(dev)
+
+  #------------------------------------
+  def clear(self, row, hostnames):
+    """
+    Mark the sample "row" of "hostnames" as missing
+    """
+    cols = [self.column[host] for host in hostnames if host in self.column]
+    gpus = [self.gpu_column[host] for host in hostnames if host in self.gpu_column]
+    for name in host_metrics: self.data[name][row, cols] = missing_value(self.data[name].dtype)
+    for name in gpu_metrics:  self.data[name][row, gpus] = missing_value(self.data[name].dtype)
+
+  #------------------------------------
+  def rows(self, since=None, until=None):
+    """
+    Return the ring rows of the samples, in chronological order, optionally
+    limited to the sample times in [since, until]
+    """
+    count = self.get_count()
+    rows  = (np.arange(int(self.cursor[0]) - count, int(self.cursor[0])) % self.capacity)
+    if since is not None or until is not None:
+      times = self.times[rows]
+      keep  = np.ones(count, dtype=bool)
+      if since is not None: keep &= times >= since
+      if until is not None: keep &= times <= until
+      rows  = rows[keep]
+    return rows
+
+  #------------------------------------
+  def series(self, hostname, metric, device=None, since=None, until=None):
+    """
+    Return the sample times, and the values of "metric" of one host, in
+    chronological order; for a GPU metric, "device" selects one device (the
+    default returns a samples x devices array). Missing samples are NaN
+    """
+    rows = self.rows(since, until)
+    if metric in host_metrics:
+      if hostname not in self.column: return None
+      values = self.data[metric][rows, self.column[hostname]]
+    elif metric in gpu_metrics:
+      if hostname not in self.gpu_column: return None
+      values = self.data[metric][rows, self.gpu_column[hostname]]
+      if device is not None: values = values[:, device]
+    else:
+      logger.warning(f'series: the history does not have this metric: {metric}')
+      return None
+    return self.times[rows], as_float(values)
+
+  #------------------------------------
+  def window(self, metric, since=None, until=None):
+    """
+    Return the sample times, and the values of "metric" of all hosts in
+    chronological order: samples x hosts (or samples x GPU hosts x devices)
+    """
+    if metric not in self.data:
+      logger.warning(f'window: the history does not have this metric: {metric}')
+      return None
+    rows = self.rows(since, until)
+    return self.times[rows], as_float(self.data[metric][rows])
+
+  #------------------------------------
+  def flush(self):
+    """
+    Write the modified pages of all columns to disk
+    """
+    for values in [self.cursor, self.times] + list(self.data.values()): values.flush()
+
+  #------------------------------------
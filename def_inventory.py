@@ -0,0 +1,269 @@
+"""
+Name:    def_inventory
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   hosts = read_inventory('genius.hosts')      # e.g. the line "r22i13n[01-24] r23g[34-39]"
+         inv   = load_inventory('genius', source=live_source(), cache='genius.inventory')
+         pool  = nodes('genius', inventory=inv)      # or inventory='genius.hosts'
+         inv.get_parts('r22i13n01'), inv.groups['rack']['r22'], compress(inv.hostnames)
+Return:
+Purpose: To tell which hosts make up a cluster, without hard-coding them:
+         from an ASCII file with compact range expressions, or discovered with
+         one "pbsnodes" call, and to derive the rack, IRU and pool of every
+         host once, for all later sweeps and views
+Remarks: + A range expression is a hostname with one or more bracketed lists
+           of numbers or ranges, e.g. r22i13n[01-24], r[22-24]g[35-41] or
+           r22i13n[01-04,07]; the numbers keep the width of the lower bound
+         + An inventory file has any number of expressions per line, separated
+           by white space; "#" starts a comment
+         + Discovery takes the hostnames which the data source knows about, or
+           else calls "pbsnodes -l all" (live source) or "pbsnodes -a" (full=True)
+         + load_inventory() keeps the hostnames in a JSON cache file, as compact
+           range expressions; the cache is used again as long as the inventory
+           file is not modified (same size and modification time), or for
+           "max_age" seconds after a discovery
+         + The inventory holds hostname -> (rack, iru, pool) (see
+           def_source.parse_hostname) and the hostnames of every rack, IRU and
+           pool; the columnar snapshot, the exporter, the dashboard and the
+           site look them up there
+"""
+import sys, os
+import logging
+import json
+import re
+import subprocess
+import time
+
+from def_source import parse_hostname, split_pbsnodes, call_pbsnodes_list, live_source
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# a bracketed list of numbers and ranges in a range expression
+range_pattern = re.compile(r'\[([^\[\]]*)\]')
+
+# a hostname which ends in a number, e.g. r22i13n01 -> ('r22i13n', '01')
+number_pattern = re.compile(r'(.*?)(\d+)$')
+
+# the groupings of the hosts, in the order of the parse_hostname tuples
+group_keys = ('rack', 'iru', 'pool')
+
+#--------------------------------------
+def expand(expression, where='expand'):
+  """
+  Return the list of hostnames of one range expression, e.g.
+  r22i13n[01-03] -> ['r22i13n01', 'r22i13n02', 'r22i13n03']
+  """
+  match = range_pattern.search(expression)
+  if match is None:
+    if '[' in expression or ']' in expression:
+      logger.error(f'Error: {where}: unbalanced brackets in {expression}')
+      sys.exit(1)
+    return [expression]
+  head, tails = expression[:match.start()], expand(expression[match.end():], where)
+  hosts = list()
+  for item in match.group(1).split(','):
+    first, dash, last = item.strip().partition('-')
+    if not first.isdigit() or (dash and not last.isdigit()) or (dash and int(first) > int(last)):
+      logger.error(f'Error: {where}: invalid range [{match.group(1)}] in {expression}')
+      sys.exit(1)
+    width = len(first)
+    for number in range(int(first), int(last if dash else first) + 1):
+      hosts.extend(f'{head}{number:0{width}d}{tail}' for tail in tails)
+  return hosts
+
+#--------------------------------------
+def compress(hostnames):
+  """
+  Return the list of range expressions of "hostnames", the inverse of expand():
+  the hosts which only differ in their last number (of the same width) are put
+  in one expression, e.g. ['r22i13n01', 'r22i13n02', 'r22i13n05'] -> ['r22i13n[01-02,05]']
+  """
+  groups = dict()   # (prefix, width) -> list of numbers, in the order of the first host
+  for host in hostnames:
+    match = number_pattern.match(host)
+    if match is None:
+      groups.setdefault((host, None), [])
+      continue
+    prefix, digits = match.groups()
+    groups.setdefault((prefix, len(digits)), []).append(int(digits))
+
+  expressions = list()
+  for (prefix, width), numbers in groups.items():
+    if width is None:
+      expressions.append(prefix)
+      continue
+    numbers = sorted(set(numbers))
+    if len(numbers) == 1:
+      expressions.append(f'{prefix}{numbers[0]:0{width}d}')
+      continue
+    items, first = list(), numbers[0]
+    for k, number in enumerate(numbers):
+      if k + 1 < len(numbers) and numbers[k + 1] == number + 1: continue
+      items.append(f'{first:0{width}d}' if first == number else f'{first:0{width}d}-{number:0{width}d}')
+      if k + 1 < len(numbers): first = numbers[k + 1]
+    expressions.append(f'{prefix}[{",".join(items)}]')
+  return expressions
+
+#--------------------------------------
+def read_inventory(path):
+  """
+  Return the list of hostnames of an inventory file, in the order of the file;
+  a hostname which is given twice is only kept once
+  """
+  try:
+    with open(path, 'r') as r: lines = r.readlines()
+  except OSError as err:
+    logger.error(f'Error: read_inventory: can not read {path}: {err}')
+    sys.exit(1)
+  hosts = dict()
+  for k, line in enumerate(lines, start=1):
+    for expression in line.split('#', 1)[0].split():
+      for host in expand(expression, where=f'read_inventory: {path}:{k}'): hosts[host] = None
+  if not hosts: logger.warning(f'read_inventory: {path} does not list any hostname')
+  return list(hosts)
+
+#--------------------------------------
+def discover(source=None, timeout=30, full=False):
+  """
+  Return the list of hostnames which the data source "source" (default: the
+  live "pbsnodes" command) knows about; a live source is asked with one
+  "pbsnodes -l all" call, or with one "pbsnodes -a" call if full=True.
+  Return an empty list if the call fails
+  """
+  source = source or live_source()
+  hosts  = source.list_hostnames()
+  if hosts: return list(hosts)
+  try:
+    if isinstance(source, live_source) and not full:
+      return call_pbsnodes_list(timeout=timeout, command=source.command)
+    return list(split_pbsnodes(source.fetch(None, timeout=timeout)))
+  except (OSError, subprocess.SubprocessError) as err:
+    logger.warning(f'discover: can not list the hosts: {err}')
+    return []
+
+# C L A S S ###########################
+class inventory:
+  """
+  The hostnames of a cluster, with the rack, IRU and pool of every host
+  """
+  #------------------------------------
+  def __init__(self, hostnames=(), origin=None, parts=None):
+    """
+    "origin" tells where the hostnames came from (e.g. a path, 'discovery' or
+    'cache'); "parts" is an optional dictionary of hostname -> (rack, iru,
+    pool) which is already known, e.g. from other inventories
+    """
+    self.hostnames = list(dict.fromkeys(hostnames))
+    self.origin    = origin
+    known          = parts or dict()
+    self.parts     = {host: known.get(host) or parse_hostname(host) for host in self.hostnames}
+
+    # grouping -> {group -> list of hostnames}, e.g. self.groups['rack']['r22']
+    self.groups = {by: dict() for by in group_keys}
+    racks, irus, pools = (self.groups[by] for by in group_keys)
+    for host, (rack, iru, pool) in self.parts.items():
+      racks.setdefault(rack, []).append(host)
+      irus.setdefault(iru, []).append(host)
+      pools.setdefault(pool, []).append(host)
+    # the pool 'gpu' is what is_gpu_host() tells
+    self.gpu_hostnames = list(pools.get('gpu', []))
+    self.cpu_hostnames = [host for host in self.hostnames if self.parts[host][2] != 'gpu']
+
+  #------------------------------------
+  def __len__(self):
+    return len(self.hostnames)
+
+  #------------------------------------
+  def get_parts(self, hostname):
+    """
+    Return the tuple (rack, iru, pool) of "hostname"; a host outside of the
+    inventory is parsed on the fly
+    """
+    found = self.parts.get(hostname)
+    return parse_hostname(hostname) if found is None else found
+
+  #------------------------------------
+  def ranges(self):
+    """
+    Return the hostnames as a list of compact range expressions
+    """
+    return compress(self.hostnames)
+
+  #------------------------------------
+
+#--------------------------------------
+def combine(inventories):
+  """
+  Return one inventory with the hosts of all "inventories", without parsing
+  their hostnames again
+  """
+  parts = dict()
+  for found in inventories:
+    if found is not None: parts.update(found.parts)   # e.g. a cluster which is not discovered yet
+  return inventory(parts, origin='combined', parts=parts)
+
+#--------------------------------------
+def get_parts(pool):
+  """
+  Return the function hostname -> (rack, iru, pool) of a nodes instance (or of
+  any object with an "inventory"): the lookup of its inventory if it has one,
+  else parse_hostname
+  """
+  found = getattr(pool, 'inventory', None)
+  return parse_hostname if found is None else found.get_parts
+
+#--------------------------------------
+def get_signature(path):
+  """
+  Return what tells whether the inventory file "path" was modified: its
+  absolute path, size and modification time
+  """
+  info = os.stat(path)
+  return {'path': os.path.abspath(path), 'size': info.st_size, 'mtime': info.st_mtime_ns}
+
+#--------------------------------------
+def load_inventory(cluster, path=None, source=None, cache=None, max_age=3600, full=False,
+                   timeout=30):
+  """
+  Return the inventory of "cluster": from the inventory file "path" if it is
+  given, else discovered from "source" (see discover). With "cache" (a JSON
+  file), the hostnames are taken from there while it is valid, and saved
+  there after they are read or discovered
+  """
+  signature = None
+  if path is not None:
+    try:
+      signature = get_signature(path)
+    except OSError as err:
+      logger.error(f'Error: load_inventory: can not read {path}: {err}')
+      sys.exit(1)
+
+  if cache:
+    try:
+      with open(cache, 'r') as r: saved = json.load(r)
+    except (OSError, ValueError):
+      saved = None
+    if (saved and saved.get('cluster') == cluster and saved.get('signature') == signature and
+        (signature is not None or time.time() - saved.get('time', 0) <= max_age)):
+      hosts = [host for expression in saved['ranges'] for host in expand(expression, 'load_inventory')]
+      return inventory(hosts, origin='cache')
+
+  if path is not None:
+    found = inventory(read_inventory(path), origin=path)
+  else:
+    found = inventory(discover(source, timeout=timeout, full=full), origin='discovery')
+
+  if cache and found.hostnames:
+    data = {'cluster': cluster, 'signature': signature, 'time': time.time(), 'origin': found.origin,
+            'ranges': found.ranges()}
+    temp = f'{cache}.{os.getpid()}.tmp'
+    try:
+      with open(temp, 'w') as w: json.dump(data, w, indent=1)
+      os.replace(temp, cache)
+    except OSError as err:
+      logger.warning(f'load_inventory: can not write {cache}: {err}')
+  return found
+
+#--------------------------------------
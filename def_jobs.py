@@ -0,0 +1,184 @@
+"""
+Name:    def_jobs
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   index = pool.get_job_index()          # pool is an instance of nodes
+         index.hosts_of('50000001')            # the short job number is enough
+         index.placement('50000001', 'r23g35') # -> ((0, 2),), (1, 2)
+         index.jobs_on('r23g35'), index.footprint('50000001')
+Return:
+Purpose: To map every job to the hosts, core ranges and GPUs which it holds,
+         and every host to its jobs, so that job-centric questions are
+         answered by dictionary lookups instead of scanning the "jobs"
+         strings of all nodes
+Remarks: + The index is built from the "jobs" field of the nodes (see
+           def_parser.parse_jobs), e.g. '0-2/123.server,3-29/124.server'
+         + update() only re-indexes the hosts whose node object was replaced
+           since the previous update (e.g. by nodes.refresh()), so keeping the
+           index current costs one identity check per host
+         + "pbsnodes" does not tell which job holds which GPU. The allocated
+           devices (gpu_state other than 'Unallocated') of a host are given to
+           its job if it is the only job there; with several jobs on a host,
+           the GPUs of each job are unknown (None)
+"""
+import sys
+import logging
+
+from def_parser import parse_jobs
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+
+# C L A S S ###########################
+class job_index:
+  """
+  The job -> hosts and host -> jobs lookups of a snapshot
+  """
+  #------------------------------------
+  def __init__(self):
+    # job id -> {hostname: (core ranges, GPU device indices or None)}
+    self.by_job  = dict()
+    # hostname -> tuple of job ids
+    self.by_host = dict()
+    # short job number (before the first ".") -> full job id
+    self.short   = dict()
+    # hostname -> the node object which was indexed
+    self.indexed = dict()
+    # the snapshot version and the pool lookup of the last update
+    self.version = None
+    self.seen    = None
+
+  #------------------------------------
+  def update(self, pool):
+    """
+    Re-index the hosts of the nodes instance "pool" whose node object changed
+    since the last update, and drop the hosts which left; return the number of
+    hosts which were indexed again. Only the hosts of pool.last_diff are visited
+    when the pool moved on by one version (see nodes.get_replaced)
+    """
+    current = pool.by_host
+    hosts   = pool.get_replaced(self.version, self.seen)
+    if hosts is None:
+      hosts = [host for host in self.indexed if host not in current]
+      hosts.extend(host for host, obj in current.items() if self.indexed.get(host) is not obj)
+    self.version, self.seen = pool.version, current
+    n_indexed = 0
+    for host in hosts:
+      self.drop_host(host)
+      obj = current.get(host)
+      if obj is None: continue
+      self.add_host(obj)
+      n_indexed += 1
+    return n_indexed
+
+  #------------------------------------
+  def add_host(self, obj):
+    """
+    Add the jobs of one node object to the index
+    """
+    host = obj.hostname
+    jobs = parse_jobs(obj.jobs)
+    self.indexed[host] = obj
+    self.by_host[host] = tuple(jobs)
+    if not jobs: return
+    gpus = None
+    if len(jobs) == 1:
+      gpus = tuple(dev.index for dev in obj.gpu_list
+                   if dev.gpu_state and dev.gpu_state != 'Unallocated')
+    for job, ranges in jobs.items():
+      self.by_job.setdefault(job, dict())[host] = (tuple(ranges), gpus)
+      self.short.setdefault(job.split('.', 1)[0], job)
+
+  #------------------------------------
+  def drop_host(self, host):
+    """
+    Remove one host, and the jobs which no longer run anywhere, from the index
+    """
+    self.indexed.pop(host, None)
+    for job in self.by_host.pop(host, ()):
+      hosts = self.by_job.get(job)
+      if hosts is None: continue
+      hosts.pop(host, None)
+      if not hosts:
+        del self.by_job[job]
+        number = job.split('.', 1)[0]
+        if self.short.get(number) == job: del self.short[number]
+
+  #------------------------------------
+  def find(self, job):
+    """
+    Return the full job id of "job" (a full id, or only its number), or None
+    """
+    if job in self.by_job: return job
+    return self.short.get(str(job))
+
+  #------------------------------------
+  def hosts_of(self, job):
+    """
+    Return the hostnames where "job" runs (an empty list if it is unknown)
+    """
+    return list(self.by_job.get(self.find(job), ()))
+
+  #------------------------------------
+  def placement(self, job, host):
+    """
+    Return the core ranges and the GPU device indices (None if unknown) which
+    "job" holds on "host", or None
+    """
+    return self.by_job.get(self.find(job), {}).get(host)
+
+  #------------------------------------
+  def jobs_on(self, host):
+    """
+    Return the job ids which run on "host"
+    """
+    return list(self.by_host.get(host, ()))
+
+  #------------------------------------
+  def footprint(self, job, pool=None):
+    """
+    Return a dictionary with the footprint of "job": its number of hosts, cores
+    and (known) GPUs; with the nodes instance "pool", also the mean load per
+    core of its hosts, and the mean utilization and the memory used of its GPUs
+    """
+    full  = self.find(job)
+    if full is None: return None
+    hosts = self.by_job[full]
+    cores = sum(last - first + 1 for ranges, gpus in hosts.values() for first, last in ranges)
+    found = {host: gpus for host, (ranges, gpus) in hosts.items() if gpus}
+    result = {'job': full, 'hosts': len(hosts), 'cores': cores,
+              'gpus': sum(len(gpus) for gpus in found.values()),
+              'gpus_unknown': sum(1 for ranges, gpus in hosts.values() if gpus is None)}
+    if pool is None: return result
+
+    objs = [pool.get_node(host) for host in hosts]
+    objs = [obj for obj in objs if obj is not None]
+    load = sum(obj.cpu.loadave for obj in objs)
+    ncpu = sum(obj.total_cores or obj.np for obj in objs)
+    devs = list()
+    for host, gpus in found.items():
+      obj = pool.get_node(host)
+      if obj is not None: devs += [dev for dev in obj.gpu_list if dev.index in gpus]
+    result['load_per_core']   = load / ncpu if ncpu else None
+    result['gpu_utilization'] = sum(dev.gpu_utilization for dev in devs) / len(devs) if devs else None
+    result['gpu_memory_used'] = sum(dev.gpu_memory_used for dev in devs)
+    return result
+
+  #------------------------------------
+  def footprints(self):
+    """
+    Return a dictionary of job id -> (hosts, cores, known GPUs) for all jobs
+    """
+    result = dict()
+    for job, hosts in self.by_job.items():
+      cores = sum(last - first + 1 for ranges, gpus in hosts.values() for first, last in ranges)
+      result[job] = (len(hosts), cores, sum(len(gpus) for ranges, gpus in hosts.values() if gpus))
+    return result
+
+  #------------------------------------
+  def __len__(self):
+    return len(self.by_job)
+
+  #------------------------------------
@@ -21,28 +21,46 @@ import subprocess
 
 from def_gpu import *
 from def_cpu import *
+from def_source import *
+from def_parser import parse_node
 
 #--------------------------------------
 # logger to capture exceptions
 logger = logging.getLogger(__name__)
 #--------------------------------------
-
 # C L A S S ###########################
 class node:
   """
-  A class that encapsulates the nodes properties
+  A class that encapsulates the nodes properties. The attributes are
+  slotted, to keep the memory footprint small when thousands of 
+  instances are kept around.
   """
+  __slots__ = ('hostname', 'source', 'pbsnodes', 'state', 'power_state', '_np', 
+               'properties', 'ntype', 'jobs', 'status', '_mom_service_port', 
+               '_mom_manager_port', '_gpus', 'gpu_status', '_total_sockets', 
+               '_total_numa_nodes', '_total_cores', '_total_threads', 
+               '_dedicated_sockets', '_dedicated_numa_nodes', '_dedicated_cores', 
+               '_dedicated_threads', 'cpu', 'gpu_list')
+
   #------------------------------------
-  def __init__(self, hostname):
+  def __init__(self, hostname, pbsnodes=None, source=None, parse=True, keep_raw=True):
     """
     Instantiate the object
     Most of the attributes are the output entries of the 
-    "pbsnodes" command
+    "pbsnodes" command. If the "pbsnodes" text of this host is already
+    collected (e.g. by a bulk call), it can be passed in, and then no 
+    subprocess is called. Otherwise, the text is fetched from "source"
+    (an instance of a def_source class), which defaults to the live
+    "pbsnodes" command. With parse=False, the text is kept but not parsed,
+    and parse() can be called later.
+    With keep_raw=False, the raw texts (pbsnodes, status and gpu_status) are 
+    dropped once they are parsed
     """
     self.hostname = hostname
+    self.source   = source
     
     # pbsnodes message captured from ther STDOUT
-    self.pbsnodes = None
+    self.pbsnodes = pbsnodes
     
     # Default attributes from "pbsnodes" output
     self.state = None
@@ -70,16 +88,12 @@ class node:
     self.gpu_list = list()
 
     # Call the pbsnodes command and get the stdout
-    self.call_pbsnodes()
-
-    # Parse (process) the self.pbsnodes 
-    self.parse_pbsnodes()
+    if self.pbsnodes is None: self.call_pbsnodes()
+    if not parse: return
 
-    # Parse (process) the self.status for cpu attributes
-    self.parse_cpu_status()
-
-    # Parse (process) the self.gpu_status for gpu attributes
-    self.parse_gpu_status()
+    # Parse (process) the self.pbsnodes, and its status and gpu_status fields
+    self.parse()
+    if not keep_raw: self.drop_raw()
 
   #------------------------------------
   @property
@@ -150,8 +164,8 @@ class node:
     try: 
       setattr(self, attr, val)
     except AttributeError:
-      logging.error(f"Error: set: node class does not have this attribute: {attr}")
-      sys.exit(1)
+      logger.debug(f"set: node class does not have this attribute: {attr}")
+      return None
 
   #------------------------------------
   def get(self, attr):
@@ -167,95 +181,33 @@ class node:
   #------------------------------------
   def call_pbsnodes(self):
     """
-    Let a subprocess call the "pbsnodes <hostname>" and collect the result back
+    Let a subprocess call the "pbsnodes <hostname>" (or the data source) and 
+    collect the result back
     """
-    cmnd = f'pbsnodes {self.hostname}'
+    source = self.source or live_source()
     try: 
-      call = subprocess.Popen(cmnd, stdout=subprocess.PIPE, 
-                              stderr=subprocess.PIPE, shell=True,
-                              universal_newlines=True, encoding='utf-8')
-      result, ierr = call.communicate()
-      self.pbsnodes = result 
-    except:
+      self.pbsnodes = source.fetch([self.hostname])
+    except OSError:
       logger.error(f'Error: call_pbsnodes failed on {self.hostname}')
-      sys.exit(ierr)
-
-  #------------------------------------
-  def parse_pbsnodes(self):
-    """
-    Parse the self.pbsnodes strings into the 'default' attributes of the node class
-    """
-    pbsnodes = self.pbsnodes.split('\n') # list of lines
-    hostname = pbsnodes.pop(0)
-    if not hostname == self.hostname: 
-      logger.error(f'Error: parse_pbsnodes: conflicting hostnames: {hostname} vs. {self.hostname}')
       sys.exit(1)
-    for line in pbsnodes:
-      if not line: continue
-      if '=' not in line: continue
-      line = line.strip()
-      (attr, val) = line.split(sep='=', maxsplit=1)
-      self.set(attr.strip(), val.strip())
-    
+
   #------------------------------------
-  def parse_cpu_status(self):
+  def parse(self):
     """
-    Retrieve the self.status and split the key-value fields separated by 
-    semi-colon, and assign each field to the correct attribute of the parent
-    class cpu
+    Parse self.pbsnodes into the attributes of the node, its cpu and its gpus in 
+    one scan, driven by the field tables in def_parser. Unknown fields are skipped, 
+    and a conflicting hostname returns False
     """
-    status = self.status
-    items  = status.split(',')
-    for item in items:
-      if '=' not in item: continue
-      attr, val = item.split(sep='=', maxsplit=1)
-      try:
-        self.cpu.set(attr, val)
-      except:
-        print(f'Error: parse_cpu_status: failed to set attribute {attr}')
-        print(f'{attr}: {val}')
-        sys.exit(1)
+    return parse_node(self)
 
   #------------------------------------
-  def parse_gpu_status(self):
+  def drop_raw(self):
     """
-    Retrieve the self.gpu_status and split the key-value fields separated by 
-    semi-colon, and assign each field to the correct attribute of the parent
-    class gpu
+    Release the raw texts once they are parsed; the parsed attributes stay
     """
-    if self.gpu_status is None: return # non-GPU nodes do not have this entry
-    try:
-      assert len(self.gpu_list) == 0
-    except AssertionError:
-      logger.error(f"Error: parse_gpu_status: self.gpu_list is not empty!")
-      sys.exit(1)
-    status = self.gpu_status
-
-    dev_index = list()  # collects device ids, e.g. 0, 1, 2, 3, ...
-    dev_list  = list()  # collects instances of the gpu() class
-    list_messages = status.split(sep=',')
-    gpu_messages  = list_messages[:4]
-    timestamp = list_messages[-1].split('=')
-
-    for i, msg in enumerate(gpu_messages):
-      which_dev, info = msg.split(sep='=', maxsplit=1)
-      dev_id = int(which_dev[4])
-      dev_index.append(dev_id)
-      items  = info.split(';')
-
-      this = gpu()
-
-      for k, item in enumerate(items):
-        key, val = item.split('=')
-        this.set(key, val)
-
-      dev_list.append(this)
-
-    # invert the dev_list, because originally it is from the last device to the first
-    dev_list = dev_list[::-1]
-
-    # set the gpu_list attribute
-    self.set('gpu_list', dev_list.copy())
+    self.pbsnodes   = None
+    self.status     = None
+    self.gpu_status = None
 
   #------------------------------------
   #------------------------------------
@@ -0,0 +1,604 @@
+"""
+Name:    def_nodes
+By:      Ehsan Moravveji
+Date:    14 August 2018
+Usage:   
+Return:  
+Purpose: To define the nodes class, i.e. the pool of all node instances
+         of a cluster, and its relevant machinery
+Remarks: + The nodes class lives in its own module, because "def" is a 
+           reserved word and "def.py" can not be imported by other modules
+         + The data structure tree looks like this (cpu, gpu and node are parents):
+           cpu    gpu    node                    nodes 
+                         -> cpu                  -> [node_0, ..., node_M]
+                         -> [gpu_0, ..., gpu_N]
+"""
+import sys, os
+import logging
+import subprocess
+import threading
+import time
+
+from def_gpu import *
+from def_cpu import *
+from def_node import *
+from def_profile import instruments, disabled
+import def_inventory
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+
+#--------------------------------------
+# the default number of hostnames per "pbsnodes" call; bounded, so that a slow host
+# only holds up its own batch, and the batches are spread over the workers
+default_batch_size = 32
+
+#--------------------------------------
+
+# C L A S S ###########################
+class nodes:
+  """
+  nodes encapsulates the available information from all nodes
+  in the cluster
+  """
+  def __init__(self, cluster, source=None, hostnames=None, bulk=True, batch_size=default_batch_size, 
+               max_workers=8, timeout=30, keep_raw=True, collect=True, cache=None, 
+               warm_start=False, executor=None, profile=False, inventory=None):
+#    super().__init__()
+    self.cluster = cluster.lower()
+    self.check_cluster_name()
+
+    # the data source which delivers the "pbsnodes" text (see def_source); 
+    # the default is the live "pbsnodes" command
+    self.source = source or live_source()
+
+    # intrinsic attributes; the inventory (see def_inventory) also holds the rack, 
+    # IRU and pool of every hostname
+    self.gpu_hostnames = []
+    self.cpu_hostnames = []
+    self.hostnames     = []
+    self.inventory     = None
+
+    # collection mode: with bulk=True, "pbsnodes" is called once per batch of 
+    # hostnames (batch_size=0 puts all hostnames in one batch), otherwise 
+    # once per hostname; the hosts of a batch which times out are asked again,
+    # one per call, so that only the slow hosts fail
+    self.bulk          = bulk
+    self._batch_size   = 0
+    self.set('batch_size', batch_size)
+
+    # the batches are collected concurrently by at most "max_workers" threads,
+    # and each "pbsnodes" call is killed after "timeout" seconds (None: no limit)
+    self._max_workers  = 1
+    self.set('max_workers', max_workers)
+    self.timeout       = timeout
+
+    # a concurrent.futures executor which runs the "pbsnodes" calls instead of a 
+    # private thread pool, e.g. one worker pool shared by several clusters (see def_site)
+    self.executor      = executor
+
+    # the stage timers, latency histogram and counters (see def_profile); the 
+    # shared disabled instruments cost next to nothing
+    self.profile       = disabled
+    if profile: self.enable_profile()
+
+    # with keep_raw=False, the raw texts of every node are dropped once parsed
+    self.keep_raw      = keep_raw
+
+    # hosts which are missing from the last snapshot, and the reason why, e.g.
+    # {'r22i13n01': 'timeout'} ('timeout', 'error', 'missing' or 'parse error'); 
+    # the snapshot is partial if this is not empty
+    self.failed_hosts  = dict()
+
+    # list of instances of the "node" class, one per each hostname
+    self.list_hosts    = []
+
+    # lookups of the node objects by hostname, the hashes of the last parsed 
+    # records (to skip the unchanged ones on refresh), the snapshot version 
+    # (incremented by every refresh), and the snapshot_diff of the last refresh
+    self.by_host       = dict()
+    self.position      = dict()
+    self.digests       = dict()
+    self.version       = 0
+    self.last_diff     = None
+
+    # the job index and the free-resource index of the snapshot (see def_jobs and 
+    # def_free), built on the first request
+    self.job_index     = None
+    self.free_index    = None
+    self.gpu_table     = None
+
+    # the wall-clock time (in seconds) of the last "pbsnodes" call which covered 
+    # each host; with bulk calls, all hosts of a batch share the same latency
+    self.latencies     = dict()
+
+    # the binary file which keeps the last complete snapshot (see def_serial), the 
+    # time at which the current snapshot was collected, whether the current snapshot 
+    # is the (old) one loaded from the cache, and the thread which replaces it
+    self.cache         = cache
+    self.stamp         = None
+    self.stale         = False
+    self.warming       = None
+
+    # Collect the hostnames based on the cluster name, unless they (or an inventory) are given
+    self.set_hostnames(hostnames, inventory)
+
+    # Gather a list of "node" objects for all physical nodes in the cluster; with 
+    # warm_start=True, the cached snapshot is shown first, and is replaced by a 
+    # refresh in the background
+    if collect:
+      if warm_start and self.load_cache():
+        self.warming = self.refresh_in_background()
+      else:
+        self.gather_nodes()
+
+  #------------------------------------
+  @property
+  def batch_size(self): return self._batch_size
+  @batch_size.setter
+  def batch_size(self, val): self._batch_size = int(val)
+
+  @property
+  def max_workers(self): return self._max_workers
+  @max_workers.setter
+  def max_workers(self, val): self._max_workers = max(1, int(val))
+
+  #------------------------------------
+  def set(self, attr, val):
+    """
+    Set the value of the attribute "attr" to "val"
+    """
+    try: 
+      setattr(self, attr, val)
+    except AttributeError:
+      logging.warning(f"set: class 'node' does not have this attribute: {attr}")
+      return None
+
+  #------------------------------------
+  def get(self, attr):
+    """
+    Get the value of an existing attribute of the class
+    """
+    try:
+      return self.__getattribute__(attr)
+    except AttributeError:
+      logging.warning(f"get: class 'nodes' does not have this attribute: {attr}")
+      return None
+
+  #------------------------------------
+  def check_cluster_name(self):
+    """
+    Assert the cluster name is valid (thinking, genius or breniac)
+    """
+    try:
+      assert self.cluster in ['thinking', 'genius', 'breniac']
+    except AssertionError:
+      logger.error(f'Error: check_cluster_name: {self.cluster} is invalid')
+      sys.exit(1)
+
+  #------------------------------------
+  def set_gpu_hostnames(self):
+    """
+    Set the hostnames of the GPU nodes in "self.gpu_hostnames"
+    """
+    if self.cluster == 'genius':
+      rack22 = [f'r22g{k:02d}' for k in range(35, 42)]
+      rack23 = [f'r23g{k:02d}' for k in range(34, 40)]
+      rack24 = [f'r24g{k:02d}' for k in range(35, 42)]
+      hosts  = rack22 + rack23 + rack24
+    elif self.cluster == 'thinking':
+      hosts  = []
+    elif self.cluster == 'breniac':
+      hosts  = []
+    self.set('gpu_hostnames', hosts)
+
+  #------------------------------------
+  def set_cpu_hostnames(self):
+    """
+    Set the hostnames of the CPU nodes in "self.cpu_hostnames"
+    """
+    if self.cluster == 'genius':
+      hosts = [f'r{r:02d}i{i:02d}n{n:02d}' for r in (22, 23) for i in (13, 27) for n in range(1, 25)]
+    elif self.cluster == 'thinking':
+      hosts  = []
+    elif self.cluster == 'breniac':
+      hosts  = []
+    self.set('cpu_hostnames', hosts)
+
+  #------------------------------------
+  def set_hostnames(self, hostnames=None, inventory=None):
+    """
+    Aggregate the hostnames from GPU and CPU hostnames. If a list of "hostnames" 
+    is given, it is used instead of the hard-coded hostnames of the cluster; so is
+    an "inventory" (see def_inventory), or the path of an inventory file. A cluster
+    without hard-coded hostnames discovers them from the data source, but only on
+    its first sweep (see discover_hostnames), so that e.g. a cached snapshot can be
+    loaded without any "pbsnodes" call. The rack, IRU and pool of the hosts are
+    derived here, once, and kept in self.inventory
+    """
+    if isinstance(inventory, str):
+      inventory = def_inventory.load_inventory(self.cluster, path=inventory)
+    elif inventory is None and hostnames is not None:
+      inventory = def_inventory.inventory(hostnames, origin='hostnames')
+    elif inventory is None:
+      # Collect the hostnames based on the cluster name
+      self.set_gpu_hostnames()
+      self.set_cpu_hostnames()
+      hosts = self.gpu_hostnames + self.cpu_hostnames
+      if not hosts:
+        self.inventory = None    # discovered later
+        self.hostnames = []
+        return
+      inventory = def_inventory.inventory(hosts, origin=self.cluster)
+    self.inventory = inventory
+    self.set('gpu_hostnames', inventory.gpu_hostnames)
+    self.set('cpu_hostnames', inventory.cpu_hostnames)
+    self.hostnames = self.gpu_hostnames + self.cpu_hostnames
+
+  #------------------------------------
+  def discover_hostnames(self):
+    """
+    Discover the hostnames from the data source (see def_inventory.discover), if 
+    the cluster has no inventory yet, i.e. no hard-coded, given or cached hostnames
+    """
+    if self.inventory is not None: return
+    self.set_hostnames(inventory=def_inventory.load_inventory(self.cluster, source=self.source, 
+                                                              timeout=self.timeout))
+
+  #------------------------------------
+  def gather_nodes(self):
+    """
+    Gather a list of instances of the "node" class which are all well instantiated. 
+    Thus, the attributes of each object is allready set to the right value, and this 
+    list represents the status of the cluster, collected through a collective call to 
+    the "pbsnodes" command in a snapshot.
+    The batches of hostnames are collected concurrently; a batch which fails or times 
+    out does not stop the sweep, but its hosts are reported in self.failed_hosts
+    """
+    if self.list_hosts:
+      logger.error('Error: gather_nodes: the class object is not properly initialized')
+      sys.exit(1)
+    
+    self.discover_hostnames()
+    prof  = self.profile
+    start = time.perf_counter()
+    self.failed_hosts = dict()
+    records = self.collect_records(self.hostnames)
+    with prof.stage('parse'):
+      for host in self.hostnames:
+        if host not in records: continue
+        obj = self.make_node(host, records[host])
+        if obj is not None: self.list_hosts.append(obj)
+      self.index_hosts()
+    self.stamp = time.time()
+    self.save_cache()
+    self.count_failures()
+    prof.sweep('gather', time.perf_counter() - start)
+
+  #------------------------------------
+  def refresh(self, hostnames=None):
+    """
+    Refresh the snapshot incrementally, and return a snapshot_diff (see def_diff).
+    The records of "hostnames" (default: all) are collected again, but only those 
+    whose text differs from the previous sweep (compared by a hash) are parsed 
+    again, and their node objects are replaced (the rate metrics of the new 
+    objects are derived from the old ones). A host which fails to refresh 
+    keeps its previous (stale) node object, and is listed in self.failed_hosts.
+    A full refresh (hostnames=None) also renews self.stamp and the cache
+    """
+    from def_diff import snapshot_diff, node_diff
+    from def_rates import update_rates
+    self.discover_hostnames()
+    prof  = self.profile
+    clock = prof.clock     # None unless profiled
+    start = time.perf_counter()
+    hosts = self.hostnames if hostnames is None else list(hostnames)
+    diff  = snapshot_diff(self.version + 1)
+    t_diff = 0.0
+
+    for host in hosts: self.failed_hosts.pop(host, None)
+    records = self.collect_records(hosts)
+    t_parse = time.perf_counter()
+    for host in hosts:
+      record = records.get(host)
+      if record is None:
+        diff.failed.append(host)
+        continue
+      if self.digests.get(host) == hash(record):
+        diff.n_unchanged += 1
+        continue
+      new = self.make_node(host, record)
+      if new is None:
+        diff.failed.append(host)
+        continue
+      diff.n_reparsed += 1
+      diff.reparsed.append(host)
+      old = self.by_host.get(host)
+      if old is None:
+        self.list_hosts.append(new)
+        diff.added.append(host)
+        continue
+      self.list_hosts[self.position[host]] = new
+      if clock: t0 = clock()
+      update_rates(old, new)
+      changes = node_diff(old, new)
+      if changes: diff.changed[host] = changes
+      if clock: t_diff += clock() - t0
+
+    if hostnames is None:
+      known = set(self.hostnames)
+      diff.removed = [n.hostname for n in self.list_hosts if n.hostname not in known]
+      if diff.removed:
+        self.list_hosts = [n for n in self.list_hosts if n.hostname in known]
+        for host in diff.removed: self.digests.pop(host, None)
+    self.index_hosts()
+    if clock:
+      prof.add('parse', time.perf_counter() - t_parse - t_diff)
+      prof.add('diff', t_diff)
+      prof.count('reparsed', diff.n_reparsed)
+      prof.count('unchanged', diff.n_unchanged)
+    self.version  += 1
+    self.last_diff = diff
+    if hostnames is None:
+      self.stamp = time.time()
+      self.stale = False
+      self.save_cache()
+    self.count_failures()
+    prof.sweep('refresh', time.perf_counter() - start)
+    return diff
+
+  #------------------------------------
+  def next_sweep(self):
+    """
+    Move the data source to its next frame / time step (nothing for the live
+    "pbsnodes"; see data_source.advance), and return the snapshot_diff of a
+    full refresh. Every periodic loop (watch, stream, the dashboard and the
+    collector) sweeps through here
+    """
+    self.source.advance()
+    return self.refresh()
+
+  #------------------------------------
+  def enable_profile(self, enabled=True):
+    """
+    Start (or stop) the instruments of this instance (see def_profile), and 
+    return them; the "pbsnodes" calls of a live source are timed as well
+    """
+    self.profile = instruments() if enabled else disabled
+    if hasattr(self.source, 'profile'): self.source.profile = self.profile if enabled else None
+    return self.profile
+
+  #------------------------------------
+  def count_failures(self):
+    """
+    Count the failed hosts of the last sweep per reason, e.g. failed_timeout
+    """
+    if not self.profile.enabled: return
+    for reason in self.failed_hosts.values(): self.profile.count(f'failed_{reason.replace(" ", "_")}')
+
+  #------------------------------------
+  def save_cache(self):
+    """
+    Save the current snapshot into self.cache (if it is set)
+    """
+    if not self.cache: return
+    from def_serial import save_snapshot
+    try:
+      with self.profile.stage('cache'): save_snapshot(self, self.cache, stamp=self.stamp)
+    except OSError as err:
+      logger.warning(f'save_cache: can not write {self.cache}: {err}')
+
+  #------------------------------------
+  def load_cache(self, adopt=False):
+    """
+    Load the snapshot saved in self.cache as the current (stale) snapshot, and 
+    return True; or False if there is no usable cache. Only the cached hosts 
+    which belong to self.hostnames are kept; with adopt=True (or if the hostnames
+    are not discovered yet), the hostnames of the cache become those of this 
+    instance instead
+    """
+    if not self.cache: return False
+    from def_serial import load_snapshot
+    meta, objs = load_snapshot(self.cache)
+    if meta is None or meta.get('cluster') != self.cluster: return False
+    if adopt or self.inventory is None: self.set_hostnames([obj.hostname for obj in objs] + list(meta['failed']))
+    known = set(self.hostnames)
+    self.list_hosts   = [obj for obj in objs if obj.hostname in known]
+    self.failed_hosts = {host: why for host, why in meta['failed'].items() if host in known}
+    self.stamp        = meta['time']
+    self.stale        = True
+    self.index_hosts()
+    return True
+
+  #------------------------------------
+  def get_age(self):
+    """
+    Return the age (in seconds) of the current snapshot, or None
+    """
+    return None if self.stamp is None else time.time() - self.stamp
+
+  #------------------------------------
+  def refresh_in_background(self, on_diff=None):
+    """
+    Start a full refresh in a daemon thread, and return the thread; the 
+    snapshot_diff is passed to on_diff(diff) when the refresh is done
+    """
+    def work():
+      diff = self.refresh()
+      if on_diff is not None: on_diff(diff)
+    thread = threading.Thread(target=work, name=f'{self.cluster}-refresh', daemon=True)
+    thread.start()
+    return thread
+
+  #------------------------------------
+  def collect_records(self, hostnames):
+    """
+    Collect the "pbsnodes" records of "hostnames" concurrently, in batches, and 
+    return them as a dictionary; the hosts of a batch which timed out are asked 
+    again one by one, and the hosts which still time out, fail or are missing 
+    are written into self.failed_hosts
+    """
+    records = dict()
+    batches = self.get_batches(hostnames)
+    n_workers = min(self.max_workers, len(batches)) or 1
+    if self.executor is not None:
+      pool = self.executor
+    else:
+      from concurrent.futures import ThreadPoolExecutor
+      pool = ThreadPoolExecutor(max_workers=n_workers)
+    try:
+      retry = list()
+      for batch, (result, error, elapsed) in zip(batches, pool.map(self.collect_batch, batches)):
+        for host in batch: self.latencies[host] = elapsed
+        if error == 'timeout' and len(batch) > 1:
+          retry.extend([host] for host in batch)
+        elif error:
+          for host in batch: self.failed_hosts[host] = error
+        else:
+          records.update(result)
+      for batch, (result, error, elapsed) in zip(retry, pool.map(self.collect_batch, retry)):
+        self.latencies[batch[0]] = elapsed
+        if error: self.failed_hosts[batch[0]] = error
+        else:     records.update(result)
+    finally:
+      if pool is not self.executor: pool.shutdown()
+
+    for host in hostnames:
+      if host in self.failed_hosts or host in records: continue
+      logger.warning(f'collect_records: no pbsnodes record returned for {host}')
+      self.failed_hosts[host] = 'missing'
+    return records
+
+  #------------------------------------
+  def make_node(self, host, record):
+    """
+    Return a parsed node object from the "pbsnodes" record of one host, and 
+    remember the hash of the record; None if the record can not be parsed
+    """
+    obj = node(host, pbsnodes=record, parse=False)
+    if not obj.parse():
+      self.failed_hosts[host] = 'parse error'
+      return None
+    if not self.keep_raw: obj.drop_raw()
+    self.digests[host] = hash(record)
+    return obj
+
+  #------------------------------------
+  def index_hosts(self):
+    """
+    Rebuild the lookups from the hostnames to the node objects and their positions
+    """
+    self.by_host  = {n.hostname: n for n in self.list_hosts}
+    self.position = {n.hostname: k for k, n in enumerate(self.list_hosts)}
+
+  #------------------------------------
+  def get_replaced(self, version, by_host):
+    """
+    Return the hostnames whose node objects were replaced or removed since an
+    index last looked at the snapshot "version" through the lookup "by_host":
+    an empty list if the snapshot is still the same, the hosts of self.last_diff
+    if it is the next version, and None if the whole snapshot must be scanned
+    (the first build, a skipped version, or gather_nodes / load_cache)
+    """
+    if by_host is self.by_host: return []
+    diff = self.last_diff
+    if diff is None or diff.version != self.version or version != self.version - 1: return None
+    return diff.reparsed + diff.removed
+
+  #------------------------------------
+  def get_node(self, hostname):
+    """
+    Return the node object of "hostname" in the current snapshot, or None
+    """
+    return self.by_host.get(hostname)
+
+  #------------------------------------
+  def collect_batch(self, batch):
+    """
+    Call "pbsnodes" once for the hostnames in "batch", and return a tuple with the 
+    per-host records (a dictionary), an error string (None on success), and the 
+    wall-clock time of the call
+    """
+    prof = self.profile
+    t0 = time.perf_counter()
+    try:
+      text = self.source.fetch(batch, timeout=self.timeout)
+      t1 = time.perf_counter()
+      with prof.stage('split'): records = split_pbsnodes(text)
+      prof.add('fetch', t1 - t0)
+      prof.observe(t1 - t0, len(batch))
+      return records, None, t1 - t0
+    except subprocess.TimeoutExpired:
+      logger.warning(f'collect_batch: pbsnodes timed out after {self.timeout} sec on {batch[0]} ...')
+      return None, 'timeout', time.perf_counter() - t0
+    except OSError as err:
+      logger.warning(f'collect_batch: pbsnodes failed on {batch[0]} ...: {err}')
+      return None, 'error', time.perf_counter() - t0
+    except Exception as err:   # e.g. a broken data source; the other batches go on
+      logger.warning(f'collect_batch: the data source failed on {batch[0]} ...: {err!r}')
+      return None, 'error', time.perf_counter() - t0
+
+  #------------------------------------
+  def columnar(self):
+    """
+    Return a columnar (NumPy) view of the current list of nodes; see def_snapshot.
+    NumPy is only imported when this view is asked for
+    """
+    from def_snapshot import snapshot
+    return snapshot(self)
+
+  #------------------------------------
+  def get_job_index(self):
+    """
+    Return the job index (see def_jobs) of the current snapshot; it is built on 
+    the first call, and later calls only re-index the hosts of the last diff,
+    once per version (see get_replaced)
+    """
+    if self.job_index is None:
+      from def_jobs import job_index
+      self.job_index = job_index()
+    self.job_index.update(self)
+    return self.job_index
+
+  #------------------------------------
+  def get_free_index(self):
+    """
+    Return the free-resource index (see def_free) of the current snapshot; it is 
+    built on the first call, and later calls only re-index the hosts of the last 
+    diff, once per version (see get_replaced)
+    """
+    if self.free_index is None:
+      from def_free import free_index
+      self.free_index = free_index()
+    self.free_index.update(self)
+    return self.free_index
+
+  #------------------------------------
+  def get_gpu_table(self):
+    """
+    Return the host x device GPU table (see def_gpu_table) of the current snapshot; 
+    it is built on the first call, and later calls only fill the hosts which changed
+    """
+    if self.gpu_table is None:
+      from def_gpu_table import gpu_table
+      self.gpu_table = gpu_table()
+    self.gpu_table.update(self)
+    return self.gpu_table
+
+  #------------------------------------
+  def get_batches(self, hostnames=None):
+    """
+    Split "hostnames" (default: self.hostnames) into batches of at most 
+    self.batch_size hostnames; each batch is then passed to a single "pbsnodes" 
+    call. Without the bulk mode, every batch holds a single hostname
+    """
+    if hostnames is None: hostnames = self.hostnames
+    size = (self.batch_size or len(hostnames)) if self.bulk else 1
+    if size <= 0: return []
+    return [hostnames[i : i+size] for i in range(0, len(hostnames), size)]
+
+  #------------------------------------
+  #------------------------------------
+  #------------------------------------
+  #------------------------------------
@@ -0,0 +1,278 @@
+"""
+Name:    def_parser
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   parse_node(obj)
+Return:  True if the "pbsnodes" text of the node object is parsed, else False
+Purpose: To parse a "pbsnodes" record in one scan, driven by declarative
+         tables of the node, cpu and gpu fields, instead of routing every
+         field through set() -> setattr() -> property setter
+Remarks: + Each table maps a "pbsnodes" key to a tuple of the attribute name
+           and a converter; the converter is None for string attributes, 
+           and intern for the strings which repeat across nodes
+         + The "<key>=<value>" pairs of the known keys are cut out by one 
+           regular expression scan per level (record lines, status items, 
+           gpu items) into a dictionary, and each table is applied by one 
+           loop over its rows (see compile_fields), so the unknown items of
+           a record are never visited
+         + The int and float attributes are written straight into their
+           "_" attributes, i.e. the property setters are bypassed, but the
+           conversion is the same
+         + Unknown keys (e.g. a field which a newer Torque adds) are skipped,
+           and a value which can not be converted keeps its default; both
+           are only logged once per key, and only at the debug level
+         + The GPU devices are placed by their index in "gpu[<index>]", so
+           any number of devices is handled
+"""
+import sys
+import logging
+import re
+
+from def_gpu import gpu
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# converters from the raw "pbsnodes" strings; the string values which are
+# shared by many nodes (e.g. opsys, version, gpu_product_name) are interned,
+# so that all nodes refer to one copy of each distinct value
+intern = sys.intern
+
+# an empty value (e.g. "gpu_memory_used=" of a GPU which reports nothing) gives
+# int(''), i.e. a ValueError like any other bad value, so the field is skipped
+def to_first_int(val): return int((val.split() or [''])[0])     # e.g. '16276 MB', '31 C'
+def to_last_int(val):  return int((val.split() or [''])[-1])    # e.g. '? 0' of idle nodes
+def to_percent(val):   return int(val.split('%')[0])  # e.g. '97%'
+
+# the converters which make a field numeric
+numeric_converters = (int, float, to_first_int, to_last_int, to_percent)
+
+#--------------------------------------
+# the fields of the node class: the "<key> = <value>" lines of a record
+node_fields = {
+  'state':                ('state', intern),
+  'power_state':          ('power_state', intern),
+  'np':                   ('_np', int),
+  'properties':           ('properties', intern),
+  'ntype':                ('ntype', intern),
+  'jobs':                 ('jobs', None),
+  'status':               ('status', None),
+  'mom_service_port':     ('_mom_service_port', int),
+  'mom_manager_port':     ('_mom_manager_port', int),
+  'gpus':                 ('_gpus', int),
+  'gpu_status':           ('gpu_status', None),
+  'total_sockets':        ('_total_sockets', int),
+  'total_numa_nodes':     ('_total_numa_nodes', int),
+  'total_cores':          ('_total_cores', int),
+  'total_threads':        ('_total_threads', int),
+  'dedicated_sockets':    ('_dedicated_sockets', int),
+  'dedicated_numa_nodes': ('_dedicated_numa_nodes', int),
+  'dedicated_cores':      ('_dedicated_cores', int),
+  'dedicated_threads':    ('_dedicated_threads', int),
+}
+
+# the fields of the cpu class: the comma-separated "<key>=<value>" items of "status"
+cpu_fields = {
+  'opsys':         ('opsys', intern),
+  'uname':         ('uname', None),
+  'sessions':      ('sessions', None),
+  'nsessions':     ('_nsessions', to_last_int),
+  'loadave':       ('_loadave', float),
+  'netload':       ('netload', None),
+  'state':         ('state', intern),
+  'varattr':       ('varattr', intern),
+  'puppethpccode': ('puppethpccode', intern),
+  'sudo':          ('sudo', intern),
+  'kernel':        ('kernel', intern),
+  'cpuclock':      ('cpuclock', intern),
+  'macaddr':       ('macaddr', None),
+  'version':       ('version', intern),
+  'rectime':       ('rectime', None),
+  'jobs':          ('jobs', None),
+}
+
+# the fields of the gpu class: the semicolon-separated "<key>=<value>" items of
+# each "gpu[<index>]=..." entry of "gpu_status"
+gpu_fields = {
+  'gpu_id':                    ('gpu_id', None),
+  'gpu_pci_device_id':         ('_gpu_pci_device_id', int),
+  'gpu_pci_location_id':       ('gpu_pci_location_id', None),
+  'gpu_product_name':          ('gpu_product_name', intern),
+  'gpu_memory_total':          ('_gpu_memory_total', to_first_int),
+  'gpu_memory_used':           ('_gpu_memory_used', to_first_int),
+  'gpu_mode':                  ('gpu_mode', intern),
+  'gpu_state':                 ('gpu_state', intern),
+  'gpu_utilization':           ('_gpu_utilization', to_percent),
+  'gpu_memory_utilization':    ('_gpu_memory_utilization', to_percent),
+  'gpu_ecc_mode':              ('gpu_ecc_mode', intern),
+  'gpu_single_bit_ecc_errors': ('_gpu_single_bit_ecc_errors', int),
+  'gpu_double_bit_ecc_errors': ('_gpu_double_bit_ecc_errors', int),
+  'gpu_temperature':           ('_gpu_temperature', to_first_int),
+}
+
+#--------------------------------------
+def known_pairs(fields, sep, delim):
+  """
+  Compile a regular expression which cuts the "<key><sep><value>" pairs of the
+  keys in the table "fields" out of a "delim"-separated string; all other keys
+  are passed over inside the regular expression engine
+  """
+  keys = '|'.join(re.escape(key) for key in fields)
+  return re.compile(f'(?<![^{delim}])({keys}){re.escape(sep)}([^{delim}]*)')
+
+# the "<key> = <value>" lines of a record, the "<key>=<value>" items of "status",
+# and the "<key>=<value>" items of one GPU device in "gpu_status"; the "any_*"
+# expressions also match the unknown keys, and are only used to report them
+node_pairs = re.compile(r'^\s*(' + '|'.join(node_fields) + r') = (.*)$', re.M)
+cpu_pairs  = known_pairs(cpu_fields, '=', ',')
+gpu_pairs  = known_pairs(gpu_fields, '=', ';')
+any_node_pairs = re.compile(r'^\s*(\w+) = (.*)$', re.M)
+any_cpu_pairs  = re.compile(r'(?<![^,])([^,=]*)=([^,]*)')
+any_gpu_pairs  = re.compile(r'(?<![^;])([^;=]*)=([^;]*)')
+
+# keys which are already reported, to keep the log quiet
+skipped_keys = set()
+
+# the number of records which took the tolerant path (apply_fields), and of the
+# unknown keys and bad values which were skipped; read by def_profile
+counters = {'fallbacks': 0, 'skipped': 0}
+
+#--------------------------------------
+def debug(): return logger.isEnabledFor(logging.DEBUG)
+
+#--------------------------------------
+def report_unknown(text, any_pairs, fields, where):
+  """
+  Log the keys in "text" which have no entry in the table "fields"
+  """
+  for key, val in any_pairs.findall(text):
+    if key not in fields: skip(where, key)
+
+#--------------------------------------
+def skip(where, key, val=None):
+  """
+  Log an unknown key, or a value which can not be converted, once per key
+  """
+  counters['skipped'] += 1
+  if (where, key) in skipped_keys: return
+  skipped_keys.add((where, key))
+  if val is None:
+    logger.debug(f'{where}: skipping the unknown key: {key}')
+  else:
+    logger.debug(f'{where}: can not convert {key}={val}; the default is kept')
+
+#--------------------------------------
+def apply_fields(obj, pairs, fields, where):
+  """
+  Assign the values in the dictionary "pairs" (key -> raw string) to the 
+  attributes of "obj" according to the table "fields". This is the tolerant
+  (and slower) path, which is taken if the one of compile_fields hits a bad value
+  """
+  counters['fallbacks'] += 1
+  for key, (attr, conv) in fields.items():
+    val = pairs.get(key)
+    if val is None: continue
+    if conv is None:
+      setattr(obj, attr, val)
+      continue
+    try:
+      setattr(obj, attr, conv(val))
+    except ValueError:
+      skip(where, key, val)
+
+#--------------------------------------
+def compile_fields(fields, where):
+  """
+  Turn the table "fields" into a function apply(obj, pairs), which assigns the
+  values of a record in one loop over the (key, attribute, conversion) rows of 
+  the table. If a conversion fails, the whole record is handed over to
+  apply_fields() instead
+  """
+  rows = tuple((key, attr, conv) for key, (attr, conv) in fields.items())
+  def apply(obj, pairs):
+    get = pairs.get
+    try:
+      for key, attr, conv in rows:
+        val = get(key)
+        if val is None: continue
+        setattr(obj, attr, val if conv is None else conv(val))
+    except ValueError:
+      apply_fields(obj, pairs, fields, where)
+  return apply
+
+#--------------------------------------
+# the appliers of the tables
+apply_node = compile_fields(node_fields, 'parse_node')
+apply_cpu  = compile_fields(cpu_fields, 'parse_cpu')
+apply_gpu  = compile_fields(gpu_fields, 'parse_gpu_devices')
+
+#--------------------------------------
+def parse_gpu_devices(gpu_status):
+  """
+  Return a list of gpu() instances, sorted by the device index, from the
+  "gpu_status" string
+  """
+  devices = dict()
+  for item in gpu_status.split(','):
+    if not item.startswith('gpu['): continue  # e.g. driver_ver, timestamp
+    close = item.find(']=')
+    if close < 0: continue
+    try:
+      index = int(item[4:close])
+    except ValueError:
+      skip('parse_gpu_devices', item[:close + 1])
+      continue
+    this = gpu()
+    this.index = index
+    info = item[close + 2:]
+    apply_gpu(this, dict(gpu_pairs.findall(info)))
+    if debug(): report_unknown(info, any_gpu_pairs, gpu_fields, 'parse_gpu_devices')
+    devices[index] = this
+  return [devices[index] for index in sorted(devices)]
+
+#--------------------------------------
+def parse_node(obj, pbsnodes=None):
+  """
+  Parse the "pbsnodes" text (by default obj.pbsnodes) of one host into the
+  node object "obj", together with its cpu object and its list of gpu objects
+  """
+  text  = obj.pbsnodes if pbsnodes is None else pbsnodes
+  first = text.split('\n', 1)[0].strip()
+  if first != obj.hostname:
+    logger.error(f'Error: parse_node: conflicting hostnames: {first} vs. {obj.hostname}')
+    return False
+
+  apply_node(obj, dict(node_pairs.findall(text)))
+  if debug(): report_unknown(text, any_node_pairs, node_fields, 'parse_node')
+  if obj.status is not None:
+    apply_cpu(obj.cpu, dict(cpu_pairs.findall(obj.status)))
+    if debug(): report_unknown(obj.status, any_cpu_pairs, cpu_fields, 'parse_cpu')
+  if obj.gpu_status is not None:
+    obj.gpu_list = parse_gpu_devices(obj.gpu_status)
+  return True
+
+#--------------------------------------
+def parse_jobs(jobs):
+  """
+  Split the "jobs" field of a node, e.g. '0-8/123.server,9,11-35/124.server',
+  into a dictionary of job id -> list of (first, last) core ranges, e.g.
+  {'123.server': [(0, 8)], '124.server': [(9, 9), (11, 35)]}
+  """
+  result = dict()
+  if not jobs: return result
+  ranges = list()
+  for item in jobs.split(','):
+    cores, slash, job = item.strip().partition('/')
+    if cores:
+      first, dash, last = cores.partition('-')
+      try:
+        ranges.append((int(first), int(last or first)))
+      except ValueError:
+        skip('parse_jobs', cores, jobs)
+    if slash:
+      result.setdefault(job, []).extend(ranges)
+      ranges = list()
+  return result
+
+#--------------------------------------
@@ -0,0 +1,251 @@
+"""
+Name:    def_profile
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   pool = nodes('genius', profile=True)      # or pool.enable_profile()
+         pool.refresh(); print(pool.profile.format())
+         diff, text = profile_sweep(pool)           # one sweep under cProfile
+Return:
+Purpose: To tell where the time of a sweep goes: the pbs_server round trip,
+         the subprocess spawn, splitting the output, parsing the records, or
+         diffing the snapshots, together with the per-host collection latency,
+         the failures and the parser fallbacks
+Remarks: + The stages are: spawn (starting the "pbsnodes" subprocess), wait
+           (until it returns its output), fetch (one call of the data source,
+           i.e. spawn + wait for a live source), split (split_pbsnodes), parse
+           (building the node objects), diff (the rates and the node diffs of
+           a refresh) and cache (saving the snapshot); every stage keeps the
+           number of calls, the total and the longest time
+         + The latency of every host is the wall-clock time of the "pbsnodes"
+           call which covered it, counted in a histogram with logarithmic
+           buckets (1 ms, 2 ms, 4 ms, ... 65 s)
+         + The counters are the failed hosts per reason, the records which
+           were parsed again or skipped as unchanged, and the parser
+           fallbacks and skipped keys (see def_parser.counters)
+         + A nodes instance is given the shared, disabled instruments by
+           default, whose methods return at once, so the cost without
+           profiling is one method call per stage and per sweep
+"""
+import sys
+import logging
+import bisect
+import io
+import threading
+import time
+
+import def_parser
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the upper edges (in seconds) of the latency histogram buckets: 1 ms ... 65 s
+latency_edges = tuple(0.001 * 2 ** k for k in range(17))
+
+# C L A S S ###########################
+class stage_timer:
+  """
+  The context manager which adds the time of its block to one stage
+  """
+  __slots__ = ('owner', 'name', 'start')
+
+  def __init__(self, owner, name):
+    self.owner = owner
+    self.name  = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.owner.add(self.name, time.perf_counter() - self.start)
+    return False
+
+# C L A S S ###########################
+class null_timer:
+  """
+  The context manager of the disabled instruments, which does nothing
+  """
+  __slots__ = ()
+  def __enter__(self): return self
+  def __exit__(self, *exc): return False
+
+null_stage = null_timer()
+
+# C L A S S ###########################
+class instruments:
+  """
+  The stage timers, latency histogram and counters of a nodes instance
+  """
+  #------------------------------------
+  def __init__(self, enabled=True):
+    self.enabled = enabled
+    # time.perf_counter if enabled, else None, so that hot loops can test it
+    self.clock   = time.perf_counter if enabled else None
+    self.lock    = threading.Lock()
+    self.reset()
+
+  #------------------------------------
+  def reset(self):
+    """
+    Forget all measurements
+    """
+    self.stages    = dict()    # stage -> [calls, total seconds, longest seconds]
+    self.sweeps    = dict()    # 'gather' or 'refresh' -> [sweeps, total, longest, last]
+    self.counters  = dict()    # name -> count
+    self.histogram = [0] * (len(latency_edges) + 1)
+    self.parser    = dict(def_parser.counters)   # the parser counters at the start
+
+  #------------------------------------
+  def stage(self, name):
+    """
+    Return a context manager which times its block as the stage "name"
+    """
+    if not self.enabled: return null_stage
+    return stage_timer(self, name)
+
+  #------------------------------------
+  def add(self, name, seconds, calls=1):
+    """
+    Add "seconds" (of "calls" calls) to the stage "name"
+    """
+    if not self.enabled: return
+    with self.lock:
+      found = self.stages.get(name)
+      if found is None: found = self.stages[name] = [0, 0.0, 0.0]
+      found[0] += calls
+      found[1] += seconds
+      found[2]  = max(found[2], seconds)
+
+  #------------------------------------
+  def count(self, name, n=1):
+    """
+    Add "n" to the counter "name"
+    """
+    if not self.enabled: return
+    with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+  #------------------------------------
+  def observe(self, seconds, n=1):
+    """
+    Count the collection latency "seconds" of "n" hosts in the histogram
+    """
+    if not self.enabled: return
+    bucket = bisect.bisect_left(latency_edges, seconds)
+    with self.lock: self.histogram[bucket] += n
+
+  #------------------------------------
+  def sweep(self, kind, seconds):
+    """
+    Record the duration of one sweep; "kind" is 'gather' or 'refresh'
+    """
+    if not self.enabled: return
+    with self.lock:
+      found = self.sweeps.get(kind)
+      if found is None: found = self.sweeps[kind] = [0, 0.0, 0.0, 0.0]
+      found[0] += 1
+      found[1] += seconds
+      found[2]  = max(found[2], seconds)
+      found[3]  = seconds
+
+  #------------------------------------
+  def percentile(self, fraction):
+    """
+    Return the upper edge of the histogram bucket which holds the "fraction"
+    (e.g. 0.9) of the host latencies, or None without any latency
+    """
+    total = sum(self.histogram)
+    if not total: return None
+    running = 0
+    for k, n in enumerate(self.histogram):
+      running += n
+      if running >= fraction * total:
+        return latency_edges[k] if k < len(latency_edges) else float('inf')
+
+  #------------------------------------
+  def report(self):
+    """
+    Return a dictionary with all measurements
+    """
+    with self.lock:
+      counters = dict(self.counters)
+      for name, n in def_parser.counters.items():
+        counters[f'parser_{name}'] = n - self.parser.get(name, 0)
+      return {
+        'stages':   {name: {'calls': calls, 'seconds': total, 'longest': longest}
+                     for name, (calls, total, longest) in self.stages.items()},
+        'sweeps':   {kind: {'sweeps': n, 'seconds': total, 'longest': longest, 'last': last}
+                     for kind, (n, total, longest, last) in self.sweeps.items()},
+        'counters': counters,
+        'latency':  {'edges': list(latency_edges), 'hosts': list(self.histogram),
+                     'p50': self.percentile(0.5), 'p90': self.percentile(0.9),
+                     'p99': self.percentile(0.99)},
+      }
+
+  #------------------------------------
+  def format(self):
+    """
+    Return the report as a text table
+    """
+    report = self.report()
+    lines  = [f'{"sweep":<10s} {"count":>6s} {"mean [ms]":>10s} {"max [ms]":>10s} {"last [ms]":>10s}']
+    for kind, val in report['sweeps'].items():
+      lines.append(f'{kind:<10s} {val["sweeps"]:>6d} {1e3 * val["seconds"] / val["sweeps"]:>10.1f} '
+                   f'{1e3 * val["longest"]:>10.1f} {1e3 * val["last"]:>10.1f}')
+    lines += ['', f'{"stage":<10s} {"calls":>6s} {"total [ms]":>10s} {"max [ms]":>10s}']
+    for name, val in sorted(report['stages'].items(), key=lambda item: -item[1]['seconds']):
+      lines.append(f'{name:<10s} {val["calls"]:>6d} {1e3 * val["seconds"]:>10.1f} {1e3 * val["longest"]:>10.1f}')
+    lines += ['', f'{"latency up to":<14s} {"hosts":>8s}']
+    for k, n in enumerate(report['latency']['hosts']):
+      if not n: continue
+      edge = f'{1e3 * latency_edges[k]:.0f} ms' if k < len(latency_edges) else 'more'
+      lines.append(f'{edge:<14s} {n:>8d}')
+    lines += ['', f'{"counter":<24s} {"count":>8s}']
+    for name, n in sorted(report['counters'].items()):
+      lines.append(f'{name:<24s} {n:>8d}')
+    return '\n'.join(lines)
+
+  #------------------------------------
+
+# the shared instruments of the nodes instances which are not profiled
+disabled = instruments(enabled=False)
+
+# C L A S S ###########################
+class inline_executor:
+  """
+  An executor which runs the "pbsnodes" calls one after the other in the
+  calling thread, because cProfile only sees the thread which enabled it
+  """
+  def map(self, func, *iterables):
+    return list(map(func, *iterables))
+
+  def shutdown(self, wait=True):
+    pass
+
+#--------------------------------------
+def profile_sweep(pool, path=None, sort='cumulative', limit=30):
+  """
+  Run one sweep of the nodes instance "pool" (gather_nodes if it is empty,
+  else a full refresh) under cProfile; return the snapshot_diff (None for a
+  gather) and the text of the "limit" top functions, sorted by "sort". With
+  "path", the raw profile is also saved there (e.g. for snakeviz). The
+  batches are collected in the calling thread during this sweep, so that the
+  fetch, split and parse stages show up in the profile
+  """
+  import cProfile
+  import pstats
+  profiler = cProfile.Profile()
+  executor = pool.executor
+  pool.executor = inline_executor()
+  profiler.enable()
+  try:
+    diff = pool.refresh() if pool.list_hosts else pool.gather_nodes()
+  finally:
+    profiler.disable()
+    pool.executor = executor
+  if path: profiler.dump_stats(path)
+  text = io.StringIO()
+  pstats.Stats(profiler, stream=text).sort_stats(sort).print_stats(limit)
+  return diff, text.getvalue()
+
+#--------------------------------------
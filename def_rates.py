@@ -0,0 +1,82 @@
+"""
+Name:    def_rates
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   update_rates(old, new)      # old and new are node objects of the same host
+         new.cpu.netload_rate, new.cpu.report_age, new.gpu_list[0].gpu_double_bit_ecc_rate
+Return:
+Purpose: To derive the rate metrics of a node from two consecutive MOM reports:
+         the network throughput from the "netload" counter, and the ECC error
+         rates of the GPUs from their error counters
+Remarks: + The time step is the difference of the "rectime" of the two reports
+           (i.e. the MOM clock), and not the time between two pbsnodes calls
+         + The rates are streamed: every node object only needs the previous
+           node object of its host, which nodes.refresh() replaces anyway,
+           so the memory per host is constant
+         + If the MOM did not send a new report (same rectime), the previous
+           rates are carried over; if either rectime is missing or the clock
+           went back, or if a counter went down (e.g. a reboot), the rate is
+           unknown (None) until the next report
+         + The GPUs of the two reports are paired by their device index, so a
+           device which is skipped in one report gets no rate
+         + The age of the last report (cpu.report_age) needs no history, and
+           is computed from "rectime" when it is asked for
+"""
+import sys
+import logging
+
+from def_gpu import find_device
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the GPU counters and their rate attributes
+gpu_counters = (('_gpu_single_bit_ecc_errors', '_gpu_single_bit_ecc_rate'),
+                ('_gpu_double_bit_ecc_errors', '_gpu_double_bit_ecc_rate'))
+
+#--------------------------------------
+def to_int(val):
+  """
+  Return the integer value of a raw string, or None
+  """
+  try:
+    return int(val)
+  except (TypeError, ValueError):
+    return None
+
+#--------------------------------------
+def get_rate(old, new, seconds):
+  """
+  Return the rate of a counter, or None if it is missing or went down
+  """
+  if old is None or new is None or new < old: return None
+  return (new - old) / seconds
+
+#--------------------------------------
+def update_rates(old, new):
+  """
+  Set the rate attributes of the node object "new" from the previous node
+  object "old" of the same host
+  """
+  a, b = old.cpu, new.cpu
+  t0, t1 = to_int(a.rectime), to_int(b.rectime)
+  pairs  = [(find_device(old.gpu_list, dev_b.index), dev_b) for dev_b in new.gpu_list]
+  pairs  = [(dev_a, dev_b) for dev_a, dev_b in pairs if dev_a is not None]
+  if t0 is not None and t0 == t1:
+    b._netload_rate = a._netload_rate
+    for dev_a, dev_b in pairs:
+      for counter, rate in gpu_counters: setattr(dev_b, rate, getattr(dev_a, rate))
+    return
+  if t0 is None or t1 is None or t1 < t0:
+    b._netload_rate = None
+    for dev_b in new.gpu_list:
+      for counter, rate in gpu_counters: setattr(dev_b, rate, None)
+    return
+  seconds = t1 - t0
+  b._netload_rate = get_rate(to_int(a.netload), to_int(b.netload), seconds)
+  for dev_a, dev_b in pairs:
+    for counter, rate in gpu_counters:
+      setattr(dev_b, rate, get_rate(getattr(dev_a, counter), getattr(dev_b, counter), seconds))
+
+#--------------------------------------
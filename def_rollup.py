@@ -0,0 +1,270 @@
+"""
+Name:    def_rollup
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   rolls = rollups(store)            # store is an instance of def_history.history
+         store.record(pool, diff); rolls.update()
+         times, per_rack = rolls.query('gpu_utilization', since=now - 30*86400, by='rack')
+Return:
+Purpose: To keep downsampled (1-minute, 15-minute and hourly) min/mean/max
+         rollups of the metric history, so that long-range questions (e.g. the
+         GPU utilization per rack over the last month) read a few hundred
+         buckets instead of every raw sample
+Remarks: + Every level is a ring of time buckets, memory-mapped next to the
+           history (in <history>/rollup_<seconds>); per bucket and host it
+           keeps the min, max, sum and count of the samples
+         + update() ingests the history samples which are newer than the last
+           ingested one, so the rollups are maintained incrementally, and
+           catch up by themselves after a restart
+         + A GPU metric is rolled up per host, as the mean over its devices
+         + query() picks the coarsest level which covers the requested range
+           and still gives the requested number of points, and groups the
+           hosts by rack, iru or pool (see def_source.parse_hostname)
+"""
+import sys, os
+import logging
+
+import numpy as np
+
+from def_history import host_metrics, gpu_metrics, as_float, open_column
+from def_source import parse_hostname
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the rollup levels: (bucket width in seconds, number of buckets)
+default_levels = ((60, 1440),       # 1 day of 1-minute buckets
+                  (900, 1344),      # 2 weeks of 15-minute buckets
+                  (3600, 2160))     # 90 days of hourly buckets
+
+# C L A S S ###########################
+class level:
+  """
+  One rollup resolution: a ring of time buckets with min, max, sum and count
+  """
+  #------------------------------------
+  def __init__(self, directory, width, capacity, n_hosts, n_gpu_hosts):
+    self.directory = directory
+    self.width     = width
+    self.capacity  = capacity
+    mode = 'r+' if os.path.exists(os.path.join(directory, 'time.npy')) else 'w+'
+    os.makedirs(directory, exist_ok=True)
+
+    self.cursor = self.open('cursor', np.int64, (2,), mode)      # ring position, n buckets
+    self.times  = self.open('time', np.float64, (capacity,), mode)
+    self.stats  = dict()
+    for name in list(host_metrics) + list(gpu_metrics):
+      n_cols = n_hosts if name in host_metrics else n_gpu_hosts
+      self.stats[name] = {stat: self.open(f'{name}.{stat}', dtype, (capacity, n_cols), mode)
+                          for stat, dtype in (('min', np.float32), ('max', np.float32),
+                                              ('sum', np.float32), ('count', np.uint16))}
+    if mode == 'w+':
+      self.cursor[:] = 0
+      self.times[:]  = np.nan
+
+  #------------------------------------
+  def open(self, name, dtype, shape, mode):
+    """
+    Memory-map the .npy file of one column of this level
+    """
+    return open_column(os.path.join(self.directory, f'{name}.npy'), dtype, shape, mode)
+
+  #------------------------------------
+  def get_count(self):
+    """
+    Return the number of buckets in the ring (at most the capacity)
+    """
+    return int(self.cursor[1])
+
+  #------------------------------------
+  def head(self):
+    """
+    Return the ring row of the current (latest) bucket, or None
+    """
+    return (int(self.cursor[0]) - 1) % self.capacity if self.get_count() else None
+
+  #------------------------------------
+  def add(self, stamp, sample):
+    """
+    Add one sample (metric -> 1-D float array, NaN if missing) at time "stamp";
+    samples older than the current bucket are ignored
+    """
+    start = np.floor(stamp / self.width) * self.width
+    row   = self.head()
+    if row is None or start > self.times[row]:
+      row = int(self.cursor[0])
+      self.times[row] = start
+      for stats in self.stats.values():
+        stats['min'][row] = np.inf
+        stats['max'][row] = -np.inf
+        stats['sum'][row] = 0
+        stats['count'][row] = 0
+      self.cursor[0] = (row + 1) % self.capacity
+      self.cursor[1] = min(self.capacity, self.get_count() + 1)
+    elif start < self.times[row]:
+      return
+    for name, values in sample.items():
+      stats = self.stats[name]
+      found = ~np.isnan(values)
+      np.fmin(stats['min'][row], values, out=stats['min'][row])
+      np.fmax(stats['max'][row], values, out=stats['max'][row])
+      stats['sum'][row]   += np.where(found, values, 0)
+      stats['count'][row] += found
+
+  #------------------------------------
+  def rows(self, since=None, until=None):
+    """
+    Return the ring rows of the buckets which overlap [since, until], in
+    chronological order
+    """
+    count = self.get_count()
+    rows  = np.arange(int(self.cursor[0]) - count, int(self.cursor[0])) % self.capacity
+    times = self.times[rows]
+    keep  = np.ones(count, dtype=bool)
+    if since is not None: keep &= times + self.width > since
+    if until is not None: keep &= times <= until
+    return rows[keep]
+
+  #------------------------------------
+  def oldest(self):
+    """
+    Return the start time of the oldest bucket (inf if there is none)
+    """
+    rows = self.rows()
+    return self.times[rows[0]] if len(rows) else np.inf
+
+  #------------------------------------
+  def flush(self):
+    """
+    Write the modified pages of this level to disk
+    """
+    for stats in self.stats.values():
+      for values in stats.values(): values.flush()
+    self.cursor.flush()
+    self.times.flush()
+
+# C L A S S ###########################
+class rollups:
+  """
+  The multi-resolution rollups of a history store
+  """
+  #------------------------------------
+  def __init__(self, store, levels=default_levels):
+    self.store  = store
+    self.levels = [level(os.path.join(store.directory, f'rollup_{width}'), width, capacity,
+                         len(store.hostnames), len(store.gpu_hostnames))
+                   for width, capacity in sorted(levels)]
+    path = os.path.join(store.directory, 'rollup_last.npy')
+    mode = 'r+' if os.path.exists(path) else 'w+'
+    self.last   = open_column(path, np.float64, (1,), mode)   # time of the last ingested sample
+    if mode == 'w+': self.last[0] = -np.inf
+
+    # the host groups: (by, kind) -> {group: column indices}
+    self.groups = dict()
+    for kind, hosts in (('host', store.hostnames), ('gpu', store.gpu_hostnames)):
+      parts = [parse_hostname(host) for host in hosts]
+      for k, by in enumerate(('rack', 'iru', 'pool')):
+        found = dict()
+        for col, part in enumerate(parts): found.setdefault(part[k], []).append(col)
+        self.groups[(by, kind)] = {group: np.array(cols) for group, cols in found.items()}
+
+  #------------------------------------
+  def update(self):
+    """
+    Ingest the history samples which are newer than the last ingested one,
+    and return their number
+    """
+    store = self.store
+    rows  = store.rows(since=np.nextafter(self.last[0], np.inf))
+    for row in rows:
+      sample = {name: as_float(store.data[name][row]) for name in host_metrics}
+      for name in gpu_metrics:
+        values = as_float(store.data[name][row])
+        found  = (~np.isnan(values)).sum(axis=1)
+        sample[name] = np.where(found > 0, np.nansum(values, axis=1) / np.maximum(found, 1), np.nan)
+      for lev in self.levels: lev.add(store.times[row], sample)
+      self.last[0] = store.times[row]
+    return len(rows)
+
+  #------------------------------------
+  def pick(self, since=None, until=None, points=None):
+    """
+    Return the coarsest level which reaches back to "since" and still gives at
+    least "points" buckets over [since, until]; without "points", the finest
+    level which reaches back. If no level reaches back, the coarsest level
+    """
+    if since is None: return self.levels[0]
+    covering = [lev for lev in self.levels if lev.oldest() <= since]
+    if not covering: return self.levels[-1]
+    if points is None: return covering[0]
+    stamps = self.store.times[self.store.rows()]
+    span   = (until if until is not None else stamps[-1]) - since
+    enough = [lev for lev in covering if span / lev.width >= points]
+    return enough[-1] if enough else covering[0]
+
+  #------------------------------------
+  def query(self, metric, since=None, until=None, points=None, by=None, how='mean',
+            resolution=None):
+    """
+    Return the bucket start times, and the rollup of "metric" over [since, until]:
+    with by=None one cluster-wide series, with by='host' a buckets x hosts array,
+    and with by='rack', 'iru' or 'pool' a dictionary of group -> series.
+    "how" is min, mean or max; "resolution" (in seconds) overrides the choice
+    of the level
+    """
+    if metric not in host_metrics and metric not in gpu_metrics:
+      logger.warning(f'query: the rollups do not have this metric: {metric}')
+      return None
+    if how not in ('min', 'mean', 'max'):
+      logger.warning(f'query: unknown reduction: {how}')
+      return None
+    if resolution is not None:
+      lev = {lev.width: lev for lev in self.levels}.get(resolution)
+      if lev is None:
+        logger.warning(f'query: no rollup level with resolution {resolution}')
+        return None
+    else:
+      lev = self.pick(since, until, points)
+    rows  = lev.rows(since, until)
+    stats = {stat: values[rows] for stat, values in lev.stats[metric].items()}
+    kind  = 'host' if metric in host_metrics else 'gpu'
+
+    if by == 'host': return lev.times[rows], reduce_stats(stats, how, axis=None)
+    if by is None:   return lev.times[rows], reduce_stats(stats, how, axis=1)
+    if (by, kind) not in self.groups:
+      logger.warning(f'query: unknown grouping: {by}')
+      return None
+    return lev.times[rows], {group: reduce_stats({stat: values[:, cols] for stat, values in stats.items()},
+                                                 how, axis=1)
+                             for group, cols in self.groups[(by, kind)].items()}
+
+  #------------------------------------
+  def flush(self):
+    """
+    Write the modified pages of all levels to disk
+    """
+    for lev in self.levels: lev.flush()
+    self.last.flush()
+
+#--------------------------------------
+def reduce_stats(stats, how, axis=None):
+  """
+  Reduce the bucket statistics (min, max, sum, count) to the min, mean or max,
+  over the hosts (axis=1), or per host (axis=None); empty buckets are NaN
+  """
+  count = stats['count'].astype(np.float64)
+  if axis is not None:
+    if how == 'mean':
+      total = count.sum(axis=axis)
+      return np.where(total > 0, stats['sum'].astype(np.float64).sum(axis=axis) / np.maximum(total, 1), np.nan)
+    values = np.where(count > 0, stats[how].astype(np.float64), np.nan)
+    found  = (count > 0).any(axis=axis)
+    filled = np.where(np.isnan(values), np.inf if how == 'min' else -np.inf, values)
+    result = filled.min(axis=axis) if how == 'min' else filled.max(axis=axis)
+    return np.where(found, result, np.nan)
+  if how == 'mean':
+    return np.where(count > 0, stats['sum'] / np.maximum(count, 1), np.nan)
+  return np.where(count > 0, stats[how].astype(np.float64), np.nan)
+
+#--------------------------------------
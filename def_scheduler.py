@@ -0,0 +1,257 @@
+"""
+Name:    def_scheduler
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   sched = poll_scheduler(pool, budget=2.0)    # pool is an instance of nodes
+         sched.tick()                                # poll the hosts which are due
+         sched.run(stop)                             # poll until stop.is_set()
+Return:  Every tick returns the snapshot_diff of the refreshed hosts (or None)
+Purpose: To poll every host with its own interval, instead of all hosts at
+         the same moment with the same cost, while keeping the number of
+         "pbsnodes" calls per second within a global budget
+Remarks: + The base interval of a host follows its state: busy GPU nodes are
+           polled most often, then busy CPU nodes, free nodes, and offline
+           nodes; down (or unreachable) nodes back off exponentially
+         + The interval shrinks for hosts which changed often in recent polls
+           (an exponentially weighted change rate), and grows with the
+           collection latency of the host
+         + The polled hosts follow pool.hostnames, which is checked on every
+           tick, so hosts which are discovered or dropped later are picked up
+         + The budget is a token bucket of "pbsnodes" calls per second; a
+           tick spends as many tokens as the bulk batches it needs, and the
+           most overdue hosts are served first
+"""
+import sys
+import logging
+import threading
+import time
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the base polling intervals (in seconds) per kind of host
+base_intervals = {
+  'gpu_busy':  10.0,
+  'cpu_busy':  30.0,
+  'free':      60.0,
+  'offline':  120.0,
+  'down':      60.0,   # doubled on every consecutive down poll, up to max_interval
+}
+
+# C L A S S ###########################
+class rate_limiter:
+  """
+  A token bucket: "rate" tokens are added per second, up to "burst" tokens
+  """
+  #------------------------------------
+  def __init__(self, rate, burst=None, clock=time.monotonic):
+    self.rate   = float(rate)
+    self.burst  = float(burst if burst is not None else max(1.0, rate))
+    self.clock  = clock
+    self.tokens = self.burst
+    self.stamp  = clock()
+    # the bucket can be shared by threads, e.g. the schedulers of several clusters
+    self.lock   = threading.Lock()
+
+  #------------------------------------
+  def refill(self):
+    """
+    Add the tokens which accrued since the last call, and return the number of
+    tokens; the caller holds the lock
+    """
+    now = self.clock()
+    self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+    self.stamp  = now
+    return self.tokens
+
+  #------------------------------------
+  def available(self):
+    """
+    Return the number of tokens which are available now
+    """
+    with self.lock: return self.refill()
+
+  #------------------------------------
+  def take(self, n=1):
+    """
+    Take "n" tokens if they are available, and return True; else return False
+    """
+    with self.lock:
+      if self.refill() < n: return False
+      self.tokens -= n
+      return True
+
+  #------------------------------------
+  def wait_time(self, n=1):
+    """
+    Return the number of seconds until "n" tokens are available
+    """
+    with self.lock: missing = n - self.refill()
+    return max(0.0, missing / self.rate) if self.rate > 0 else float('inf')
+
+# C L A S S ###########################
+class poll_scheduler:
+  """
+  Adaptive per-host polling of a nodes instance
+  """
+  #------------------------------------
+  def __init__(self, pool, budget=2.0, burst=None, min_interval=5.0, max_interval=900.0,
+               alpha=0.3, limiter=None, clock=time.monotonic):
+    self.pool         = pool
+    self.clock        = clock
+    self.min_interval = min_interval
+    self.max_interval = max_interval
+    self.alpha        = alpha      # weight of the latest poll in the change rate
+
+    # the global budget of "pbsnodes" calls per second (possibly shared with other
+    # schedulers, by passing the same rate_limiter)
+    self.limiter      = limiter or rate_limiter(budget, burst, clock=clock)
+
+    # per-host state: next poll time, interval, change rate, consecutive down polls
+    now = clock()
+    self.next_poll    = {host: now for host in pool.hostnames}
+    self.interval     = {host: 0.0 for host in pool.hostnames}
+    self.change_rate  = {host: 0.0 for host in pool.hostnames}
+    self.down_streak  = {host: 0 for host in pool.hostnames}
+
+    # counters of the polls and of the "pbsnodes" calls spent
+    self.n_polls      = 0
+    self.n_calls      = 0
+
+  #------------------------------------
+  def calls_for(self, n_hosts):
+    """
+    Return the number of "pbsnodes" calls which the nodes instance needs for
+    "n_hosts" hosts, given its bulk mode and batch size
+    """
+    if n_hosts == 0: return 0
+    if not self.pool.bulk: return n_hosts
+    if not self.pool.batch_size: return 1
+    return -(-n_hosts // self.pool.batch_size)
+
+  #------------------------------------
+  def hosts_for(self, n_calls):
+    """
+    Return the number of hosts which "n_calls" calls can cover
+    """
+    if not self.pool.bulk: return n_calls
+    if not self.pool.batch_size: return len(self.next_poll) if n_calls >= 1 else 0
+    return n_calls * self.pool.batch_size
+
+  #------------------------------------
+  def due(self, now=None):
+    """
+    Return the hosts which are due, the most overdue (relative to their
+    interval) first
+    """
+    now = self.clock() if now is None else now
+    hosts = [host for host, when in self.next_poll.items() if when <= now]
+    hosts.sort(key=lambda host: (self.next_poll[host] - now) / max(self.interval[host], 1.0))
+    return hosts
+
+  #------------------------------------
+  def next_due(self):
+    """
+    Return the earliest time at which a host is due
+    """
+    return min(self.next_poll.values(), default=float('inf'))
+
+  #------------------------------------
+  def get_interval(self, host, failed=False):
+    """
+    Compute the next polling interval of a host from its state, change rate
+    and collection latency
+    """
+    obj   = self.pool.get_node(host)
+    state = (obj.state or '') if obj is not None else ''
+    if failed or obj is None or 'down' in state:
+      self.down_streak[host] += 1
+      base = base_intervals['down'] * 2 ** (self.down_streak[host] - 1)
+    else:
+      self.down_streak[host] = 0
+      if 'offline' in state:
+        base = base_intervals['offline']
+      elif obj.dedicated_cores > 0 or 'job' in state:
+        base = base_intervals['gpu_busy' if obj.gpus else 'cpu_busy']
+      else:
+        base = base_intervals['free']
+      base *= 1.0 - 0.75 * self.change_rate[host]
+    base += 10.0 * self.pool.latencies.get(host, 0.0)
+    return min(self.max_interval, max(self.min_interval, base))
+
+  #------------------------------------
+  def tick(self):
+    """
+    Refresh the due hosts which fit in the budget, update their intervals,
+    and return the snapshot_diff (None if nothing was polled)
+    """
+    self.sync_hosts()
+    now   = self.clock()
+    hosts = self.due(now)
+    if not hosts: return None
+    n_calls = min(int(self.limiter.available()), self.calls_for(len(hosts)))
+    if n_calls < 1: return None
+    hosts = hosts[:self.hosts_for(n_calls)]
+    if not self.limiter.take(self.calls_for(len(hosts))): return None   # taken by another scheduler
+
+    diff = self.pool.refresh(hosts)
+    self.n_polls += len(hosts)
+    self.n_calls += self.calls_for(len(hosts))
+
+    failed  = set(diff.failed)
+    changed = set(diff.hosts())
+    now     = self.clock()
+    for host in hosts:
+      rate = self.change_rate.get(host, 0.0)
+      self.change_rate[host] = (1 - self.alpha) * rate + self.alpha * (host in changed)
+      self.down_streak.setdefault(host, 0)
+      self.interval[host]  = self.get_interval(host, failed=host in failed)
+      self.next_poll[host] = now + self.interval[host]
+    return diff
+
+  #------------------------------------
+  def run(self, stop, on_diff=None, max_sleep=1.0):
+    """
+    Poll until the threading.Event "stop" is set; the diff of every tick which
+    polled hosts (i.e. of every new version, even without changes) is passed
+    to on_diff(diff). A tick which fails is logged, and the polling goes on
+    """
+    while not stop.is_set():
+      try:
+        diff = self.tick()
+        if diff is not None and on_diff is not None: on_diff(diff)
+      except Exception:
+        logger.exception('run: the tick failed; the last snapshot is kept')
+      wait = max(self.next_due() - self.clock(), self.limiter.wait_time(1))
+      stop.wait(min(max(wait, 0.01), max_sleep))
+
+  #------------------------------------
+  def add_hosts(self, hostnames):
+    """
+    Start polling "hostnames", e.g. after the host list of the cluster grows
+    """
+    now = self.clock()
+    for host in hostnames:
+      if host in self.next_poll: continue
+      self.next_poll[host]   = now
+      self.interval[host]    = 0.0
+      self.change_rate[host] = 0.0
+      self.down_streak[host] = 0
+
+  #------------------------------------
+  def sync_hosts(self):
+    """
+    Follow the host list of the nodes instance on every tick: discover it if
+    needed (e.g. with collect=False), start polling the hosts which joined,
+    and stop polling the hosts which left
+    """
+    self.pool.discover_hostnames()
+    known = self.pool.hostnames
+    if len(known) == len(self.next_poll) and all(host in self.next_poll for host in known): return
+    self.add_hosts(known)
+    for host in set(self.next_poll).difference(known):
+      for state in (self.next_poll, self.interval, self.change_rate, self.down_streak):
+        state.pop(host, None)
+
+  #------------------------------------
@@ -0,0 +1,175 @@
+"""
+Name:    def_serial
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   record = encode_node(obj);  obj = decode_node(record)
+         save_snapshot(pool, 'genius.snap');  meta, objs = load_snapshot('genius.snap')
+Return:
+Purpose: To turn node objects into compact, positional records (lists of the
+         parsed values) and back, e.g. to ship a snapshot to other processes
+         or to save it to disk
+Remarks: + The order of the values follows node_attrs, cpu_attrs and gpu_attrs,
+           which are derived from the field tables of def_parser; the raw
+           texts (pbsnodes, status, gpu_status) are not part of a record
+         + A record is [hostname, <node values>, [<cpu values>], [[<gpu values>], ...]]
+         + The int and float values are stored in their "_" attributes, so
+           decoding does not call the property setters; the attributes are
+           assigned in the order of the layout (see compile_unpack)
+         + A saved snapshot is a short magic line, followed by the encoded
+           snapshot as gzipped JSON (no pickle, so loading a file can not run
+           code); it is written to a temporary file first, and then renamed,
+           so a reader never sees a half-written file
+         + A saved snapshot also keeps the derived rates (see def_rates) of
+           every host, so that a warm start shows them before the first sweep
+"""
+import sys
+import logging
+import os
+import json
+import gzip
+import zlib
+
+from def_node import node
+from def_gpu import gpu
+from def_parser import node_fields, cpu_fields, gpu_fields
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the attributes in a record, in their order
+node_attrs = tuple(attr for attr, conv in node_fields.values() if attr not in ('status', 'gpu_status'))
+cpu_attrs  = tuple(attr for attr, conv in cpu_fields.values())
+gpu_attrs  = ('index',) + tuple(attr for attr, conv in gpu_fields.values())
+
+# the layout of a record, which is sent along with the records
+layout = {'node': list(node_attrs), 'cpu': list(cpu_attrs), 'gpu': list(gpu_attrs)}
+
+# the derived rate attributes, which a saved snapshot keeps as well
+cpu_rates = ('_netload_rate',)
+gpu_rates = ('_gpu_single_bit_ecc_rate', '_gpu_double_bit_ecc_rate')
+
+# the first bytes of a saved snapshot file
+magic = b'cluster_watch snapshot 2\n'
+
+#--------------------------------------
+def compile_unpack(attrs):
+  """
+  Turn the tuple "attrs" into a function unpack(obj, values), which assigns
+  the values to the attributes of "obj" in their order
+  """
+  def unpack(obj, values):
+    for attr, val in zip(attrs, values): setattr(obj, attr, val)
+  return unpack
+
+unpack_node = compile_unpack(node_attrs)
+unpack_cpu  = compile_unpack(cpu_attrs)
+unpack_gpu  = compile_unpack(gpu_attrs)
+
+#--------------------------------------
+def encode_node(obj):
+  """
+  Return the positional record of one node object
+  """
+  cpu = obj.cpu
+  return [obj.hostname,
+          [getattr(obj, attr) for attr in node_attrs],
+          [getattr(cpu, attr) for attr in cpu_attrs],
+          [[getattr(dev, attr) for attr in gpu_attrs] for dev in obj.gpu_list]]
+
+#--------------------------------------
+def decode_node(record):
+  """
+  Return a node object from its positional record
+  """
+  hostname, values, cpu_values, gpu_values = record
+  obj = node(hostname, pbsnodes='', parse=False)
+  obj.pbsnodes = None
+  unpack_node(obj, values)
+  unpack_cpu(obj.cpu, cpu_values)
+  for dev_values in gpu_values:
+    dev = gpu()
+    unpack_gpu(dev, dev_values)
+    obj.gpu_list.append(dev)
+  return obj
+
+#--------------------------------------
+def encode_rates(obj):
+  """
+  Return the rates of one node object, as [[<cpu rates>], [[<gpu rates>], ...]]
+  """
+  return [[getattr(obj.cpu, attr) for attr in cpu_rates],
+          [[getattr(dev, attr) for attr in gpu_rates] for dev in obj.gpu_list]]
+
+#--------------------------------------
+def decode_rates(obj, rates):
+  """
+  Set the rates of one node object from encode_rates()
+  """
+  cpu_values, gpu_values = rates
+  for attr, val in zip(cpu_rates, cpu_values): setattr(obj.cpu, attr, val)
+  for dev, dev_values in zip(obj.gpu_list, gpu_values):
+    for attr, val in zip(gpu_rates, dev_values): setattr(dev, attr, val)
+
+#--------------------------------------
+def dump_node(obj):
+  """
+  Return the compact JSON text of the record of one node object
+  """
+  return json.dumps(encode_node(obj), separators=(',', ':'))
+
+#--------------------------------------
+def encode_snapshot(pool, stamp=None):
+  """
+  Return a dictionary with the records of all nodes of a nodes instance
+  """
+  return {'cluster': pool.cluster, 'version': pool.version, 'time': stamp,
+          'layout': layout, 'failed': pool.failed_hosts,
+          'hosts': [encode_node(obj) for obj in pool.list_hosts]}
+
+#--------------------------------------
+def decode_snapshot(data):
+  """
+  Return the list of node objects of an encoded snapshot
+  """
+  if data.get('layout', layout) != layout:
+    logger.warning('decode_snapshot: the record layout differs from this version')
+  return [decode_node(record) for record in data['hosts']]
+
+#--------------------------------------
+def save_snapshot(pool, path, stamp=None):
+  """
+  Save the snapshot of the nodes instance "pool" to the binary file "path"
+  """
+  data = encode_snapshot(pool, stamp)
+  data['rates'] = [encode_rates(obj) for obj in pool.list_hosts]
+  temp = f'{path}.{os.getpid()}.tmp'
+  with open(temp, 'wb') as f:
+    f.write(magic)
+    f.write(gzip.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), compresslevel=6))
+  os.replace(temp, path)
+
+#--------------------------------------
+def load_snapshot(path):
+  """
+  Return the encoded snapshot (without its records) and the list of node
+  objects, which are saved in the binary file "path"; or (None, None) if the
+  file is missing, or is not a snapshot of this version
+  """
+  try:
+    with open(path, 'rb') as f:
+      if f.read(len(magic)) != magic:
+        logger.warning(f'load_snapshot: {path} is not a snapshot of this version')
+        return None, None
+      data = json.loads(gzip.decompress(f.read()))
+  except (OSError, EOFError, zlib.error, ValueError) as err:
+    logger.info(f'load_snapshot: can not load {path}: {err}')
+    return None, None
+  if not isinstance(data, dict) or data.get('layout') != layout:
+    logger.warning(f'load_snapshot: the record layout of {path} differs from this version')
+    return None, None
+  objs = [decode_node(record) for record in data.pop('hosts')]
+  for obj, rates in zip(objs, data.pop('rates', ())): decode_rates(obj, rates)
+  return data, objs
+
+#--------------------------------------
@@ -0,0 +1,223 @@
+"""
+Name:    def_site
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   hpc = site(['genius', 'thinking', 'breniac'], budget=3.0, max_workers=8)
+         hpc.run(stop, on_diff=lambda cluster, diff: ...)   # until stop.is_set()
+         hpc.columnar().group('free_cores', by='cluster', how='sum')
+         hpc.aggregates()['site']['idle_gpus']
+Return:
+Purpose: To watch several clusters of a site from one process: the site owns
+         one nodes instance per cluster, and all of their "pbsnodes" calls run
+         on one shared worker pool, within one shared budget of calls per
+         second, so that every cluster is kept at the same freshness without
+         one process (and one sequential sweep) per cluster
+Remarks: + The "pbsnodes" calls of all clusters go to one ThreadPoolExecutor
+           (see the "executor" of the nodes class), so the number of
+           concurrent calls on the site is bounded by max_workers
+         + Every cluster has its own poll_scheduler (see def_scheduler), and
+           all schedulers take their calls from one rate_limiter, so the
+           budget is a site-wide one; run() polls the clusters in one thread
+           each, so a slow cluster does not hold the others back
+         + The first sweeps of all clusters run at the same time
+         + columnar() is one snapshot of all hosts of the site, with the
+           cluster as a categorical column, and aggregates() sums it up per
+           cluster and for the whole site; the rack, IRU and pool of the hosts
+           come from the combined inventories of the clusters (see def_inventory)
+"""
+import sys
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from def_nodes import nodes
+from def_scheduler import poll_scheduler, rate_limiter
+from def_inventory import combine
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+
+# C L A S S ###########################
+class site:
+  """
+  The nodes instances of several clusters, collected on one shared worker pool
+  """
+  #------------------------------------
+  def __init__(self, clusters, sources=None, hostnames=None, budget=2.0, burst=None,
+               max_workers=8, collect=True, **options):
+    """
+    "clusters" is a list of cluster names; "sources" and "hostnames" are
+    optional dictionaries of cluster -> data source and cluster -> list of
+    hostnames; the other options (e.g. bulk, batch_size, timeout, keep_raw)
+    are passed on to every nodes instance
+    """
+    if len(set(clusters)) != len(clusters):
+      logger.error(f'Error: site: a cluster is given more than once: {clusters}')
+      sys.exit(1)
+    sources   = sources or dict()
+    hostnames = hostnames or dict()
+
+    # one worker pool, and one budget of "pbsnodes" calls per second, for all clusters
+    self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pbsnodes')
+    self.limiter  = rate_limiter(budget, burst)
+
+    self.pools = {name: nodes(name, source=sources.get(name), hostnames=hostnames.get(name),
+                              max_workers=max_workers, collect=False, executor=self.executor,
+                              **options)
+                  for name in clusters}
+    self.inventory  = combine(pool.inventory for pool in self.pools.values())
+    self.schedulers = {name: poll_scheduler(pool, limiter=self.limiter)
+                       for name, pool in self.pools.items()}
+    if collect: self.gather()
+
+  #------------------------------------
+  def each(self, work):
+    """
+    Call work(name, pool) for all clusters at the same time, one thread per
+    cluster, and return a dictionary of cluster -> result; the exception of a
+    cluster is logged, and its result is None
+    """
+    results = dict()
+    def call(name, pool):
+      try:
+        results[name] = work(name, pool)
+      except Exception:
+        logger.exception(f'each: {name} failed; the other clusters go on')
+    threads = [threading.Thread(target=call, args=(name, pool), name=f'{name}-site', daemon=True)
+               for name, pool in self.pools.items()]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    return {name: results.get(name) for name in self.pools}
+
+  #------------------------------------
+  def gather(self):
+    """
+    Collect the first snapshot of all clusters
+    """
+    self.each(lambda name, pool: pool.gather_nodes())
+    self.inventory = combine(pool.inventory for pool in self.pools.values())
+
+  #------------------------------------
+  def refresh(self):
+    """
+    Refresh all hosts of all clusters (see nodes.refresh), and return a
+    dictionary of cluster -> snapshot_diff
+    """
+    return self.each(lambda name, pool: pool.refresh())
+
+  #------------------------------------
+  def tick(self):
+    """
+    Poll the due hosts of every cluster within the shared budget, and return a
+    dictionary of cluster -> snapshot_diff of the clusters which were polled;
+    the cluster which is due first is served first
+    """
+    order = sorted(self.schedulers, key=lambda name: self.schedulers[name].next_due())
+    diffs = dict()
+    for name in order:
+      diff = self.schedulers[name].tick()
+      if diff is not None: diffs[name] = diff
+    return diffs
+
+  #------------------------------------
+  def run(self, stop, on_diff=None, max_sleep=1.0):
+    """
+    Poll all clusters, each in its own thread, until the threading.Event "stop"
+    is set; the diff of every poll is passed to on_diff(cluster, diff). A cluster
+    whose polling fails is logged (see each), and the others go on
+    """
+    def work(name, pool):
+      handler = None if on_diff is None else (lambda diff: on_diff(name, diff))
+      self.schedulers[name].run(stop, on_diff=handler, max_sleep=max_sleep)
+    self.each(work)
+
+  #------------------------------------
+  def shutdown(self):
+    """
+    Stop the shared worker pool
+    """
+    self.executor.shutdown(wait=True)
+
+  #------------------------------------
+  @property
+  def list_hosts(self):
+    """
+    The node objects of all clusters, cluster by cluster
+    """
+    return [obj for pool in self.pools.values() for obj in pool.list_hosts]
+
+  #------------------------------------
+  def get_node(self, hostname, cluster=None):
+    """
+    Return the node object of "hostname" (in "cluster", if given), or None
+    """
+    for name, pool in self.pools.items():
+      if cluster is not None and name != cluster: continue
+      obj = pool.get_node(hostname)
+      if obj is not None: return obj
+    return None
+
+  #------------------------------------
+  def columnar(self):
+    """
+    Return one columnar (NumPy) snapshot of all hosts of the site (see
+    def_snapshot), with the cluster of every host in the "cluster" column
+    """
+    from def_snapshot import snapshot
+    hosts = {name: list(pool.list_hosts) for name, pool in self.pools.items()}
+    return snapshot(nodes_view('site', [obj for objs in hosts.values() for obj in objs], self.inventory),
+                    clusters=[name for name, objs in hosts.items() for obj in objs])
+
+  #------------------------------------
+  def aggregates(self):
+    """
+    Return a dictionary of cluster -> summary, and 'site' -> the summary of all
+    clusters: the number of hosts, failed hosts, down hosts, total and free
+    cores, GPUs, idle GPUs, the mean load per core, the mean GPU utilization,
+    and the age of the snapshot (the oldest one, for the site)
+    """
+    snap    = self.columnar()
+    down    = snap.where(state='down')
+    masks   = {name: snap.where(cluster=name) for name in self.pools}
+    masks['site'] = snap.where()
+    summary = dict()
+    for name, mask in masks.items():
+      n_hosts = int(mask.sum())
+      cores   = int(snap.sum('total_cores', mask)) if n_hosts else 0
+      util    = snap.mean('gpu_utilization', mask)
+      summary[name] = {
+        'hosts':           n_hosts,
+        'down_hosts':      int((down & mask).sum()),
+        'total_cores':     cores,
+        'free_cores':      int(snap.sum('free_cores', mask)) if n_hosts else 0,
+        'load_per_core':   snap.sum('loadave', mask) / cores if cores else None,
+        'gpus':            snap.gpu_count('gpu_utilization', mask=mask),
+        'idle_gpus':       snap.gpu_count('gpu_utilization', below=5, mask=mask),
+        'gpu_utilization': None if util != util else util,   # NaN without GPUs
+      }
+    ages = dict()
+    for name, pool in self.pools.items():
+      summary[name]['failed_hosts'] = len(pool.failed_hosts)
+      summary[name]['version']      = pool.version
+      ages[name] = summary[name]['age'] = pool.get_age()
+    summary['site']['failed_hosts'] = sum(len(pool.failed_hosts) for pool in self.pools.values())
+    known = [age for age in ages.values() if age is not None]
+    summary['site']['age'] = max(known) if known else None
+    return summary
+
+  #------------------------------------
+
+# C L A S S ###########################
+class nodes_view:
+  """
+  The minimal nodes-like object (a name, a list of node objects and an
+  optional inventory) from which a snapshot is built
+  """
+  def __init__(self, cluster, list_hosts, inventory=None):
+    self.cluster    = cluster
+    self.list_hosts = list_hosts
+    self.inventory  = inventory
+
+#--------------------------------------
@@ -0,0 +1,234 @@
+"""
+Name:    def_snapshot
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   snap = snapshot(pool)      # pool is an instance of the nodes class
+         snap.mean('loadave', snap.where(state='free', rack='r22'))
+         snap.group('dedicated_cores', by='rack', how='sum')
+         snap.gpu_count('gpu_utilization', above=90)
+Return:
+Purpose: To define the snapshot class, i.e. a columnar (NumPy) view of all
+         nodes of a cluster, so that cluster-wide questions are answered by
+         vectorized reductions and filters instead of per-object loops
+Remarks: + The host columns are 1-D arrays with one entry per node, in the
+           order of pool.list_hosts
+         + The GPU columns are 2-D host x device arrays, with one column per
+           device index (gpu.index); the devices which a node does not have
+           are NaN, so they drop out of the nan-reductions
+         + The string columns (state, properties, rack, iru, pool, cluster)
+           are stored as integer codes into a sorted list of categories, so a
+           filter is decided once per category, and not once per node
+         + The derived rate metrics (see def_rates) are NaN while unknown
+         + The object is built once per nodes snapshot, and is read-only
+"""
+import sys
+import logging
+
+import numpy as np
+
+from def_inventory import get_parts
+from def_gpu import count_slots
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+def nan_if_none(val):
+  return np.nan if val is None else val
+
+# the numeric host columns: name -> (dtype, getter of the value from a node)
+host_columns = {
+  'np':                (np.int32,   lambda n: n._np),
+  'gpus':              (np.int32,   lambda n: n._gpus),
+  'total_cores':       (np.int32,   lambda n: n._total_cores),
+  'dedicated_cores':   (np.int32,   lambda n: n._dedicated_cores),
+  'total_threads':     (np.int32,   lambda n: n._total_threads),
+  'dedicated_threads': (np.int32,   lambda n: n._dedicated_threads),
+  'loadave':           (np.float64, lambda n: n.cpu._loadave),
+  'nsessions':         (np.int32,   lambda n: n.cpu._nsessions),
+  'netload_rate':      (np.float64, lambda n: nan_if_none(n.cpu._netload_rate)),
+  'report_age':        (np.float64, lambda n: nan_if_none(n.cpu.report_age)),
+}
+
+# the numeric GPU columns: name -> getter of the value from a gpu object
+gpu_columns = {
+  'gpu_utilization':        lambda g: g._gpu_utilization,
+  'gpu_memory_utilization': lambda g: g._gpu_memory_utilization,
+  'gpu_memory_used':        lambda g: g._gpu_memory_used,
+  'gpu_memory_total':       lambda g: g._gpu_memory_total,
+  'gpu_temperature':        lambda g: g._gpu_temperature,
+  'gpu_single_bit_ecc_errors': lambda g: g._gpu_single_bit_ecc_errors,
+  'gpu_double_bit_ecc_errors': lambda g: g._gpu_double_bit_ecc_errors,
+  'gpu_single_bit_ecc_rate':   lambda g: nan_if_none(g._gpu_single_bit_ecc_rate),
+  'gpu_double_bit_ecc_rate':   lambda g: nan_if_none(g._gpu_double_bit_ecc_rate),
+}
+
+# the categorical host columns, which are stored as codes
+category_columns = ('state', 'properties', 'rack', 'iru', 'pool', 'cluster')
+
+#--------------------------------------
+def encode(values):
+  """
+  Return the sorted list of the distinct values, and an array with the index
+  of each value into that list
+  """
+  categories, codes = np.unique(np.array(values, dtype=object).astype(str), return_inverse=True)
+  return list(categories), codes.astype(np.int32)
+
+# C L A S S ###########################
+class snapshot:
+  """
+  A columnar view of a nodes instance
+  """
+  #------------------------------------
+  def __init__(self, pool, clusters=None):
+    hosts = pool.list_hosts
+    self.cluster   = pool.cluster
+    self.hostnames = np.array([n.hostname for n in hosts], dtype=object)
+    self.n_hosts   = len(hosts)
+
+    # numeric host columns
+    self.columns = dict()
+    for name, (dtype, getter) in host_columns.items():
+      self.columns[name] = np.fromiter(map(getter, hosts), dtype=dtype, count=self.n_hosts)
+    self.columns['free_cores'] = self.columns['total_cores'] - self.columns['dedicated_cores']
+
+    # categorical host columns
+    # the rack, IRU and pool of the hosts are looked up in the inventory of the pool
+    parts  = get_parts(pool)
+    groups = [parts(n.hostname) for n in hosts]
+    raw    = {'state':      [n.state or '' for n in hosts],
+              'properties': [n.properties or '' for n in hosts],
+              'rack':       [g[0] for g in groups],
+              'iru':        [g[1] for g in groups],
+              'pool':       [g[2] for g in groups],
+              'cluster':    [pool.cluster] * len(hosts) if clusters is None else clusters}
+    self.categories = dict()
+    self.codes      = dict()
+    for name in category_columns:
+      self.categories[name], self.codes[name] = encode(raw[name])
+
+    # GPU host x device columns
+    self.n_devices = max((count_slots(n.gpu_list) for n in hosts), default=0)
+    shape = (self.n_hosts, self.n_devices)
+    self.gpu = {name: np.full(shape, np.nan) for name in gpu_columns}
+    for row, n in enumerate(hosts):
+      for device in n.gpu_list:
+        for name, getter in gpu_columns.items():
+          self.gpu[name][row, device.index] = getter(device)
+
+  #------------------------------------
+  def get(self, name):
+    """
+    Return the host column (1-D) or the GPU column (2-D) called "name"
+    """
+    if name in self.columns: return self.columns[name]
+    if name in self.gpu: return self.gpu[name]
+    if name in self.codes:
+      return np.array(self.categories[name], dtype=object)[self.codes[name]]
+    logger.warning(f'get: snapshot does not have this column: {name}')
+    return None
+
+  #------------------------------------
+  def match(self, name, value, token=False):
+    """
+    Return a boolean host mask where the categorical column "name" equals
+    "value". With token=True, a comma-separated entry matches if "value" is
+    one of its items, e.g. the state 'down,offline' matches 'down', and the
+    properties 'skylake,gpu,p100' match 'gpu'
+    """
+    if token:
+      hits = [k for k, cat in enumerate(self.categories[name]) if value in cat.split(',')]
+    else:
+      hits = [k for k, cat in enumerate(self.categories[name]) if cat == value]
+    return np.isin(self.codes[name], hits)
+
+  #------------------------------------
+  def where(self, state=None, prop=None, rack=None, iru=None, pool=None, cluster=None):
+    """
+    Return a boolean host mask of the nodes which satisfy all given filters;
+    "state" and "prop" match one item of the node state and properties
+    """
+    mask = np.ones(self.n_hosts, dtype=bool)
+    if state is not None: mask &= self.match('state', state, token=True)
+    if prop  is not None: mask &= self.match('properties', prop, token=True)
+    if rack  is not None: mask &= self.match('rack', rack)
+    if iru   is not None: mask &= self.match('iru', iru)
+    if pool  is not None: mask &= self.match('pool', pool)
+    if cluster is not None: mask &= self.match('cluster', cluster)
+    return mask
+
+  #------------------------------------
+  def reduce(self, name, how='mean', mask=None):
+    """
+    Reduce the host or GPU column "name" over the (masked) hosts; "how" is one
+    of mean, sum, min, max, std or count. GPU columns reduce over all devices
+    """
+    values = self.get(name)
+    if values is None: return None
+    if mask is not None: values = values[mask]
+    if how == 'count':
+      return int(np.count_nonzero(~np.isnan(values))) if values.dtype.kind == 'f' else values.shape[0]
+    if values.size == 0 or (values.dtype.kind == 'f' and np.isnan(values).all()): return np.nan
+    func = {'mean': np.nanmean, 'sum': np.nansum, 'min': np.nanmin,
+            'max': np.nanmax, 'std': np.nanstd}[how]
+    return func(values).item()
+
+  def mean(self, name, mask=None): return self.reduce(name, 'mean', mask)
+  def sum(self, name, mask=None):  return self.reduce(name, 'sum', mask)
+
+  #------------------------------------
+  def group(self, name, by='rack', how='mean', mask=None):
+    """
+    Reduce the host column "name" per group of the categorical column "by"
+    (rack, iru, pool, cluster, state or properties), and return a dictionary of
+    group -> value. Only the groups with at least one (masked) host appear
+    """
+    values = self.columns[name].astype(np.float64)
+    codes  = self.codes[by]
+    if mask is not None: values, codes = values[mask], codes[mask]
+    n_cat  = len(self.categories[by])
+    counts = np.bincount(codes, minlength=n_cat)
+    if how in ('sum', 'mean'):
+      result = np.bincount(codes, weights=values, minlength=n_cat)
+      if how == 'mean': result = result / np.maximum(counts, 1)
+    elif how in ('min', 'max'):
+      fill   = np.inf if how == 'min' else -np.inf
+      result = np.full(n_cat, fill)
+      (np.minimum if how == 'min' else np.maximum).at(result, codes, values)
+    elif how == 'count':
+      result = counts
+    else:
+      logger.warning(f'group: unknown reduction: {how}')
+      return None
+    return {self.categories[by][k]: result[k].item() for k in np.flatnonzero(counts)}
+
+  #------------------------------------
+  def gpu_mask(self, name, above=None, below=None, mask=None):
+    """
+    Return a boolean host x device mask of the GPUs whose column "name" is
+    above (or below) the given value, on the (masked) hosts
+    """
+    values = self.gpu[name]
+    found  = ~np.isnan(values)
+    if above is not None: found &= values > above
+    if below is not None: found &= values < below
+    if mask is not None: found &= mask[:, None]
+    return found
+
+  #------------------------------------
+  def gpu_count(self, name, above=None, below=None, mask=None):
+    """
+    Count the GPUs whose column "name" is above (or below) the given value
+    """
+    return int(np.count_nonzero(self.gpu_mask(name, above, below, mask)))
+
+  #------------------------------------
+  def gpu_hosts(self, name, above=None, below=None, mask=None):
+    """
+    Return the hostnames which carry at least one GPU whose column "name" is
+    above (or below) the given value
+    """
+    return list(self.hostnames[self.gpu_mask(name, above, below, mask).any(axis=1)])
+
+  #------------------------------------
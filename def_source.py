@@ -0,0 +1,377 @@
+"""
+Name:    def_source
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:
+Return:
+Purpose: To define the data sources which deliver the "pbsnodes" text of the
+         nodes, so that the node and nodes classes do not depend on a live
+         Torque server
+Remarks: + Every source has a fetch(hostnames, timeout) method which returns
+           the combined text of "pbsnodes <host_1> ... <host_N>"
+         + live_source calls the real "pbsnodes" command in a subprocess
+         + replay_source serves the text from captured "pbsnodes" output
+           files; each file is one frame (i.e. one sweep of the cluster)
+         + synthetic_source generates realistic CPU and 4-GPU node records
+           for an arbitrary number of hosts, reproducibly from a seed
+         + Both replay_source and synthetic_source have an advance() method
+           which moves them to the next frame / time step; the periodic loops
+           call it through nodes.next_sweep(), and the live source ignores it
+"""
+import sys, os
+import abc
+import logging
+import random
+import re
+import subprocess
+import time
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# the Torque command which is called to query the node(s)
+pbsnodes_cmnd = 'pbsnodes'
+
+#--------------------------------------
+def call_pbsnodes_bulk(hostnames=None, timeout=None, command=None, profile=None):
+  """
+  Let a single subprocess call "pbsnodes <host_1> <host_2> ... <host_N>" and
+  return the combined STDOUT as one string. If "hostnames" is None or empty,
+  then "pbsnodes -a" is called which returns all nodes known to pbs_server.
+  If the call does not return within "timeout" seconds, the subprocess is
+  killed and subprocess.TimeoutExpired is raised. With "profile" (see
+  def_profile), the spawn of the subprocess and the wait for its output are
+  timed as two stages
+  """
+  cmnd = [command or pbsnodes_cmnd] + (list(hostnames) if hostnames else ['-a'])
+  t0   = time.perf_counter()
+  with subprocess.Popen(cmnd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True, encoding='utf-8') as proc:
+    t1 = time.perf_counter()
+    try:
+      stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+      proc.wait()   # not communicate(): a child of the command may still hold the pipes
+      raise
+  if profile is not None:
+    profile.add('spawn', t1 - t0)
+    profile.add('wait', time.perf_counter() - t1)
+  if stderr: logger.warning(f'call_pbsnodes_bulk: {stderr.strip()}')
+  return stdout
+
+#--------------------------------------
+def call_pbsnodes_list(timeout=None, command=None):
+  """
+  Let a single subprocess call "pbsnodes -l all", and return the list of all
+  hostnames which pbs_server knows about (the first word of every line). The
+  errors are raised as by call_pbsnodes_bulk
+  """
+  cmnd = [command or pbsnodes_cmnd, '-l', 'all']
+  with subprocess.Popen(cmnd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True, encoding='utf-8') as proc:
+    try:
+      stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+      proc.wait()
+      raise
+  if stderr: logger.warning(f'call_pbsnodes_list: {stderr.strip()}')
+  return [line.split()[0] for line in stdout.splitlines() if line.strip()]
+
+#--------------------------------------
+def split_pbsnodes(pbsnodes):
+  """
+  Split the combined STDOUT of a (bulk) "pbsnodes" call into a dictionary with
+  the hostnames as keys and the per-host text blocks as values. Each block
+  starts with the hostname line, exactly like the output of "pbsnodes <hostname>",
+  so that it can be passed on to the node class
+  """
+  records = dict()
+  for block in pbsnodes.split('\n\n'):
+    block = block.strip('\n')
+    if not block: continue
+    hostname = block.split('\n', 1)[0].strip()
+    records[hostname] = block + '\n'
+  return records
+
+#--------------------------------------
+def is_gpu_host(hostname):
+  """
+  Return True if the hostname is that of a GPU node, e.g. r23g35 (as opposed
+  to a CPU node, e.g. r22i13n01)
+  """
+  return re.match(r'r\d+g\d+$', hostname) is not None
+
+#--------------------------------------
+# rack-based hostnames: r<rack>i<iru>n<node> for CPU nodes, r<rack>g<node> for GPU nodes
+hostname_pattern = re.compile(r'(r\d+)(?:(i\d+)n\d+|(g)\d+)$')
+
+def parse_hostname(hostname):
+  """
+  Return the tuple (rack, iru, pool) which a hostname encodes, e.g.
+  r22i13n01 -> ('r22', 'r22i13', 'cpu') and r23g35 -> ('r23', '', 'gpu').
+  Hostnames which do not follow the rack naming give ('', '', 'other')
+  """
+  match = hostname_pattern.match(hostname)
+  if match is None: return ('', '', 'other')
+  rack, iru, gpu_node = match.groups()
+  if gpu_node: return (rack, '', 'gpu')
+  return (rack, rack + iru, 'cpu')
+
+# C L A S S ###########################
+class data_source(abc.ABC):
+  """
+  The parent class of all sources of "pbsnodes" text; a subclass must define
+  fetch(), else it can not be instantiated
+  """
+  #------------------------------------
+  @abc.abstractmethod
+  def fetch(self, hostnames, timeout=None):
+    """
+    Return the combined "pbsnodes" text of the requested hostnames
+    """
+
+  #------------------------------------
+  def list_hostnames(self):
+    """
+    Return the hostnames which this source knows about, or an empty list
+    if the source can not tell without a query
+    """
+    return []
+
+  #------------------------------------
+  def advance(self):
+    """
+    Move on to the next frame / time step; a live source is always up to date
+    """
+    return None
+
+# C L A S S ###########################
+class live_source(data_source):
+  """
+  Calls the "pbsnodes" command of a live Torque server
+  """
+  #------------------------------------
+  def __init__(self, command=None):
+    self.command = command
+    # the instruments (see def_profile) which time the spawn and the wait of the calls
+    self.profile = None
+
+  #------------------------------------
+  def fetch(self, hostnames, timeout=None):
+    return call_pbsnodes_bulk(hostnames, timeout=timeout, command=self.command, profile=self.profile)
+
+# C L A S S ###########################
+class replay_source(data_source):
+  """
+  Replays captured "pbsnodes" output; "paths" is a file, a directory (whose
+  files are sorted by name), or a list of files. Each file is one frame
+  """
+  #------------------------------------
+  def __init__(self, paths):
+    if isinstance(paths, str) and os.path.isdir(paths):
+      paths = [os.path.join(paths, name) for name in sorted(os.listdir(paths))]
+    elif isinstance(paths, str):
+      paths = [paths]
+    self.paths  = list(paths)
+    self.frame  = 0
+    self.frames = list()
+    for path in self.paths:
+      with open(path, 'r') as r: self.frames.append( split_pbsnodes(r.read()) )
+    if not self.frames:
+      logger.warning('replay_source: no captured pbsnodes files are given')
+      self.frames.append(dict())
+
+  #------------------------------------
+  def fetch(self, hostnames, timeout=None):
+    records = self.frames[self.frame]
+    if not hostnames: return '\n'.join(records.values())
+    return '\n'.join(records[host] for host in hostnames if host in records)
+
+  #------------------------------------
+  def list_hostnames(self):
+    return list(self.frames[self.frame].keys())
+
+  #------------------------------------
+  def advance(self):
+    """
+    Move to the next captured frame; the last frame is kept once it is reached
+    """
+    self.frame = min(self.frame + 1, len(self.frames) - 1)
+
+# C L A S S ###########################
+class synthetic_source(data_source):
+  """
+  Generates "pbsnodes" records of a fictitious cluster. Without explicit
+  hostnames, "n_cpu" CPU nodes (e.g. r01i01n01, 24 nodes per IRU, 4 IRUs per
+  rack) and "n_gpu" 4-GPU nodes (e.g. r01g01, 8 nodes per rack) are made up.
+  On every call to advance(), a fraction "churn" of the nodes sends a new
+  MOM report (fresh rectime, load and GPU readings), and some of those also
+  change their state or jobs
+  """
+  #------------------------------------
+  def __init__(self, hostnames=None, n_cpu=10000, n_gpu=400, churn=0.05, seed=0):
+    self.rng      = random.Random(seed)
+    self.churn    = churn
+    self.rectime  = 1535620153
+    self.next_job = 50000000
+    if hostnames is None:
+      cpu_hosts = [f'r{1 + k // 96:02d}i{1 + (k // 24) % 4:02d}n{1 + k % 24:02d}' for k in range(n_cpu)]
+      n_racks   = 1 + (n_cpu - 1) // 96 if n_cpu else 0
+      gpu_hosts = [f'r{n_racks + 1 + k // 8:02d}g{1 + k % 8:02d}' for k in range(n_gpu)]
+      hostnames = gpu_hosts + cpu_hosts
+    self.hostnames = list(hostnames)
+
+    # per-host state of the generator, and the cache of the rendered records
+    self.hosts   = dict()
+    self.records = dict()
+    for host in self.hostnames: self.hosts[host] = self.new_host(host)
+
+  #------------------------------------
+  def new_job(self):
+    self.next_job += 1
+    return f'{self.next_job}.tier2-p-moab-2.icts.hpc.kuleuven.be'
+
+  #------------------------------------
+  def new_host(self, host):
+    """
+    Draw the initial state of one host
+    """
+    rng = self.rng
+    np  = 36
+    ndev= 4 if is_gpu_host(host) else 0
+    this = dict(np=np, ndev=ndev, netload=rng.randrange(10**9, 10**13), ecc=[0] * ndev)
+    self.draw_jobs(this)
+    this['rectime'] = self.rectime - rng.randrange(45)
+    return this
+
+  #------------------------------------
+  def draw_jobs(self, this):
+    """
+    Draw the node state, the jobs running on it, and the matching readings
+    """
+    rng = self.rng
+    np  = this['np']
+    u   = rng.random()
+    if u < 0.03:
+      state, cores = 'down', 0
+    elif u < 0.05:
+      state, cores = 'offline', 0
+    elif u < 0.35:
+      state, cores = 'free', 0
+    elif u < 0.50:
+      state, cores = 'free', rng.randrange(1, np)
+    else:
+      state, cores = 'job-exclusive', np
+
+    jobs, first = list(), 0
+    while first < cores:
+      width = cores - first if rng.random() < 0.6 else rng.randrange(1, cores - first + 1)
+      jobs.append((first, first + width - 1, self.new_job()))
+      first += width
+    this['state'] = state
+    this['jobs']  = jobs
+    n_alloc = this['ndev'] if state == 'job-exclusive' else min(len(jobs), this['ndev'])
+    this['alloc'] = [k < n_alloc for k in range(this['ndev'])]
+    self.draw_readings(this)
+
+  #------------------------------------
+  def draw_readings(self, this):
+    """
+    Draw the instantaneous MOM readings: load, network counter and GPU sensors
+    """
+    rng   = self.rng
+    cores = sum(last - first + 1 for first, last, job in this['jobs'])
+    this['loadave']  = round(max(0.0, rng.gauss(cores, 0.5)) if cores else rng.random() * 0.1, 2)
+    this['netload'] += rng.randrange(10**6, 10**9) if cores else rng.randrange(10**5)
+    this['rectime']  = self.rectime
+    this['util']     = [rng.randrange(60, 101) if alloc else 0 for alloc in this['alloc']]
+    this['mem']      = [rng.randrange(2000, 16000) if alloc else 0 for alloc in this['alloc']]
+    this['temp']     = [30 + util // 3 + rng.randrange(5) for util in this['util']]
+    this['ecc']      = [ecc + (rng.random() < 0.001) for ecc in this['ecc']]
+
+  #------------------------------------
+  def render(self, host):
+    """
+    Return the "pbsnodes <host>" text of one host
+    """
+    this  = self.hosts[host]
+    lines = [host,
+             f'     state = {this["state"]}',
+             f'     power_state = Running',
+             f'     np = {this["np"]}',
+             f'     properties = {"skylake,gpu,p100" if this["ndev"] else "skylake,batch"}',
+             f'     ntype = cluster']
+    jobs  = this['jobs']
+    if jobs:
+      lines.append('     jobs = ' + ','.join(f'{first}-{last}/{job}' if last > first else f'{first}/{job}'
+                                             for first, last, job in jobs))
+    if this['state'] != 'down':
+      ids      = ' '.join(job for first, last, job in jobs)
+      sessions = ' '.join(str(10000 + 7 * k) for k in range(len(jobs))) if jobs else '? 0'
+      nsess    = len(jobs) if jobs else '? 0'
+      lines.append(f'     status = opsys=linux,uname=Linux {host} 3.10.0-862.11.6.el7.x86_64 #1 SMP '
+                   f'Tue Aug 14 21:49:04 UTC 2018 x86_64,sessions={sessions},nsessions={nsess},'
+                   f'nusers={min(len(jobs), 1)},idletime=1302,totmem=201004132kb,availmem=180213412kb,'
+                   f'physmem=196608000kb,ncpus={this["np"]},loadave={this["loadave"]:.2f},gres=,'
+                   f'netload={this["netload"]},state=free,varattr= ,puppethpccode=0,sudo=,'
+                   f'cpuclock=Fixed,macaddr=7c:d3:0a:c6:21:4e,version=6.1.2,rectime={this["rectime"]}'
+                   + (f',jobs={ids}' if jobs else ''))
+    lines += ['     mom_service_port = 15002',
+              '     mom_manager_port = 15003']
+    if this['ndev']:
+      lines.append(f'     gpus = {this["ndev"]}')
+      if this['state'] != 'down':
+        devices = list()
+        for k in reversed(range(this['ndev'])):
+          pci = f'00000000:{(0x18, 0x3B, 0x86, 0xAF)[k % 4] + 0x100 * (k // 4):02X}:00.0'
+          devices.append(f'gpu[{k}]=gpu_id={pci};gpu_pci_device_id=351342814;gpu_pci_location_id={pci};'
+                         f'gpu_product_name=Tesla P100-SXM2-16GB;gpu_memory_total=16276 MB;'
+                         f'gpu_memory_used={this["mem"][k]} MB;gpu_mode=Exclusive_Process;'
+                         f'gpu_state={"Exclusive" if this["alloc"][k] else "Unallocated"};'
+                         f'gpu_utilization={this["util"][k]}%;gpu_memory_utilization={this["util"][k] // 2}%;'
+                         f'gpu_ecc_mode=Enabled;gpu_single_bit_ecc_errors=0;'
+                         f'gpu_double_bit_ecc_errors={this["ecc"][k]};gpu_temperature={this["temp"][k]} C')
+        lines.append('     gpu_status = ' + ','.join(devices) +
+                     ',driver_ver=396.37,timestamp=Thu Aug 30 11:09:13 2018')
+    cores = sum(last - first + 1 for first, last, job in jobs)
+    lines += ['     total_sockets = 2',
+              '     total_numa_nodes = 2',
+              f'     total_cores = {this["np"]}',
+              f'     total_threads = {this["np"]}',
+              f'     dedicated_sockets = {2 if cores == this["np"] else 0}',
+              f'     dedicated_numa_nodes = {2 if cores == this["np"] else 0}',
+              f'     dedicated_cores = {cores}',
+              f'     dedicated_threads = {cores}']
+    return '\n'.join(lines) + '\n'
+
+  #------------------------------------
+  def fetch(self, hostnames, timeout=None):
+    if not hostnames: hostnames = self.hostnames
+    records = self.records
+    for host in hostnames:
+      if host in records or host not in self.hosts: continue
+      records[host] = self.render(host)
+    return '\n'.join(records[host] for host in hostnames if host in records)
+
+  #------------------------------------
+  def list_hostnames(self):
+    return list(self.hostnames)
+
+  #------------------------------------
+  def advance(self, seconds=60):
+    """
+    Move the fictitious cluster "seconds" ahead in time
+    """
+    rng = self.rng
+    self.rectime += seconds
+    n_report = int(round(self.churn * len(self.hostnames)))
+    for host in rng.sample(self.hostnames, n_report):
+      this = self.hosts[host]
+      if rng.random() < 0.2: self.draw_jobs(this)
+      else: self.draw_readings(this)
+      self.records.pop(host, None)
+
+  #------------------------------------
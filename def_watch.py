@@ -0,0 +1,297 @@
+"""
+Name:    def_watch
+By:      Ehsan Moravveji
+Date:    18 October 2026
+Usage:   watch(pool, interval=1.0)                 # a live table in the terminal
+         stream(pool, interval=1.0, out=sys.stdout) # the changes, as JSON lines
+Return:
+Purpose: To follow a cluster from a plain terminal (e.g. over SSH on a login
+         node): a table of the nodes and their GPUs which is updated in
+         place, and a machine-readable stream of the node and GPU records
+         which changed, both cheap enough for a refresh every second
+Remarks: + The table is a grid of fixed-width cells; every frame only writes
+           the cells whose text changed, each after an ANSI cursor move, so
+           an unchanged cluster costs a few bytes per frame
+         + The cells of a row are formatted again only when the node object
+           of its host was replaced (by nodes.refresh), and compared with the
+           cells on the screen
+         + The stream starts with one record per node and per GPU device;
+           after that, every refresh only writes the node records of the
+           hosts which changed, and the GPU records of the devices which
+           changed (also a gpu_state which flipped, and every device of a
+           host whose devices changed), with the version of the
+           snapshot. A host or a device which left gives a record of type
+           "removed"
+"""
+import sys
+import logging
+import json
+import shutil
+import time
+
+from def_diff import node_deltas, cpu_deltas, gpu_deltas, node_texts, gpu_texts
+from def_parser import parse_jobs
+from def_gpu import count_slots, find_device
+
+#--------------------------------------
+# logger to capture exceptions
+logger = logging.getLogger(__name__)
+#--------------------------------------
+# ANSI escape sequences
+clear_screen = '\x1b[2J\x1b[H'
+hide_cursor  = '\x1b[?25l'
+show_cursor  = '\x1b[?25h'
+
+# the node columns of the table: (title, width, text of a node object)
+node_columns = (
+  ('host',  11, lambda n: n.hostname),
+  ('state', 14, lambda n: n.state or '?'),
+  ('load',   6, lambda n: f'{n.cpu.loadave:.1f}'),
+  ('cores',  7, lambda n: f'{n.dedicated_cores}/{n.total_cores or n.np}'),
+  ('jobs',   4, lambda n: str(len(parse_jobs(n.jobs)))),
+)
+gpu_width = 9   # e.g. ' 97% 71C'
+
+# the fields of the streamed records
+node_fields = ('state', 'jobs') + node_texts + node_deltas + cpu_deltas
+gpu_fields  = gpu_texts + gpu_deltas
+
+#--------------------------------------
+def move(line, column):
+  """
+  Return the ANSI sequence which puts the cursor at (line, column), from 1
+  """
+  return f'\x1b[{line};{column}H'
+
+# C L A S S ###########################
+class text_table:
+  """
+  The terminal table of a nodes instance, rendered differentially
+  """
+  #------------------------------------
+  def __init__(self, pool, hostnames=None, n_devices=None, max_rows=None):
+    self.pool      = pool
+    # the hosts on the screen: the GPU hosts by default (else all hosts)
+    self.hostnames = hostnames
+    self.n_devices = n_devices
+    self.max_rows  = max_rows
+    # line -> (node object, tuple of the cell texts) which is on the screen
+    self.drawn     = dict()
+    self.status    = None
+    self.n_frames  = 0
+    self.n_cells   = 0
+
+    starts, column = list(), 1
+    for title, width, getter in node_columns:
+      starts.append(column)
+      column += width + 1
+    self.starts = starts
+    self.first  = column     # the column of the first GPU cell
+
+  #------------------------------------
+  def get_hosts(self):
+    """
+    Return the hostnames of the rows, within the height of the terminal
+    """
+    pool  = self.pool
+    hosts = self.hostnames or pool.gpu_hostnames or pool.hostnames
+    rows  = self.max_rows or max(1, shutil.get_terminal_size().lines - 3)
+    return hosts[:rows]
+
+  #------------------------------------
+  def format_row(self, obj, n_devices):
+    """
+    Return the tuple of the (padded) cell texts of one host
+    """
+    cells = [f'{getter(obj):<{width}.{width}}' for title, width, getter in node_columns]
+    for k in range(n_devices):
+      dev  = find_device(obj.gpu_list, k)
+      text = '' if dev is None else f'{dev.gpu_utilization:3d}% {dev.gpu_temperature:3d}C'
+      cells.append(f'{text:<{gpu_width}}')
+    return tuple(cells)
+
+  #------------------------------------
+  def header(self, n_devices):
+    """
+    Return the tuple of the column titles
+    """
+    return (tuple(f'{title:<{width}}' for title, width, getter in node_columns) +
+            tuple(f'{f"gpu{k}":<{gpu_width}}' for k in range(n_devices)))
+
+  #------------------------------------
+  def get_column(self, k):
+    """
+    Return the screen column of the cell "k" of a row
+    """
+    if k < len(self.starts): return self.starts[k]
+    return self.first + (k - len(self.starts)) * (gpu_width + 1)
+
+  #------------------------------------
+  def frame(self):
+    """
+    Return the text (ANSI sequences and cells) which brings the screen up to
+    date with the current snapshot; the first frame draws everything
+    """
+    pool  = self.pool
+    hosts = self.get_hosts()
+    width = self.n_devices
+    if width is None:
+      width = max((count_slots(obj.gpu_list) for obj in map(pool.get_node, hosts) if obj is not None), default=0)
+    parts = list()
+    if not self.n_frames:
+      parts.append(hide_cursor + clear_screen)
+
+    age    = pool.get_age()
+    status = (f'{pool.cluster}: {len(pool.list_hosts)} hosts, {len(pool.failed_hosts)} failed, '
+              f'version {pool.version}' + (f', age {age:4.0f} s' if age is not None else ''))
+    status = f'{status:<{self.first + width * (gpu_width + 1)}}'
+    if status != self.status:
+      parts.append(move(1, 1) + status)
+      self.status = status
+
+    # the header is line 2, and the hosts start on line 3
+    rows = [(2, None, self.header(width))]
+    for line, host in enumerate(hosts, start=3):
+      obj = pool.get_node(host)
+      old = self.drawn.get(line)
+      if obj is None:
+        rows.append((line, None, (f'{host:<{node_columns[0][1]}}',)))
+      elif old is None or old[0] is not obj or len(old[1]) != len(node_columns) + width:
+        rows.append((line, obj, self.format_row(obj, width)))
+    for line in [line for line in self.drawn if line > len(hosts) + 2]:
+      rows.append((line, None, ()))
+
+    for line, obj, cells in rows:
+      old = self.drawn.get(line, (None, ()))[1]
+      for k, text in enumerate(cells):
+        if k < len(old) and old[k] == text: continue
+        parts.append(move(line, self.get_column(k)) + text)
+        self.n_cells += 1
+      for k in range(len(cells), len(old)):   # the cells which are gone
+        parts.append(move(line, self.get_column(k)) + ' ' * len(old[k]))
+      if cells: self.drawn[line] = (obj, cells)
+      else:     self.drawn.pop(line, None)
+    self.n_frames += 1
+    if parts: parts.append(move(len(hosts) + 3, 1))
+    return ''.join(parts)
+
+  #------------------------------------
+
+#--------------------------------------
+def node_record(obj, version):
+  """
+  Return the dictionary of the stream record of one node
+  """
+  record = {'type': 'node', 'version': version, 'host': obj.hostname}
+  for field in node_fields:
+    record[field] = getattr(obj.cpu, field) if field in cpu_deltas else getattr(obj, field)
+  return record
+
+#--------------------------------------
+def gpu_record(obj, dev, version):
+  """
+  Return the dictionary of the stream record of one GPU device of a node; the
+  device is its index in "gpu[<index>]"
+  """
+  record = {'type': 'gpu', 'version': version, 'host': obj.hostname, 'device': dev.index}
+  for field in gpu_fields: record[field] = getattr(dev, field)
+  return record
+
+#--------------------------------------
+def full_records(pool):
+  """
+  Yield the records of all nodes and all GPU devices of the current snapshot
+  """
+  for obj in pool.list_hosts:
+    yield node_record(obj, pool.version)
+    for dev in obj.gpu_list: yield gpu_record(obj, dev, pool.version)
+
+#--------------------------------------
+def change_records(pool, diff):
+  """
+  Yield the records of what changed in the snapshot_diff "diff": the node
+  records of the changed hosts (if a node field changed), the GPU records of
+  the changed devices (of all devices, if the devices changed), all records
+  of the hosts which came, and a "removed" record per host or device which left
+  """
+  version = diff.version
+  for host in diff.added:
+    obj = pool.get_node(host)
+    if obj is None: continue
+    yield node_record(obj, version)
+    for dev in obj.gpu_list: yield gpu_record(obj, dev, version)
+  for host, changes in diff.changed.items():
+    obj = pool.get_node(host)
+    if obj is None: continue
+    devices = set()
+    node    = changes.state is not None or changes.jobs_added or changes.jobs_removed
+    for key in changes.deltas:
+      field, bracket, device = key.partition('[')
+      if bracket: devices.add(int(device[:-1]))
+      else:       node = True
+    if changes.devices is not None: devices.update(changes.devices[1])
+    if node: yield node_record(obj, version)
+    for dev in obj.gpu_list:
+      if dev.index in devices: yield gpu_record(obj, dev, version)
+    if changes.devices is not None:
+      for device in sorted(set(changes.devices[0]) - set(changes.devices[1])):
+        yield {'type': 'removed', 'version': version, 'host': host, 'device': device}
+  for host in diff.removed:
+    yield {'type': 'removed', 'version': version, 'host': host}
+
+#--------------------------------------
+def watch(pool, interval=1.0, out=None, hostnames=None, ticks=None):
+  """
+  Show the live table of "pool" in the terminal, and refresh it every
+  "interval" seconds; "ticks" limits the number of refreshes (None: until
+  interrupted)
+  """
+  out   = out or sys.stdout
+  table = text_table(pool, hostnames)
+  tick  = 0
+  try:
+    while True:
+      out.write(table.frame())
+      out.flush()
+      if ticks is not None and tick >= ticks: break
+      start = time.monotonic()
+      pool.next_sweep()
+      tick += 1
+      time.sleep(max(0.0, interval - (time.monotonic() - start)))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    out.write(show_cursor + '\n')
+    out.flush()
+  return table
+
+#--------------------------------------
+def stream(pool, interval=1.0, out=None, ticks=None):
+  """
+  Write the records of the current snapshot of "pool" as JSON lines, and
+  then, every "interval" seconds, only the records which changed; "ticks"
+  limits the number of refreshes (None: until interrupted). Return the
+  number of records written
+  """
+  out     = out or sys.stdout
+  n_lines = 0
+  records = full_records(pool)
+  tick    = 0
+  try:
+    while True:
+      lines = [json.dumps(record, separators=(',', ':')) for record in records]
+      if lines:
+        out.write('\n'.join(lines) + '\n')
+        out.flush()
+        n_lines += len(lines)
+      if ticks is not None and tick >= ticks: break
+      start   = time.monotonic()
+      diff    = pool.next_sweep()
+      records = change_records(pool, diff)
+      tick   += 1
+      time.sleep(max(0.0, interval - (time.monotonic() - start)))
+  except (KeyboardInterrupt, BrokenPipeError):
+    pass
+  return n_lines
+
+#--------------------------------------
@@ -1,10 +1,58 @@
 import os, sys
 import logging
+import re
+import stat
+import subprocess
+import tempfile
+import time
+import queue
+import io
+import json
+import numpy as np
 import def_node as df
+import def_parser as dp
+import threading
+from def_nodes import nodes
+from def_scheduler import poll_scheduler
+from def_collector import collector, fetch
+from def_exporter import exporter
+from def_serial import decode_snapshot, magic, encode_node, decode_node
+from def_diff import node_diff
+from def_history import history
+from def_rollup import rollups
+from def_jobs import job_index
+from def_gpu_table import read_records
+from def_site import site, nodes_view
+from def_gui import board, drain, grid_layout
+from def_watch import text_table, stream
+from def_profile import profile_sweep, disabled
+from def_inventory import expand, compress, load_inventory
+from cluster_watch import main as cluster_watch, get_parser
+from def_alerts import alert_engine, file_sink, list_sink
+from def_rates import update_rates
 
 #--------------------------------------
 logger = logging.getLogger(__name__)
 
+# captured "pbsnodes" output of a few genius nodes, replayed instead of a live call
+replay = df.replay_source(os.path.join(os.path.dirname(os.path.abspath(__file__)), 
+                                       'data', 'pbsnodes_genius.txt'))
+
+#--------------------------------------
+def make_pool(source, **options):
+  """
+  Return a genius nodes instance over all hosts of "source"; the options go to nodes
+  """
+  return nodes('genius', source=source, hostnames=source.list_hostnames(), **options)
+
+#--------------------------------------
+def synthetic_pool(n_cpu, n_gpu, churn=0.05, seed=0, **options):
+  """
+  Return a synthetic source (see def_source) and a nodes instance over all of its hosts
+  """
+  source = df.synthetic_source(n_cpu=n_cpu, n_gpu=n_gpu, churn=churn, seed=seed)
+  return source, make_pool(source, **options)
+
 #--------------------------------------
 def test_def_gpu():
   device = df.gpu()
@@ -33,16 +81,1016 @@ def test_def_cpu():
 
 #--------------------------------------
 def test_def_node(): 
-  gnode = df.node(hostname='r23g35')
+  gnode = df.node(hostname='r23g35', source=replay)
   print(f"{gnode.hostname} has {gnode.gpus} GPUs onboard")
-  cnode = df.node(hostname='r22i13n01')
+  cnode = df.node(hostname='r22i13n01', source=replay)
   print(f"{cnode.hostname} has {cnode.np} processoers on chip")
 
   return 0
 
+#--------------------------------------
+def test_split_pbsnodes():
+  combined = ('r22i13n01\n     state = free\n     np = 36\n\n'
+              'r22i13n02\n     state = down\n     np = 36\n\n')
+  records = df.split_pbsnodes(combined)
+  try:
+    assert list(records.keys()) == ['r22i13n01', 'r22i13n02']
+    assert records['r22i13n02'].split('\n')[0] == 'r22i13n02'
+    assert 'state = down' in records['r22i13n02']
+  except AssertionError:
+    logger.error('Error: test_split_pbsnodes: failed to split a bulk pbsnodes output')
+    sys.exit(1)
+
+#--------------------------------------
+def test_gather_nodes_timeout():
+  with tempfile.TemporaryDirectory() as workdir:
+    script = os.path.join(workdir, 'pbsnodes')
+    with open(script, 'w') as w:
+      w.write('#!/bin/sh\n'
+              'if [ "$1" = "r22i13n01" ]; then sleep 5; fi\n'
+              'printf "$1\\n     state = free\\n     np = 36\\n'
+              '     status = opsys=linux,nsessions=1,loadave=0.5\\n\\n"\n')
+    os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+    t0 = time.perf_counter()
+    genius = nodes('genius', source=df.live_source(script), batch_size=1, 
+                   max_workers=16, timeout=0.5)
+    elapsed = time.perf_counter() - t0
+
+    # the default batches: only the hung host of a batch which timed out fails
+    batched = os.path.join(workdir, 'pbsnodes_all')
+    with open(batched, 'w') as w:
+      w.write('#!/bin/sh\n'
+              'for h in "$@"; do if [ "$h" = "r22i13n01" ]; then sleep 5; fi; done\n'
+              'for h in "$@"; do printf "$h\\n     state = free\\n     np = 36\\n\\n"; done\n')
+    os.chmod(batched, os.stat(batched).st_mode | stat.S_IEXEC)
+    t0 = time.perf_counter()
+    split  = nodes('genius', source=df.live_source(batched), max_workers=16, timeout=0.5)
+    t_split = time.perf_counter() - t0
+
+  class broken_source(df.synthetic_source):
+    def fetch(self, hostnames, timeout=None):
+      if 'r01i01n01' in hostnames: raise RuntimeError('broken')
+      return super().fetch(hostnames, timeout)
+  source = broken_source(n_cpu=96, n_gpu=0, seed=3)
+  broken = make_pool(source, batch_size=16)
+  try:
+    assert genius.failed_hosts == {'r22i13n01': 'timeout'}
+    assert len(genius.list_hosts) == len(genius.hostnames) - 1
+    assert elapsed < 5
+    assert split.batch_size == 32 and split.failed_hosts == {'r22i13n01': 'timeout'}
+    assert len(split.list_hosts) == len(split.hostnames) - 1 and t_split < 5
+    assert set(broken.failed_hosts.values()) == {'error'} and len(broken.failed_hosts) == 16
+    assert len(broken.list_hosts) == 80
+  except AssertionError:
+    logger.error('Error: test_gather_nodes_timeout: a hung host was not isolated')
+    sys.exit(1)
+
+#--------------------------------------
+def test_replay_source():
+  pool = nodes('genius', source=replay, hostnames=replay.list_hostnames())
+  try:
+    assert pool.gpu_hostnames == ['r23g35', 'r23g36']
+    assert [n.hostname for n in pool.list_hosts] == pool.hostnames
+    assert all(len(n.gpu_list) == n.gpus == 4 for n in pool.list_hosts[:2])
+  except AssertionError:
+    logger.error('Error: test_replay_source: failed to build nodes from a captured file')
+    sys.exit(1)
+
+  class no_fetch(df.data_source): pass
+  try:
+    no_fetch()
+    logger.error('Error: test_replay_source: a source without fetch() can be instantiated')
+    sys.exit(1)
+  except TypeError:
+    pass
+
+#--------------------------------------
+def test_synthetic_source():
+  source, pool = synthetic_pool(n_cpu=960, n_gpu=40, churn=0.1, seed=1)
+  before = source.fetch(None)
+  source.advance()
+  after  = df.split_pbsnodes(source.fetch(None))
+  n_changed = sum(after[host] != record for host, record in df.split_pbsnodes(before).items())
+  try:
+    assert len(pool.list_hosts) == 1000 and not pool.failed_hosts
+    assert len(pool.gpu_hostnames) == 40
+    assert all(len(n.gpu_list) == 4 for n in pool.list_hosts if n.hostname in pool.gpu_hostnames 
+                                                              and n.gpu_status)
+    assert before == df.synthetic_source(n_cpu=960, n_gpu=40, churn=0.1, seed=1).fetch(None)
+    assert 0 < n_changed <= 100
+  except AssertionError:
+    logger.error('Error: test_synthetic_source: the generated cluster is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_parse_node():
+  source  = df.synthetic_source(n_cpu=200, n_gpu=20, seed=2)
+  records = df.split_pbsnodes(source.fetch(None))
+
+  def split_pairs(text, sep, eq='='):
+    pairs = (item.split(eq, 1) for item in text.split(sep) if eq in item)
+    return {key.strip(): val for key, val in pairs}
+
+  def matches(obj, fields, pairs):
+    return all(getattr(obj, fields[key][0]) == (val if fields[key][1] is None else fields[key][1](val))
+               for key, val in pairs.items() if key in fields)
+
+  for host, record in records.items():
+    fast    = df.node(host, pbsnodes=record)
+    lines   = split_pairs(record, '\n', ' = ')
+    devices = {int(item[4:item.index(']')]): split_pairs(item.split('=', 1)[1], ';')
+               for item in lines.get('gpu_status', '').split(',') if item.startswith('gpu[')}
+    try:
+      assert matches(fast, dp.node_fields, lines)
+      assert matches(fast.cpu, dp.cpu_fields, split_pairs(lines.get('status', ''), ','))
+      assert [dev.index for dev in fast.gpu_list] == sorted(devices)
+      assert all(matches(dev, dp.gpu_fields, devices[dev.index]) for dev in fast.gpu_list)
+    except AssertionError:
+      logger.error(f'Error: test_parse_node: the table parser disagrees with the record of {host}')
+      sys.exit(1)
+
+  record = records['r01i01n01'].replace('np = 36', 'np = 36\n     note = drained for repair')
+  record = re.sub(r'loadave=[0-9.]+', 'newfield=3,loadave=n/a', record)
+  cnode  = df.node('r01i01n01', pbsnodes=record)
+  try:
+    assert cnode.np == 36 and cnode.cpu.opsys == 'linux' and cnode.cpu.loadave == 0.0
+    assert not df.node('r01i01n02', pbsnodes=record, parse=False).parse()
+  except AssertionError:
+    logger.error('Error: test_parse_node: unknown keys are not tolerated')
+    sys.exit(1)
+
+#--------------------------------------
+def test_compact_nodes():
+  pool  = nodes('genius', source=replay, hostnames=replay.list_hostnames(), keep_raw=False)
+  first, second = pool.list_hosts[:2]
+  try:
+    assert not hasattr(first, '__dict__') and not hasattr(first.cpu, '__dict__')
+    assert first.pbsnodes is None and first.status is None and first.gpu_status is None
+    assert first.cpu.version is second.cpu.version
+    assert first.gpu_list[0].gpu_product_name is second.gpu_list[1].gpu_product_name
+    assert first.set('nusers', '2') is None
+  except AssertionError:
+    logger.error('Error: test_compact_nodes: the node objects are not compact')
+    sys.exit(1)
+
+#--------------------------------------
+def test_columnar_snapshot():
+  source, pool = synthetic_pool(n_cpu=480, n_gpu=24, seed=4)
+  snap   = pool.columnar()
+  hosts  = pool.list_hosts
+  free   = snap.where(state='free')
+  r01    = [n for n in hosts if n.hostname.startswith('r01i')]
+  utils  = [g.gpu_utilization for n in hosts for g in n.gpu_list]
+  try:
+    assert snap.sum('dedicated_cores') == sum(n.dedicated_cores for n in hosts)
+    assert abs(snap.mean('loadave', free) - 
+               sum(n.cpu.loadave for n in hosts if n.state == 'free') / free.sum()) < 1e-9
+    assert snap.group('total_cores', by='rack', how='sum')['r01'] == sum(n.total_cores for n in r01)
+    assert snap.gpu_count('gpu_utilization', above=90) == sum(u > 90 for u in utils)
+    assert snap.gpu.get('gpu_temperature').shape == (len(hosts), 4)
+    assert snap.where(prop='gpu').sum() == snap.where(pool='gpu').sum() == 24
+  except AssertionError:
+    logger.error('Error: test_columnar_snapshot: a vectorized aggregate is off')
+    sys.exit(1)
+
+#--------------------------------------
+def test_incremental_refresh():
+  source, pool = synthetic_pool(n_cpu=960, n_gpu=40, churn=0.05, seed=5)
+  before = {n.hostname: n for n in pool.list_hosts}
+  source.advance()
+  diff   = pool.refresh()
+  after  = {n.hostname: n for n in pool.list_hosts}
+  moved  = [host for host in after if after[host] is not before[host]]
+  try:
+    assert diff.version == pool.version == 1
+    assert diff.n_reparsed == len(moved) and 0 < len(moved) <= 50
+    assert diff.n_reparsed + diff.n_unchanged == 1000
+    assert set(diff.changed) <= set(moved)
+    assert all(before[h].state == old and after[h].state == new 
+               for h, (old, new) in diff.state_changes().items())
+    assert all(job in after[h].jobs for h, jobs in diff.jobs_added().items() for job in jobs)
+    assert list(after) == pool.hostnames and pool.get_node(moved[0]) is after[moved[0]]
+    assert not pool.refresh()
+  except AssertionError:
+    logger.error('Error: test_incremental_refresh: the snapshot diff is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_text_changes():
+  source  = df.synthetic_source(n_cpu=2, n_gpu=1, seed=16)
+  host    = source.list_hostnames()[0]   # the GPU host
+  text    = source.fetch(None)
+  workdir = tempfile.mkdtemp()
+  frames  = [text, text.replace('gpu_state=Unallocated', 'gpu_state=Exclusive', 1),
+             text.replace('power_state = Running', 'power_state = Hibernate', 1)]
+  for k, frame in enumerate(frames):
+    with open(os.path.join(workdir, f'frame_{k}.txt'), 'w') as w: w.write(frame)
+  pool    = nodes('genius', source=df.replay_source(workdir), hostnames=source.list_hostnames())
+  claimed = pool.next_sweep()
+  powered = pool.next_sweep()
+  record  = df.split_pbsnodes(text)[host]
+  fewer   = node_diff(df.node(host, pbsnodes=record),
+                      df.node(host, pbsnodes=re.sub(r'gpu\[3\]=[^,]*,', '', record)))
+  try:
+    assert list(claimed.changed) == [host] and claimed.changed[host].deltas == {'gpu_state[3]': ('Unallocated', 'Exclusive')}
+    assert powered.changed[host].deltas['power_state'] == ('Running', 'Hibernate')
+    assert fewer and fewer.devices == ((0, 1, 2, 3), (0, 1, 2)) and not fewer.deltas
+  except AssertionError:
+    logger.error('Error: test_text_changes: a change of a text field or of the devices is not in the diff')
+    sys.exit(1)
+
+#--------------------------------------
+def test_poll_scheduler():
+  source, pool = synthetic_pool(n_cpu=960, n_gpu=40, seed=6, batch_size=50)
+  now    = [0.0]
+  sched  = poll_scheduler(pool, budget=2.0, burst=4, clock=lambda: now[0])
+  for step in range(600):
+    sched.tick()
+    now[0] += 0.5
+  states = {n.hostname: n.state for n in pool.list_hosts}
+  gpu_busy = [sched.interval[h] for h in pool.gpu_hostnames if states[h] == 'job-exclusive']
+  down     = [sched.interval[h] for h in pool.hostnames if states[h] == 'down']
+  try:
+    assert sched.n_calls <= 4 + 2.0 * 300
+    assert sched.n_polls >= len(pool.hostnames)
+    assert max(gpu_busy) < min(down)
+    assert all(sched.next_poll[h] > 0 for h in pool.hostnames)
+  except AssertionError:
+    logger.error('Error: test_poll_scheduler: the polling does not follow the budget or the states')
+    sys.exit(1)
+
+  # nothing collected, nor known, at construction: the hosts are discovered on the first tick
+  source = df.synthetic_source(n_cpu=24, n_gpu=8, seed=6)
+  pool   = nodes('thinking', source=source, collect=False)
+  sched  = poll_scheduler(pool, budget=100.0, clock=lambda: now[0])
+  before = len(sched.next_poll)
+  diff   = sched.tick()
+  dropped = pool.hostnames.pop()
+  sched.tick()
+  try:
+    assert before == 0 and diff is not None and len(diff.added) == 32 and sched.n_polls == 32
+    assert dropped not in sched.next_poll and len(sched.next_poll) == 31
+  except AssertionError:
+    logger.error('Error: test_poll_scheduler: the scheduler does not follow the host list')
+    sys.exit(1)
+
+#--------------------------------------
+def test_collector():
+  source, pool = synthetic_pool(n_cpu=96, n_gpu=8, churn=0.2, seed=7)
+  daemon = collector(pool)
+  server = daemon.serve('127.0.0.1:0')
+  address = '127.0.0.1:{0}'.format(server.server_address[1])
+  first  = fetch(address, '/snapshot')
+  source.advance()
+  daemon.publish(pool.refresh())
+  diffs  = fetch(address, '/diff?since=0')
+  about  = fetch(address, '/version')
+  daemon.shutdown()
+  copies = decode_snapshot(first)
+  try:
+    assert first['version'] == 0 and about['version'] == 1 and about['hosts'] == 104
+    assert [n.hostname for n in copies] == pool.hostnames
+    assert copies[0].gpus == len(copies[0].gpu_list) == 4
+    assert len(diffs) == 1 and diffs[0]['version'] == 1 and diffs[0]['hosts']
+    assert daemon.get_diff(-1) is None and daemon.get_diff(1).body == b'[]'
+  except AssertionError:
+    logger.error('Error: test_collector: the served snapshot or diff is not as expected')
+    sys.exit(1)
+
+  # scheduler mode: the first tick fails, and the later ones change nothing
+  sched  = poll_scheduler(pool, budget=1000.0)
+  daemon = collector(pool, scheduler=sched)
+  ticks  = [0]
+  def flaky_tick(tick=sched.tick):
+    ticks[0] += 1
+    if ticks[0] == 1: raise RuntimeError('flaky_tick: broken on purpose')
+    return tick()
+  sched.tick = flaky_tick
+  daemon.start()
+  for k in range(200):
+    if daemon.version > 1: break
+    time.sleep(0.01)
+  alive = daemon.thread.is_alive()
+  daemon.shutdown()
+  try:
+    assert alive and ticks[0] > 1 and daemon.version == pool.version > 1
+    assert json.loads(daemon.about.body)['version'] == daemon.version
+  except AssertionError:
+    logger.error('Error: test_collector: the scheduler does not publish every version, or died')
+    sys.exit(1)
+
+#--------------------------------------
+def test_history():
+  source, pool = synthetic_pool(n_cpu=96, n_gpu=8, churn=0.2, seed=8)
+  folder = tempfile.mkdtemp()
+  store  = history(folder, hostnames=pool.hostnames, gpu_hostnames=pool.gpu_hostnames, capacity=3)
+  store.record(pool, stamp=0.0)
+  for stamp in (60.0, 120.0, 180.0):
+    source.advance()
+    store.record(pool, pool.refresh(), stamp=stamp)
+  store.flush()
+  again  = history(folder)
+  cnode, gnode = pool.cpu_hostnames[5], pool.gpu_hostnames[1]
+  times, load  = again.series(cnode, 'loadave')
+  times, temps = again.series(gnode, 'gpu_temperature')
+
+  # an 80 GB GPU reports more than 65535 MB
+  big    = re.sub(r'gpu_memory_used=\d+', 'gpu_memory_used=81000', pool.get_node(gnode).pbsnodes)
+  wide   = history(tempfile.mkdtemp(), hostnames=[gnode], gpu_hostnames=[gnode], capacity=2)
+  wide.record(nodes_view('genius', [df.node(gnode, pbsnodes=big)]), stamp=0.0)
+  used   = wide.series(gnode, 'gpu_memory_used')[1]
+  try:
+    assert again.get_count() == 3 and list(times) == [60.0, 120.0, 180.0]
+    assert abs(load[-1] - pool.get_node(cnode).cpu.loadave) < 1e-3
+    assert temps.shape == (3, 4)
+    assert list(temps[-1]) == [dev.gpu_temperature for dev in pool.get_node(gnode).gpu_list]
+    assert again.window('dedicated_cores', since=100.0)[1].shape == (2, len(pool.hostnames))
+    assert list(used[-1]) == [81000.0] * 4
+  except AssertionError:
+    logger.error('Error: test_history: the recorded history is not as expected')
+    sys.exit(1)
+
+  # the hosts which fail to refresh get a missing sample, not a copy of their last one
+  class failing_source(df.synthetic_source):
+    broken = set()
+    def fetch(self, hostnames, timeout=None):
+      if self.broken.intersection(hostnames or ()): raise RuntimeError('failing_source: down on purpose')
+      return super().fetch(hostnames, timeout)
+  source = failing_source(n_cpu=96, n_gpu=8, churn=0.2, seed=8)
+  pool   = make_pool(source, batch_size=1)
+  store  = history(tempfile.mkdtemp(), hostnames=pool.hostnames, gpu_hostnames=pool.gpu_hostnames, capacity=3)
+  store.record(pool, stamp=0.0)
+  source.broken = {cnode, gnode}
+  source.advance()
+  diff   = pool.refresh()
+  store.record(pool, diff, stamp=60.0)
+  load   = store.series(cnode, 'loadave')[1]
+  temps  = store.series(gnode, 'gpu_temperature')[1]
+  other  = store.series(pool.cpu_hostnames[6], 'loadave')[1]
+  try:
+    assert sorted(diff.failed) == sorted(source.broken)
+    assert not np.isnan(load[0]) and np.isnan(load[1]) and np.isnan(temps[1]).all()
+    assert not np.isnan(other).any()
+  except AssertionError:
+    logger.error('Error: test_history: a failed host keeps the values of its stale node object')
+    sys.exit(1)
+
+#--------------------------------------
+def test_rollups():
+  source, pool = synthetic_pool(n_cpu=192, n_gpu=16, churn=0.3, seed=9)
+  store  = history(tempfile.mkdtemp(), hostnames=pool.hostnames, gpu_hostnames=pool.gpu_hostnames,
+                   capacity=200)
+  rolls_levels = ((60, 200), (900, 20), (3600, 10))
+  rolls  = rollups(store, levels=rolls_levels)
+  store.record(pool, stamp=0.0)
+  for minute in range(1, 120):
+    source.advance()
+    store.record(pool, pool.refresh(), stamp=60.0 * minute)
+  rolls.update()
+  times, raw  = store.window('loadave', since=3600.0, until=7199.0)
+  hours, mean = rolls.query('loadave', since=3600.0, until=7199.0, resolution=3600)
+  quarters, per_rack = rolls.query('gpu_utilization', since=0.0, points=6, by='rack')
+  times, top  = rolls.query('gpu_temperature', since=0.0, by='pool', how='max')
+  temps  = store.window('gpu_temperature')[1]
+  temps  = temps[~np.isnan(temps).all(axis=2)]   # a down GPU host has no device samples
+  try:
+    assert list(hours) == [3600.0] and abs(mean[0] - np.nanmean(raw)) < 1e-3
+    assert len(quarters) == 8 and sorted(per_rack) == sorted({h[:3] for h in pool.gpu_hostnames})
+    assert top['gpu'].max() == np.nanmean(temps, axis=1).max()
+    assert rolls.update() == 0 and rollups(store, rolls_levels).last[0] == 60.0 * 119
+  except AssertionError:
+    logger.error('Error: test_rollups: the rollups do not agree with the raw history')
+    sys.exit(1)
+
+#--------------------------------------
+def test_warm_start():
+  source = df.synthetic_source(n_cpu=96, n_gpu=8, churn=0.5, seed=10)
+  cache  = os.path.join(tempfile.mkdtemp(), 'genius.snap')
+  first  = make_pool(source, cache=cache)
+  source.advance()
+  first.refresh()
+  source.advance()
+  with open(cache, 'rb') as r: head = r.read(len(magic) + 2)
+
+  class gated_source(df.data_source):
+    def __init__(self, source): self.source, self.gate = source, threading.Event()
+    def fetch(self, hostnames, timeout=None):
+      self.gate.wait()
+      return self.source.fetch(hostnames, timeout)
+
+  gated  = gated_source(source)
+  pool   = nodes('genius', source=gated, hostnames=source.list_hostnames(), cache=cache, 
+                 warm_start=True)
+  stale  = pool.stale, [n.state for n in pool.list_hosts], pool.get_age()
+  rates  = [(n.cpu.netload_rate, [dev.gpu_double_bit_ecc_rate for dev in n.gpu_list]) for n in pool.list_hosts]
+  gated.gate.set()
+  pool.warming.join()
+  try:
+    assert head == magic + b'\x1f\x8b'   # gzipped JSON, not a pickle
+    assert stale[0] and stale[1] == [n.state for n in first.list_hosts] and stale[2] >= 0
+    assert rates == [(n.cpu.netload_rate, [dev.gpu_double_bit_ecc_rate for dev in n.gpu_list])
+                     for n in first.list_hosts]
+    assert any(rate is not None for rate, devs in rates)
+    assert not pool.stale and pool.version == 1 and pool.last_diff.n_reparsed == 104
+    assert [n.state for n in pool.list_hosts] == [n.state for n in make_pool(source).list_hosts]
+  except AssertionError:
+    logger.error('Error: test_warm_start: the cached snapshot is not shown, or not replaced')
+    sys.exit(1)
+
+#--------------------------------------
+def test_job_index():
+  pool  = nodes('genius', source=replay, hostnames=['r23g35', 'r23g36', 'r22i13n01', 'r22i13n02'])
+  index = pool.get_job_index()
+  try:
+    assert index.hosts_of('50000004') == ['r23g36'] and index.placement('50000004', 'r23g36')[0] == ((0, 17),)
+    assert index.placement('50000001', 'r23g35') == (((0, 2),), None)
+    assert index.jobs_on('r23g35') == [index.find(n) for n in ('50000001', '50000002', '50000003')]
+    assert index.footprint('50000002')['cores'] == 27
+    assert index.footprint('50000004', pool)['load_per_core'] > 0
+    assert pool.get_job_index().update(pool) == 0
+  except AssertionError:
+    logger.error('Error: test_job_index: the job index does not match the jobs of the nodes')
+    sys.exit(1)
+
+  source, pool = synthetic_pool(n_cpu=192, n_gpu=16, churn=0.3, seed=11)
+  index  = pool.get_job_index()
+  source.advance()
+  diff   = pool.refresh()
+  n_indexed = index.update(pool)
+  fresh  = job_index()
+  fresh.update(pool)
+  match  = index.by_job == fresh.by_job and index.by_host == fresh.by_host
+  same   = pool.get_replaced(index.version, index.seen)
+  source.advance()
+  pool.refresh()
+  source.advance()
+  pool.refresh()
+  skipped = pool.get_replaced(index.version, index.seen)
+  n_full = index.update(pool)
+  again  = job_index()
+  again.update(pool)
+  try:
+    assert n_indexed == diff.n_reparsed == len(diff.reparsed) < len(pool.hostnames)
+    assert match and same == [] and skipped is None and n_full > 0
+    assert index.by_job == again.by_job and index.by_host == again.by_host
+  except AssertionError:
+    logger.error('Error: test_job_index: the incremental job index differs from a rebuild')
+    sys.exit(1)
+
+#--------------------------------------
+def test_free_index():
+  source, pool = synthetic_pool(n_cpu=480, n_gpu=40, churn=0.3, seed=12)
+  index  = pool.get_free_index()
+
+  def scan(cores, gpus, prop):
+    found = list()
+    for n in pool.list_hosts:
+      if index.get_key(n) is None or prop not in (n.properties or '').split(','): continue
+      idle = index.get_key(n)[2]
+      if n.total_cores - n.dedicated_cores >= cores and idle >= gpus: found.append(n.hostname)
+    return sorted(found)
+
+  source.advance()
+  diff   = pool.refresh()
+  replaced = pool.get_replaced(index.version, index.seen)
+  n_indexed = index.update(pool)
+  pool.get_free_index()
+  try:
+    assert replaced == diff.reparsed + diff.removed and n_indexed == diff.n_reparsed
+    assert pool.get_replaced(index.version, index.seen) == [] and index.update(pool) == 0
+    for cores, gpus, prop in ((1, 0, 'skylake'), (18, 2, 'gpu'), (36, 0, 'skylake'), (4, 4, 'p100')):
+      assert sorted(index.fit(cores, gpus, prop)) == scan(cores, gpus, prop)
+      assert index.count(cores, gpus, prop) == len(scan(cores, gpus, prop))
+    best, most = index.fit(1, 0, 'skylake')[0], index.fit(1, 0, 'skylake', order='most')[0]
+    assert index.key_of[best][2:0:-1] <= index.key_of[most][2:0:-1]
+    assert index.fit(1, 0, 'skylake') is index.fit(1, 0, 'skylake', limit=None)
+    assert isinstance(index.fit(1, 0, 'skylake'), tuple)
+  except AssertionError:
+    logger.error('Error: test_free_index: the free-resource index differs from a scan')
+    sys.exit(1)
+
+#--------------------------------------
+def test_alert_engine():
+  source, pool = synthetic_pool(n_cpu=960, n_gpu=40, churn=0.2, seed=13)
+  rules  = [{'name': 'gpu_hot', 'field': 'gpu_temperature', 'op': '>', 'value': 60},
+            {'name': 'down', 'field': 'state', 'op': 'has', 'value': 'down'},
+            {'name': 'overload', 'field': 'loadave', 'op': '>', 'value': 0.9, 'per': 'np'},
+            {'name': 'ecc', 'field': 'gpu_single_bit_ecc_errors', 'op': 'rise'}]
+  path   = os.path.join(tempfile.mkdtemp(), 'alerts.jsonl')
+  engine = alert_engine(rules, sinks=[file_sink(path)], rate=1e6)
+  engine.evaluate(pool)
+  for step in range(3):
+    source.advance()
+    engine.update(pool, pool.refresh())
+  fresh  = alert_engine(rules, sinks=[list_sink()], rate=1e6)
+  fresh.evaluate(pool)
+
+  sink   = list_sink()
+  capped = alert_engine(rules, sinks=[sink], rate=5)
+  capped.evaluate(pool)
+  device = pool.get_node(pool.gpu_hostnames[0]).gpu_list[1]
+  device.gpu_single_bit_ecc_errors = str(device.gpu_single_bit_ecc_errors + 2)
+  rise   = [item for item in fresh.rules if item.name == 'ecc'][0]
+  fresh.check(rise, pool.get_node(pool.gpu_hostnames[0]), 1, old=0)
+  fresh.check(rise, pool.get_node(pool.gpu_hostnames[0]), 1, old=0)
+  with open(path) as f: lines = f.readlines()
+  try:
+    assert set(engine.active) == set(fresh.active) and len(lines) >= len(engine.active)
+    assert len(sink.events) <= 5 * len(rules) and sum(capped.suppressed.values()) > 0
+    assert [event['rule'] for event in fresh.sinks[0].events].count('ecc') == 1
+  except AssertionError:
+    logger.error('Error: test_alert_engine: the alerts are not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_alerts_node_down():
+  source  = df.synthetic_source(n_cpu=2, n_gpu=1, seed=16)
+  host    = source.list_hostnames()[0]   # the GPU host
+  workdir = tempfile.mkdtemp()
+  frames  = [re.sub(r'gpu_temperature=\d+', 'gpu_temperature=90', source.fetch(None))]
+  frames.append(re.sub(r'\n *gpu_status = [^\n]*', '', frames[0]).replace(
+                f'{host}\n     state = free', f'{host}\n     state = down', 1))
+  for k, text in enumerate(frames):
+    with open(os.path.join(workdir, f'frame_{k}.txt'), 'w') as w: w.write(text)
+  pool    = nodes('genius', source=df.replay_source(workdir), hostnames=source.list_hostnames())
+  sink    = list_sink()
+  engine  = alert_engine([{'name': 'gpu_hot', 'field': 'gpu_temperature', 'op': '>', 'value': 85},
+                          {'name': 'down', 'field': 'state', 'op': 'has', 'value': 'down'}],
+                         sinks=[sink], rate=1e6)
+  engine.evaluate(pool)
+  hot     = sorted(key for key in engine.active if key[0] == 'gpu_hot')
+  engine.update(pool, pool.next_sweep())
+  try:
+    assert hot == [('gpu_hot', host, k) for k in range(4)]
+    assert pool.get_node(host).gpu_list == [] and 'down' in pool.get_node(host).state
+    assert set(engine.active) == {('down', host, None)}
+    assert sorted(event['device'] for event in sink.events
+                  if event['rule'] == 'gpu_hot' and event['status'] == 'resolved') == [0, 1, 2, 3]
+  except AssertionError:
+    logger.error('Error: test_alerts_node_down: the GPU alerts of a node which went down do not resolve')
+    sys.exit(1)
+
+#--------------------------------------
+def test_exporter():
+  source, pool = synthetic_pool(n_cpu=96, n_gpu=8, churn=0.2, seed=14)
+  export = exporter()
+  daemon = collector(pool, exporter=export)
+  server = daemon.serve('127.0.0.1:0')
+  address = '127.0.0.1:{0}'.format(server.server_address[1])
+  first  = fetch(address, '/metrics')
+  source.advance()
+  diff   = pool.refresh()
+  daemon.publish(diff)
+  text   = fetch(address, '/metrics')
+  daemon.shutdown()
+  gnode  = pool.get_node(pool.gpu_hostnames[0])
+  sample = (f'cluster_watch_gpu_temperature{{cluster="genius",host="{gnode.hostname}",'
+            f'rack="{gnode.hostname[:3]}",pool="gpu",device="2"}} {gnode.gpu_list[2].gpu_temperature}\n')
+  names  = [line.split()[2] for line in text.splitlines() if line.startswith('# TYPE')]
+  series = [line for line in text.splitlines() if not line.startswith('#')]
+  try:
+    assert 'cluster_watch_snapshot_version{cluster="genius"} 0' in first
+    assert 'cluster_watch_snapshot_version{cluster="genius"} 1' in text
+    assert sample in text and all('{cluster="genius"' in line for line in series)
+    assert 'cluster_watch_node_mom_service_port' not in text and 'cluster_watch_cpu_loadave{' in text
+    assert len(names) == len(set(names))
+    assert export.n_rendered == len(pool.hostnames) + diff.n_reparsed
+  except AssertionError:
+    logger.error('Error: test_exporter: the exposition text is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_rate_metrics():
+  source, pool = synthetic_pool(n_cpu=96, n_gpu=8, churn=1.0, seed=15)
+  before = {n.hostname: (n.cpu.netload, n.cpu.rectime) for n in pool.list_hosts}
+  source.advance(seconds=60)
+  pool.refresh()
+  cnode  = [n for n in pool.list_hosts if n.cpu.rectime and n.hostname in pool.cpu_hostnames][0]
+  old_netload, old_rectime = before[cnode.hostname]
+  expect = (int(cnode.cpu.netload) - int(old_netload)) / (int(cnode.cpu.rectime) - int(old_rectime))
+  snap   = pool.columnar()
+  row    = list(snap.hostnames).index(cnode.hostname)
+  try:
+    assert abs(cnode.cpu.netload_rate - expect) < 1e-6
+    assert snap.get('netload_rate')[row] == cnode.cpu.netload_rate
+    assert cnode.cpu.report_age > 0 and snap.get('report_age')[row] > 0
+    assert all(dev.gpu_double_bit_ecc_rate is not None for n in pool.list_hosts
+               if n.hostname in pool.gpu_hostnames and n.cpu.rectime for dev in n.gpu_list)
+    assert 'cluster_watch_cpu_netload_rate{' in exporter().render(pool).decode()
+  except AssertionError:
+    logger.error('Error: test_rate_metrics: the derived rates are not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_missing_rectime():
+  source  = df.synthetic_source(n_cpu=4, n_gpu=1, churn=1.0, seed=18)
+  host    = source.list_hostnames()[0]   # the GPU host
+  first   = df.split_pbsnodes(source.fetch(None))[host]
+  source.advance(seconds=60)
+  second  = df.split_pbsnodes(source.fetch(None))[host]
+  old, new = df.node(host, pbsnodes=first), df.node(host, pbsnodes=second)
+  update_rates(old, new)
+  same    = df.node(host, pbsnodes=second)
+  update_rates(new, same)
+  blind   = df.node(host, pbsnodes=re.sub(r'rectime=[^,]*,', '', second))
+  update_rates(new, blind)
+  back    = df.node(host, pbsnodes=first)
+  update_rates(new, back)
+  garbled = df.node(host, pbsnodes=re.sub(r'rectime=[^,]*,', 'rectime=n/a,', second))
+  try:
+    assert new.cpu.report_age > 0 and blind.cpu.report_age is None and garbled.cpu.report_age is None
+    assert new.cpu.netload_rate is not None and new.gpu_list[0].gpu_double_bit_ecc_rate is not None
+    assert same.cpu.netload_rate == new.cpu.netload_rate
+    assert same.gpu_list[0].gpu_double_bit_ecc_rate == new.gpu_list[0].gpu_double_bit_ecc_rate
+    assert blind.cpu.rectime is None and blind.cpu.netload_rate is None
+    assert all(dev.gpu_single_bit_ecc_rate is None and dev.gpu_double_bit_ecc_rate is None
+               for dev in blind.gpu_list + back.gpu_list)
+    assert back.cpu.netload_rate is None
+  except AssertionError:
+    logger.error('Error: test_missing_rectime: stale rates are carried over')
+    sys.exit(1)
+
+#--------------------------------------
+def test_gpu_table():
+  source  = df.synthetic_source(n_cpu=40, n_gpu=8, seed=16)
+  records = df.split_pbsnodes(source.fetch(None))
+  host    = [h for h, record in records.items() if ' gpu_status = ' in record][0]
+  record  = records[host]
+  status  = re.search(r'gpu_status = (.*)', record).group(1)
+  items   = [item for item in status.split(',') if item.startswith('gpu[')]
+  sample  = items[-1].split('=', 1)[1]            # the device 0
+  hot     = re.sub(r'gpu_temperature=\d+', 'gpu_temperature=91', sample)
+  wide    = [f'gpu[{k}]={hot if k == 11 else sample}' for k in reversed(range(12))]
+  records[host] = record.replace(status, ','.join(wide) + ',driver_ver=396.37').replace('gpus = 4', 'gpus = 12')
+
+  wide   = df.node(host, pbsnodes=records[host])
+  table  = read_records(records)
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'pbsnodes.txt')
+    with open(path, 'w') as w: w.write('\n'.join(records.values()))
+    frame = df.replay_source(path)
+  pool   = nodes('genius', source=frame, hostnames=frame.list_hostnames())
+  same   = pool.get_gpu_table()
+  row    = list(table.hostnames).index(host)
+  try:
+    assert len(wide.gpu_list) == 12 and wide.gpu_list[11].gpu_temperature == 91
+    assert table.data.shape == (8, 12) and table.data['present'][row].all()
+    assert table.count() == sum(len(n.gpu_list) for n in pool.list_hosts)
+    assert (same.data == table.data).all() and list(same.hostnames) == list(table.hostnames)
+    assert (host, 11) in table.hot(90) and len(table.hot(90)) == 1
+    assert table.idle_allocated() == [(h, dev.index) for h, n in pool.by_host.items() for dev in n.gpu_list
+                                      if dev.gpu_state != 'Unallocated' and dev.gpu_utilization <= 5
+                                      and dev.gpu_memory_used <= 100]
+    assert np.isnan(table.reduce('gpu_temperature', 'max', by='device')[4:11]).sum() == 0
+    assert table.reduce('gpu_temperature', 'max', by='device')[11] == 91
+    assert same.update(pool) == 0
+  except AssertionError:
+    logger.error('Error: test_gpu_table: the host x device GPU table is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_device_gaps():
+  source  = df.synthetic_source(n_cpu=2, n_gpu=2, seed=4)
+  host    = source.list_hostnames()[0]   # a GPU host, without its device 1
+  records = df.split_pbsnodes(source.fetch(None))
+  records[host] = re.sub(r'gpu\[1\]=[^,]*,', '', records[host])
+  capture = os.path.join(tempfile.mkdtemp(), 'pbsnodes.txt')
+  with open(capture, 'w') as w: w.write('\n'.join(records.values()))
+  pool    = nodes('genius', source=df.replay_source(capture), hostnames=source.list_hostnames())
+  obj     = pool.get_node(host)
+  table   = read_records(records)
+  same    = pool.get_gpu_table()
+  row     = list(table.hostnames).index(host)
+  metrics = exporter().render(pool).decode()
+  labels  = re.findall(rf'cluster_watch_gpu_temperature{{[^}}]*host="{host}"[^}}]*device="(\d+)"}}', metrics)
+  cells   = text_table(pool).format_row(obj, 4)[-4:]
+  out     = io.StringIO()
+  stream(pool, interval=0, out=out, ticks=0)
+  devices = [record['device'] for record in map(json.loads, out.getvalue().splitlines())
+             if record['type'] == 'gpu' and record['host'] == host]
+  columns = pool.columnar().get('gpu_temperature')[list(pool.hostnames).index(host)]
+  try:
+    assert [dev.index for dev in obj.gpu_list] == [0, 2, 3]
+    assert [dev.index for dev in decode_node(encode_node(obj)).gpu_list] == [0, 2, 3]
+    assert table.data['present'][row].tolist() == [True, False, True, True]
+    assert (same.data == table.data).all()
+    assert same.data['gpu_temperature'][row].tolist() == [obj.gpu_list[0].gpu_temperature, 0] + \
+           [dev.gpu_temperature for dev in obj.gpu_list[1:]]
+    assert labels == ['0', '2', '3'] and devices == [0, 2, 3]
+    assert cells[1].strip() == '' and all(cells[k].strip() for k in (0, 2, 3))
+    assert np.isnan(columns[1]) and columns[3] == obj.gpu_list[2].gpu_temperature
+  except AssertionError:
+    logger.error('Error: test_device_gaps: a device is not placed by its index')
+    sys.exit(1)
+
+#--------------------------------------
+class traced_source(df.synthetic_source):
+  """
+  A synthetic source which records the threads that fetch from it
+  """
+  def __init__(self, **kwargs):
+    super().__init__(**kwargs)
+    self.threads = set()
+
+  def fetch(self, hostnames, timeout=None):
+    self.threads.add(threading.current_thread().name)
+    return super().fetch(hostnames, timeout)
+
+#--------------------------------------
+def test_site():
+  sizes   = {'genius': (96, 8), 'thinking': (64, 0), 'breniac': (48, 0)}
+  sources = {name: traced_source(n_cpu=n_cpu, n_gpu=n_gpu, seed=17 + k)
+             for k, (name, (n_cpu, n_gpu)) in enumerate(sizes.items())}
+  hpc     = site(list(sizes), sources=sources, budget=0.01, burst=2, max_workers=4, batch_size=16,
+                 hostnames={name: source.list_hostnames() for name, source in sources.items()})
+  summary = hpc.aggregates()
+  groups  = hpc.columnar().group('free_cores', by='cluster', how='sum')
+  try:
+    assert [len(pool.list_hosts) for pool in hpc.pools.values()] == [104, 64, 48]
+    assert summary['site']['hosts'] == 216 == sum(summary[name]['hosts'] for name in sizes)
+    assert summary['site']['free_cores'] == sum(groups.values())
+    assert all(groups[name] == summary[name]['free_cores'] for name in sizes)
+    assert summary['genius']['gpus'] == summary['site']['gpus'] and summary['thinking']['gpus'] == 0
+    assert all(thread.startswith('pbsnodes') for source in sources.values() for thread in source.threads)
+    assert len(hpc.tick()) == 1            # 2 tokens buy only 2 of the 7 batches of genius
+    assert hpc.get_node(sources['breniac'].list_hostnames()[0], 'breniac') is not None
+  except AssertionError:
+    logger.error('Error: test_site: the multi-cluster site is not as expected')
+    sys.exit(1)
+  finally:
+    hpc.shutdown()
+
+  # nothing collected up front: the schedulers exist, and a failing cluster is only logged
+  idle = site(list(sizes), sources=sources, budget=100.0, max_workers=4, batch_size=16, collect=False,
+              hostnames={name: source.list_hostnames() for name, source in sources.items()})
+  def work(name, pool):
+    if name == 'thinking': raise RuntimeError('work: broken on purpose')
+    return name
+  try:
+    assert sorted(idle.tick()) == sorted(sizes) and len(idle.list_hosts) == 216
+    assert idle.each(work) == {'genius': 'genius', 'thinking': None, 'breniac': 'breniac'}
+  except AssertionError:
+    logger.error('Error: test_site: a site without a first sweep, or a failing cluster, is not handled')
+    sys.exit(1)
+  finally:
+    idle.shutdown()
+
+#--------------------------------------
+def test_gui_board():
+  source, pool = synthetic_pool(n_cpu=100, n_gpu=8, churn=0.5, seed=18)
+  places, labels = grid_layout(pool.hostnames, columns=40)
+  tiles  = board(pool.hostnames, columns=40)
+  first  = tiles.apply(pool)
+  inbox  = queue.Queue()
+  source.advance(seconds=60)
+  inbox.put(pool.refresh())
+  source.advance(seconds=60)
+  inbox.put(pool.refresh())
+  hosts, layout = drain(inbox)
+  changed = tiles.apply(pool, hosts)
+  inbox.put(None)
+  try:
+    assert [rack for row, rack in labels] == sorted({df.parse_hostname(h)[0] for h in pool.hostnames})
+    assert len(set(places.values())) == len(pool.hostnames) and max(c for r, c in places.values()) < 40
+    assert len(first) == len(pool.hostnames) and not tiles.apply(pool)
+    assert not layout and inbox.qsize() == 1 and drain(inbox)[1]
+    assert set(h for h, look in changed) <= hosts and len(changed) <= len(hosts)
+    assert all(tiles.looks[h] == tiles.get_look(pool.get_node(h)) for h in pool.hostnames)
+    assert all(len(tiles.looks[h][1]) == 4 for h in pool.gpu_hostnames if pool.get_node(h).gpu_list)
+  except AssertionError:
+    logger.error('Error: test_gui_board: the dashboard tiles are not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def paint_screen(screen, text):
+  """
+  Apply the ANSI cursor moves and texts of a frame to a dictionary of
+  (line, column) -> character
+  """
+  for line, column, cells in re.findall(r'\x1b\[(\d+);(\d+)H([^\x1b]*)', text):
+    for k, char in enumerate(cells): screen[(int(line), int(column) + k)] = char
+  return screen
+
+#--------------------------------------
+def test_watch():
+  source, pool = synthetic_pool(n_cpu=60, n_gpu=12, churn=0.5, seed=19)
+  table  = text_table(pool, max_rows=20)
+  screen = paint_screen(dict(), table.frame())
+  first  = table.n_cells
+  idle   = table.frame()
+  source.advance(seconds=60)
+  diff   = pool.refresh()
+  screen = paint_screen(screen, table.frame())
+  fresh  = paint_screen(dict(), text_table(pool, max_rows=20).frame())
+  status = {key for key in fresh if key[0] == 1}
+
+  out    = io.StringIO()
+  source, pool = synthetic_pool(n_cpu=60, n_gpu=12, churn=0.5, seed=19)
+  stream(pool, interval=0, out=out, ticks=1)   # the stream advances the source itself
+  state  = dict()
+  for line in out.getvalue().splitlines():
+    record = json.loads(line)
+    state[(record['host'], record.get('device'))] = record
+  n_full = len(pool.list_hosts) + sum(len(n.gpu_list) for n in pool.list_hosts)
+  n_sent = len(out.getvalue().splitlines())
+  n_diff = n_sent - n_full   # the change records of the one refresh
+  try:
+    assert all(screen.get(key) == char for key, char in fresh.items() if key not in status)
+    assert table.n_cells - first < first and len(idle) < 200
+    assert 0 < n_diff < n_full and pool.version == 1
+    assert all(state[(n.hostname, None)]['state'] == n.state and
+               state[(n.hostname, None)]['loadave'] == n.cpu.loadave for n in pool.list_hosts)
+    assert all(state[(n.hostname, k)]['gpu_temperature'] == dev.gpu_temperature
+               for n in pool.list_hosts for k, dev in enumerate(n.gpu_list))
+  except AssertionError:
+    logger.error('Error: test_watch: the terminal table or the change stream is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_stream_devices():
+  source  = df.synthetic_source(n_cpu=2, n_gpu=2, seed=4)
+  first, second = source.list_hostnames()[:2]   # the GPU hosts
+  records = df.split_pbsnodes(source.fetch(None))
+  workdir = tempfile.mkdtemp()
+  with open(os.path.join(workdir, 'frame_0.txt'), 'w') as w: w.write('\n'.join(records.values()))
+  records[first]  = records[first].replace('gpu_state=Unallocated', 'gpu_state=Exclusive', 1)
+  records[second] = re.sub(r'gpu\[3\]=[^,]*,', '', records[second])
+  with open(os.path.join(workdir, 'frame_1.txt'), 'w') as w: w.write('\n'.join(records.values()))
+  pool    = nodes('genius', source=df.replay_source(workdir), hostnames=source.list_hostnames())
+  n_full  = len(pool.list_hosts) + sum(len(n.gpu_list) for n in pool.list_hosts)
+  out     = io.StringIO()
+  stream(pool, interval=0, out=out, ticks=1)
+  changes = [json.loads(line) for line in out.getvalue().splitlines()[n_full:]]
+  flipped = [dev for dev in pool.get_node(first).gpu_list if dev.gpu_state == 'Exclusive']
+  try:
+    assert [(r['type'], r['host'], r['device']) for r in changes] == \
+           [('gpu', first, 3)] + [('gpu', second, k) for k in range(3)] + [('removed', second, 3)]
+    assert changes[0]['gpu_state'] == 'Exclusive' and len(flipped) == 1
+  except AssertionError:
+    logger.error('Error: test_stream_devices: a flipped gpu_state or a lost device is not streamed')
+    sys.exit(1)
+
+#--------------------------------------
+def test_profile():
+  source, pool = synthetic_pool(n_cpu=90, n_gpu=10, churn=0.3, seed=20, batch_size=25, profile=True)
+  source.advance(seconds=60)
+  pool.refresh()
+  record = re.sub(r'loadave=[0-9.]+', 'loadave=n/a', pool.list_hosts[0].pbsnodes)
+  df.node(pool.list_hosts[0].hostname, pbsnodes=record)
+  report = pool.profile.report()
+  source.advance(seconds=60)
+  diff, text = profile_sweep(pool)
+  plain  = make_pool(source)
+  try:
+    assert {'fetch', 'split', 'parse', 'diff'} <= set(report['stages'])
+    assert report['stages']['fetch']['calls'] == 8
+    assert report['sweeps']['gather']['sweeps'] == report['sweeps']['refresh']['sweeps'] == 1
+    assert sum(report['latency']['hosts']) == 2 * len(pool.hostnames)
+    assert report['counters']['reparsed'] + report['counters']['unchanged'] == len(pool.hostnames)
+    assert report['counters']['parser_fallbacks'] == 1
+    assert 'collect_batch' in text and 'parse_node' in text
+    assert plain.profile is disabled and not disabled.report()['stages']
+  except AssertionError:
+    logger.error('Error: test_profile: the instruments are not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_cluster_watch():
+  source  = df.synthetic_source(n_cpu=48, n_gpu=8, churn=0.5, seed=21)
+  workdir = tempfile.mkdtemp()
+  capture = os.path.join(workdir, 'pbsnodes.txt')
+  cache   = os.path.join(workdir, 'genius.snap')
+  with open(capture, 'w') as w: w.write(source.fetch(None))
+
+  table = io.StringIO()
+  cluster_watch(['snapshot', 'genius', '--replay', capture, '--cache', cache], out=table)
+  lines = io.StringIO()
+  cluster_watch(['snapshot', 'genius', '--from-cache', cache, '--format', 'json'], out=lines)
+  cached = [json.loads(line) for line in lines.getvalue().splitlines()]
+  pool   = nodes('genius', source=df.replay_source(capture), hostnames=source.list_hostnames())
+  flags  = get_parser().parse_args(['snapshot', '--cprofile', 'thinking'])
+  stats  = os.path.join(workdir, 'sweep.prof')
+  cluster_watch(['snapshot', 'genius', '--replay', capture, '--cprofile-out', stats], out=io.StringIO())
+
+  # a fresh process must not load the modules of the other subcommands
+  probe = ('import sys, io, cluster_watch; '
+           f'cluster_watch.main(["snapshot", "--from-cache", {cache!r}], out=io.StringIO()); '
+           'print(" ".join(m for m in ("numpy", "tkinter", "def_snapshot", "def_gui", '
+           '"def_collector", "def_exporter") if m in sys.modules))')
+  loaded = subprocess.run([sys.executable, '-c', probe], stdout=subprocess.PIPE, universal_newlines=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+  try:
+    assert table.getvalue().startswith('genius: 56 hosts, 0 failed')
+    assert len(table.getvalue().splitlines()) == 2 + 56
+    assert sum(record['type'] == 'node' for record in cached) == 56
+    assert sum(record['type'] == 'gpu' for record in cached) == sum(len(n.gpu_list) for n in pool.list_hosts)
+    assert [record['state'] for record in cached if record['type'] == 'node'] == [n.state for n in pool.list_hosts]
+    assert loaded.strip() == ''
+    assert flags.cluster == 'thinking' and flags.cprofile and os.path.getsize(stats) > 0
+  except AssertionError:
+    logger.error('Error: test_cluster_watch: the snapshot subcommand is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_inventory():
+  workdir = tempfile.mkdtemp()
+  listing = os.path.join(workdir, 'genius.hosts')
+  cache   = os.path.join(workdir, 'genius.inventory')
+  with open(listing, 'w') as w: w.write('# genius\nr22i13n[01-24] r23g[34-35]  # GPU nodes\nr22i27n[01-04,07]\n')
+  hosts = [f'r22i13n{k:02d}' for k in range(1, 25)] + ['r23g34', 'r23g35'] + \
+          [f'r22i27n{k:02d}' for k in (1, 2, 3, 4, 7)]
+
+  source = df.synthetic_source(hostnames=hosts, seed=22)
+  pool   = nodes('genius', source=source, inventory=listing)
+  first  = load_inventory('genius', path=listing, cache=cache)
+  again  = load_inventory('genius', path=listing, cache=cache)
+  with open(listing, 'a') as w: w.write('r22i27n08\n')
+  edited = load_inventory('genius', path=listing, cache=cache)
+
+  # discovery with one "pbsnodes -l all" call, kept in the cache for "max_age" seconds
+  script = os.path.join(workdir, 'pbsnodes')
+  with open(script, 'w') as w:
+    w.write('#!/bin/sh\necho "$@" >> ' + os.path.join(workdir, 'calls') + '\n'
+            'printf "r01i01n01  free\\nr01i01n02  down\\nr02g01  job-exclusive\\n"\n')
+  os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+  live  = df.live_source(script)
+  found = [load_inventory('breniac', source=live, cache=cache, max_age=age).origin for age in (60, 60, -1)]
+  with open(os.path.join(workdir, 'calls')) as r: calls = r.read().splitlines()
+  snap  = pool.columnar()
+  try:
+    assert expand('r[22-23]g[08-09]') == ['r22g08', 'r22g09', 'r23g08', 'r23g09']
+    assert compress(hosts) == ['r22i13n[01-24]', 'r23g[34-35]', 'r22i27n[01-04,07]']
+    assert pool.hostnames == ['r23g34', 'r23g35'] + hosts[:24] + hosts[26:]
+    assert len(pool.list_hosts) == len(hosts) and not pool.failed_hosts
+    assert pool.inventory.groups['iru']['r22i27'] == hosts[26:]
+    assert sorted(pool.inventory.groups['rack']) == snap.categories['rack'] == ['r22', 'r23']
+    assert (first.origin, again.origin, edited.origin) == (listing, 'cache', listing)
+    assert again.hostnames == first.hostnames and edited.hostnames[-1] == 'r22i27n08'
+    assert found == ['discovery', 'cache', 'discovery'] and calls == ['-l all', '-l all']
+    assert load_inventory('breniac', source=live).gpu_hostnames == ['r02g01']
+  except AssertionError:
+    logger.error('Error: test_inventory: the hostname inventory is not as expected')
+    sys.exit(1)
+
+#--------------------------------------
+def test_lazy_discovery():
+  workdir = tempfile.mkdtemp()
+  calls   = os.path.join(workdir, 'calls')
+  script  = os.path.join(workdir, 'pbsnodes')
+  with open(script, 'w') as w: w.write(f'#!/bin/sh\necho "$@" >> {calls}\nexit 1\n')
+  os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+
+  source = df.synthetic_source(n_cpu=24, n_gpu=0, seed=23)
+  cache  = os.path.join(workdir, 'thinking.snap')
+  nodes('thinking', source=source, hostnames=source.list_hostnames(), cache=cache)
+
+  # neither the constructor nor the cached snapshot may call "pbsnodes"
+  path = os.environ['PATH']
+  os.environ['PATH'] = workdir + os.pathsep + path
+  try:
+    out = io.StringIO()
+    cluster_watch(['snapshot', 'thinking', '--from-cache', cache], out=out)
+    idle = nodes('thinking', collect=False)
+    before = os.path.exists(calls)
+    idle.gather_nodes()
+  finally:
+    os.environ['PATH'] = path
+  try:
+    assert not before and out.getvalue().startswith('thinking: 24 hosts')
+    assert idle.inventory is not None and idle.hostnames == []
+    with open(calls) as r: assert r.read().split() == ['-l', 'all']
+  except AssertionError:
+    logger.error('Error: test_lazy_discovery: the hostnames are discovered too early')
+    sys.exit(1)
+
+#--------------------------------------
+def test_empty_values():
+  source  = df.synthetic_source(n_cpu=4, n_gpu=2, seed=24)
+  capture = os.path.join(tempfile.mkdtemp(), 'pbsnodes.txt')
+  text    = re.sub(r'gpu_memory_used=[^;,]*', 'gpu_memory_used=', source.fetch(None))
+  text    = re.sub(r'nsessions=[^,]*', 'nsessions=', text)
+  with open(capture, 'w') as w: w.write(text)
+  records = df.split_pbsnodes(text)
+  host    = source.list_hostnames()[0]
+  skipped = dp.counters['skipped']
+  obj     = df.node(host, pbsnodes=records[host])
+  table   = read_records(records)
+  out     = io.StringIO()
+  cluster_watch(['snapshot', 'genius', '--replay', capture], out=out)
+  try:
+    assert [dev.gpu_memory_used for dev in obj.gpu_list] == [0] * len(obj.gpu_list)
+    assert obj.cpu.nsessions == 0 and dp.counters['skipped'] > skipped
+    assert [dev.gpu_temperature for dev in obj.gpu_list] == \
+           [dev.gpu_temperature for dev in df.node(host, source=source).gpu_list]
+    assert table.count() == 8 and not table.get('gpu_memory_used').any()
+    assert out.getvalue().startswith('genius: 6 hosts, 0 failed')
+  except AssertionError:
+    logger.error('Error: test_empty_values: an empty value is not skipped')
+    sys.exit(1)
+
 #--------------------------------------
 def check_gpu_status():
-  gnode = df.node(hostname='r23g36')
+  gnode = df.node(hostname='r23g36', source=replay)
   gpus  = gnode.gpus
   try:
     assert gpus == len(gnode.gpu_list)
@@ -74,6 +1122,70 @@ def main():
 
   test_def_node()
 
+  test_split_pbsnodes()
+
+  test_gather_nodes_timeout()
+
+  test_replay_source()
+
+  test_synthetic_source()
+
+  test_parse_node()
+
+  test_compact_nodes()
+
+  test_columnar_snapshot()
+
+  test_incremental_refresh()
+
+  test_text_changes()
+
+  test_poll_scheduler()
+
+  test_collector()
+
+  test_history()
+
+  test_rollups()
+
+  test_warm_start()
+
+  test_job_index()
+
+  test_free_index()
+
+  test_alert_engine()
+
+  test_alerts_node_down()
+
+  test_exporter()
+
+  test_rate_metrics()
+
+  test_missing_rectime()
+
+  test_gpu_table()
+
+  test_device_gaps()
+
+  test_site()
+
+  test_gui_board()
+
+  test_watch()
+
+  test_stream_devices()
+
+  test_profile()
+
+  test_cluster_watch()
+
+  test_inventory()
+
+  test_lazy_discovery()
+
+  test_empty_values()
+
   check_gpu_status()
 
 #  genius = gpi.nodes(cluster='genius')